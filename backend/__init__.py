@@ -1,3 +1,4 @@
+import asyncio
 import os
 from contextlib import asynccontextmanager
 from logging import getLogger
@@ -9,7 +10,15 @@ from backend.exceptions.handler import register_exceptions
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
+    from .components.chunk import chunk_deinit, chunk_init
+    from .components.ingest import ingest_pool
+    from .components.tts import tts_cache
     from .dependencies.database import db_deinit, db_init
+    from .utils.health import health_monitor
+    from .utils.llm import llm_deinit, llm_init
+    from .utils.nlp import nlp_init
+    from .utils.oss import get_oss_instance, oss_deinit, oss_init
+    from .utils.vector import get_vdb_instance, vdb_deinit, vdb_init
 
     # before fastapi start
     host = os.getenv("HOST", "localhost")
@@ -20,6 +29,16 @@ async def lifespan(app: FastAPI):
 
     logger.info("backend init begin")
     await db_init()
+    await llm_init()
+    await vdb_init()
+    await oss_init()
+    await tts_cache.init()
+    await asyncio.to_thread(nlp_init)
+    await chunk_init()
+    health_monitor.register("vector", get_vdb_instance)
+    health_monitor.register("oss", get_oss_instance)
+    health_monitor.start()
+    ingest_pool.start()
     logger.info("backend init finished")
 
     logger.info(f"Fastapi Doc address: http://{host}:{port}{app.docs_url}")
@@ -29,6 +48,12 @@ async def lifespan(app: FastAPI):
     finally:
         # after fastapi stop
         logger.info("after fastapi stop")
+        await health_monitor.stop()
+        await ingest_pool.stop()
+        await chunk_deinit()
+        await oss_deinit()
+        await vdb_deinit()
+        await llm_deinit()
         await db_deinit()
         logger.info("backend deinit finished")
 
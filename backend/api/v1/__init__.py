@@ -2,8 +2,9 @@ from fastapi import APIRouter
 
 from ...response import SuccessResponse
 from .admin import admin_router
-from .character import label_router, role_router, world_router
+from .character import document_router, label_router, role_router, world_router
 from .conversation import conversation_router
+from .system import system_router
 
 v1_router = APIRouter(prefix="/v1", default_response_class=SuccessResponse)
 v1_router.include_router(admin_router)
@@ -11,3 +12,5 @@ v1_router.include_router(role_router)
 v1_router.include_router(world_router)
 v1_router.include_router(conversation_router)
 v1_router.include_router(label_router)
+v1_router.include_router(document_router)
+v1_router.include_router(system_router)
@@ -3,27 +3,41 @@ from operator import attrgetter
 from typing import Annotated, Optional, Union
 from uuid import uuid4
 
-from fastapi import APIRouter, Body, Form, Path, Query, UploadFile
+from fastapi import APIRouter, BackgroundTasks, Body, Form, Path, Query, UploadFile
 from fastapi.responses import StreamingResponse
 from omni_llm import ChatOutput, async_chat_factory
 from sqlalchemy import or_, select
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import joinedload
 
 from backend import dependencies
-from backend.components.chunk import chunking
-from backend.crud import CharacterCrud, DocumentCrud, LabelCrud, WorldCrud
+from backend.components.chunk import EMBED_CHUNK_BATCH_SIZE
+from backend.components.ingest import ingest_pool
+from backend.components.retrieval import retrieval_cache
+from backend.crud import (
+    CharacterCrud,
+    DocumentCrud,
+    IngestJobCrud,
+    LabelCrud,
+    WorldCrud,
+)
 from backend.exceptions import CustomException, ErrorCode
+from backend.models import Document
 from backend.prompts import get_prompt_template
 from backend.schemas import PageResponse
 from backend.schemas import character as schemas
+from backend.utils.oss import Minio
+from backend.utils.vector import VectorDatabase
 
 role_router = APIRouter(prefix="/character", tags=["角色"])
 world_router = APIRouter(prefix="/world", tags=["世界"])
 label_router = APIRouter(prefix="/label", tags=["标签"])
+document_router = APIRouter(prefix="/document", tags=["文档"])
 
 PathRoleId = Annotated[int, Path(description="角色ID")]
 PathLabelId = Annotated[int, Path(description="标签ID")]
 PathWorldId = Annotated[int, Path(description="世界ID")]
+PathDocumentId = Annotated[int, Path(description="文档ID")]
 
 OSS_BUCKET_NAME = "lorelm"
 VDB_INDEX_NAME = "lorelm"
@@ -62,13 +76,8 @@ async def role_info(
     crud = CharacterCrud(db)
     doc_crud = DocumentCrud(db)
     docs = await doc_crud.get_datas(wheres=doc_crud.model.character_id == role_id)
-    if docs is not None and len(docs) > 0:
-        docs_path = [doc.path.strip("/").split("/", maxsplit=1)[1] for doc in docs]
-        await oss.document_mult_delete(OSS_BUCKET_NAME, docs_path)
-        docs_id = tuple(map(attrgetter("id"), docs))
-        await vdb.doc_delete(VDB_INDEX_NAME, docs_id=docs_id)
-
-        await doc_crud.delete_datas(docs_id)
+    await _delete_documents(db, oss, vdb, docs)
+    retrieval_cache.invalidate(roles_id=role_id)
     role = await crud.get_data(role_id)
     if role.avatar:
         bucket, url = role.avatar.strip("/").split("/", maxsplit=1)
@@ -84,7 +93,7 @@ async def role_info(
     user_id: dependencies.DependValidUserId,
     db: dependencies.DependSession,
     oss: dependencies.DependOSS,
-    vdb: dependencies.DependVDB,
+    background_tasks: BackgroundTasks,
 ):
     if not isinstance(form.files, list):
         form.files = [form.files]
@@ -106,6 +115,7 @@ async def role_info(
         role.avatar = avatar_url
         role = await crud.update_data(role, attribute_names=["labels", "updated_at"])
 
+    docs = list()
     for file in form.files:
         uid = uuid4().hex
         tail = os.path.splitext(file.filename)[1]
@@ -113,8 +123,6 @@ async def role_info(
         assert await oss.document_create(
             OSS_BUCKET_NAME, file_path, file.file, file.size
         ), "上传失败"
-        await file.seek(0)
-        content = (await file.read()).decode("utf-8")
         doc = doc_crud.model(
             character_id=role.id,
             world_id=None,
@@ -122,9 +130,10 @@ async def role_info(
             path=f"/{OSS_BUCKET_NAME}/{file_path}",
             data_range=form.data_range,
         )
-        model = await doc_crud.create_data(doc)
-        docs = await chunking("naive", content, model.id, None)
-        await vdb.doc_batch_insert(VDB_INDEX_NAME, docs)
+        await doc_crud.create_data(doc)
+        docs.append(doc)
+    # 分块、向量与写入由后台任务完成，通过 /document/{doc_id}/ingest 查询进度
+    await _create_ingest_jobs(db, docs, background_tasks)
 
     return role
 
@@ -191,7 +200,7 @@ async def world_create(
     user_id: dependencies.DependValidUserId,
     db: dependencies.DependSession,
     oss: dependencies.DependOSS,
-    vdb: dependencies.DependVDB,
+    background_tasks: BackgroundTasks,
 ):
     if not isinstance(form.files, list):
         form.files = [form.files]
@@ -199,6 +208,7 @@ async def world_create(
     doc_crud = DocumentCrud(db)
     world = await crud.create_data(form, user_id)
 
+    docs = list()
     for file in form.files:
         uid = uuid4().hex
         tail = os.path.splitext(file.filename)[1]
@@ -206,8 +216,6 @@ async def world_create(
         assert await oss.document_create(
             OSS_BUCKET_NAME, file_path, file.file, file.size
         ), "上传失败"
-        await file.seek(0)
-        content = (await file.read()).decode("utf-8")
         doc = doc_crud.model(
             character_id=None,
             world_id=world.id,
@@ -215,12 +223,106 @@ async def world_create(
             path=f"/{OSS_BUCKET_NAME}/{file_path}",
             data_range=form.data_range,
         )
-        model = await doc_crud.create_data(doc)
-        docs = await chunking("naive", content, None, model.id)
-        await vdb.doc_batch_insert(VDB_INDEX_NAME, docs)
+        await doc_crud.create_data(doc)
+        docs.append(doc)
+    await _create_ingest_jobs(db, docs, background_tasks)
     return world
 
 
+async def _delete_documents(
+    db: AsyncSession,
+    oss: Minio,
+    vdb: VectorDatabase,
+    docs: Optional[list[Document]],
+):
+    """删除文档及其分块，并在同一事务中取消导入任务
+
+    执行中的任务在写入下一批前发现任务已取消，自行删除已写入的分块。
+    """
+    if not docs:
+        return
+    docs_path = [doc.path.strip("/").split("/", maxsplit=1)[1] for doc in docs]
+    await oss.document_mult_delete(OSS_BUCKET_NAME, docs_path)
+    docs_id = tuple(map(attrgetter("id"), docs))
+    await IngestJobCrud(db).cancel(docs_id)
+    await DocumentCrud(db).delete_datas(docs_id)
+    await vdb.doc_delete(VDB_INDEX_NAME, docs_id=docs_id)
+
+
+async def _create_ingest_jobs(
+    db: AsyncSession,
+    docs: list[Document],
+    background_tasks: BackgroundTasks,
+):
+    """为文档创建导入任务，响应返回（事务提交）后交给任务池"""
+    if not docs:
+        return
+    jobs = await IngestJobCrud(db).batch_create(
+        [doc.id for doc in docs], EMBED_CHUNK_BATCH_SIZE
+    )
+    background_tasks.add_task(ingest_pool.submit, [job.id for job in jobs])
+
+
+@document_router.get(
+    "/ingest",
+    response_model=list[schemas.IngestJobResponse],
+    summary="角色或世界的知识导入进度",
+)
+async def document_ingest_list(
+    db: dependencies.DependSession,
+    role_id: Optional[int] = Query(None, description="角色ID"),
+    world_id: Optional[int] = Query(None, description="世界ID"),
+):
+    if role_id is None and world_id is None:
+        raise CustomException(ErrorCode.Other, "需指定角色或世界")
+    doc_crud = DocumentCrud(db)
+    job_crud = IngestJobCrud(db)
+    wheres = []
+    if role_id is not None:
+        wheres.append(doc_crud.model.character_id == role_id)
+    if world_id is not None:
+        wheres.append(doc_crud.model.world_id == world_id)
+    return await job_crud.get_datas(
+        start_sql=select(job_crud.model).join(
+            doc_crud.model, doc_crud.model.id == job_crud.model.document_id
+        ),
+        wheres=wheres,
+        scalar=True,
+    )
+
+
+@document_router.get(
+    "/{doc_id}/ingest",
+    response_model=schemas.IngestJobResponse,
+    summary="文档的知识导入进度",
+)
+async def document_ingest_info(doc_id: PathDocumentId, db: dependencies.DependSession):
+    crud = IngestJobCrud(db)
+    return await crud.get_data(wheres=crud.model.document_id == doc_id, strict=True)
+
+
+@document_router.post(
+    "/{doc_id}/ingest/retry",
+    response_model=schemas.IngestJobResponse,
+    summary="重试失败的知识导入",
+)
+async def document_ingest_retry(
+    doc_id: PathDocumentId,
+    db: dependencies.DependSession,
+    background_tasks: BackgroundTasks,
+):
+    crud = IngestJobCrud(db)
+    job = await crud.get_data(wheres=crud.model.document_id == doc_id, strict=True)
+    if job.status != schemas.IngestStatus.failed:
+        raise CustomException(ErrorCode.Other, "只能重试失败的任务")
+    # 保留已写入的批次，重新执行时跳过
+    job.status = schemas.IngestStatus.pending
+    job.attempts = 0
+    job = await crud.update_data(job, schema=True)
+    background_tasks.add_task(ingest_pool.submit, [job.id])
+    return job
+
+
 @label_router.get("/", response_model=PageResponse[schemas.LabelResponse])
 async def label_list(
     query_params: dependencies.DependPageQuery, db: dependencies.DependSession
@@ -1,41 +1,50 @@
 import asyncio
-import os
+import base64
+from contextlib import aclosing
 from datetime import datetime, timedelta
+from logging import getLogger
 from operator import attrgetter, itemgetter
 from typing import Annotated, Optional
 from uuid import uuid4
 
-import aiohttp
-from fastapi import APIRouter, Body, Form, Path, Query
+from fastapi import APIRouter, Body, Form, Path, Query, Request
 from fastapi.responses import StreamingResponse
-from omni_llm import (
-    AsyncChatBase,
-    ChatOutput,
-    async_chat_factory,
-    async_embedding_factory,
-)
+from omni_llm import AsyncChatBase, ChatOutput
 from sqlalchemy import and_, func
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import joinedload, selectinload
 
 from backend import dependencies
-from backend.crud import SessionCrud
+from backend.components.context import get_context_builder, schedule_fold
+from backend.components.embedding import embed_batcher
+from backend.components.history import TurnWriter
+from backend.components.retrieval import (
+    RETRIEVAL_TOP_K,
+    get_lore_packer,
+    retrieval_cache,
+)
+from backend.components.tts import StreamingSynthesizer, tts_cache
+from backend.crud import ConversationHistoryCrud, IngestJobCrud, SessionCrud
 from backend.exceptions import CustomException, ErrorCode
 from backend.models import conversation as models
 from backend.prompts import get_prompt_template
+from backend.response import (
+    OutputCoalescer,
+    cancel_on_disconnect,
+    sse_event,
+    with_deadline,
+)
 from backend.schemas import PageResponse
 from backend.schemas import conversation as schemas
-from backend.utils.nlp import FullTextQueryer
-from backend.utils.vector import get_vdb_with
+from backend.schemas.components.tts import TTSSegmentDict
+from backend.utils.llm import OPENAI_EMBED_MODEL, get_chat_client
+from backend.utils.metrics import StageTimer, counters
+from backend.utils.nlp import get_queryer
+from backend.utils.vector import VectorDatabase, get_vdb_with
 
 conversation_router = APIRouter(prefix="/conversation", tags=["对话"])
-
-OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
-OPENAI_BASE_URL = os.getenv("OPENAI_BASE_URL")
-OPENAI_EMBED_MODEL = os.getenv("OPENAI_EMBED_MODEL")
-OPENAI_EMBED_DIMS = int(os.getenv("OPENAI_EMBED_DIMS"))
-QINIU_API_KEY = os.getenv("QINIU_API_KEY")
-assert OPENAI_EMBED_DIMS == 1024, "OPENAI_EMBED_DIMS must be 1024"
+VDB_INDEX_NAME = "lorelm"
+logger = getLogger("lorelm.api.conversation")
 
 
 @conversation_router.get(
@@ -90,19 +99,18 @@ async def conversation_session_create(
 
 @conversation_router.post("/{session_id}", summary="继续会话")
 async def conversation_session_chat(
+    request: Request,
     user_id: dependencies.DependValidUserId,
     session_id: int = Path(description="会话ID"),
     content: str = Body(embed=True, description="会话创建表单"),
 ):
-    OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
-    OPENAI_BASE_URL = os.getenv("OPENAI_BASE_URL")
-    if not all([OPENAI_API_KEY, OPENAI_BASE_URL]):
+    client = get_chat_client()
+    if client is None:
         raise CustomException(ErrorCode.Other, "系统错误")
-    client = async_chat_factory("siliconflow")(
-        "Qwen/Qwen3-Next-80B-A3B-Instruct", -1, OPENAI_BASE_URL, OPENAI_API_KEY
-    )
     return StreamingResponse(
-        create_chat(content, user_id, session_id, client),
+        cancel_on_disconnect(
+            request, create_chat(content, user_id, session_id, client)
+        ),
         media_type="text/event-stream",
     )
 
@@ -113,166 +121,261 @@ async def create_chat(
     session_id: int,
     client: AsyncChatBase,
 ):
-    quweyer = FullTextQueryer()
-    embed_md = async_embedding_factory("siliconflow")(
-        OPENAI_EMBED_MODEL,
-        -1,
-        OPENAI_EMBED_DIMS,
-        OPENAI_BASE_URL,
-        OPENAI_API_KEY,
-    )
-    (query_string, _), embed_result = await asyncio.gather(
-        asyncio.to_thread(quweyer.question, query), embed_md.encode([query])
-    )
-    query_vector: list[float] = embed_result.v[0].tolist()
-    async with dependencies.get_session_with() as db, get_vdb_with() as vdb:
-        crud = SessionCrud(db)
-
-        session = await crud.get_data(
-            session_id,
-            wheres=crud.model.user_id == user_id,
-            options=[
-                selectinload(crud.model.messages),
-                selectinload(crud.model.characters),
-                joinedload(crud.model.act_character),
-                joinedload(crud.model.world),
-                joinedload(crud.model.user),
-            ],
-            strict=True,
-            scalar=True,
-        )
-        if not session.title or len(session.messages) < 2:
-            session.title = query[:32]
-        session.messages.append(
-            models.ConversationHistory(
-                session_id=session.id,
-                message_id=str(uuid4()),
-                role="user",
-                content=query,
-            )
-        )
-        session = await crud.update_data(
-            session, attribute_names=["updated_at", "messages"]
+    timer = StageTimer()
+    async with get_vdb_with() as vdb:
+        # 检索只依赖会话的世界与角色ID，与完整会话加载、历史写入并行
+        search_task = asyncio.create_task(
+            retrieve_lore(vdb, query, user_id, session_id, timer)
         )
+        try:
+            # 只在加载会话与写入提问时占用数据库连接，提交后 ORM 对象失效，后续只使用快照
+            async with dependencies.get_session_with() as db:
+                crud = SessionCrud(db)
+                history_crud = ConversationHistoryCrud(db)
 
-        roles_name = (
-            "[" + ", ".join(map(lambda x: f'"{x.nickname}"', session.characters)) + "]"
-        )
+                with timer.stage("session"):
+                    session = await crud.get_data(
+                        session_id,
+                        wheres=crud.model.user_id == user_id,
+                        options=[
+                            selectinload(crud.model.characters),
+                            joinedload(crud.model.act_character),
+                            joinedload(crud.model.world),
+                            joinedload(crud.model.user),
+                        ],
+                        strict=True,
+                        scalar=True,
+                    )
+                    # 只加载尚未纳入摘要的对话历史
+                    recent = await history_crud.get_recent(
+                        session.id, session.summary_message_id
+                    )
 
-        task_prompt = get_prompt_template("task").render(
-            roles_name=roles_name, user=session.user, language=session.user.language
-        )
-        policy_prompt = get_prompt_template("policy").render(
-            roles_name=roles_name,
-            user=session.user,
-            jailbreak=True,
-            policy=True,
-            language=session.user.language,
-        )
-        info_prompt = get_prompt_template("info").render(
-            roles=session.characters, user=session.user, language=session.user.language
-        )
+                with timer.stage("prompt"):
+                    roles_name = (
+                        "["
+                        + ", ".join(
+                            map(lambda x: f'"{x.nickname}"', session.characters)
+                        )
+                        + "]"
+                    )
 
-        message = [
-            {
-                "role": "system",
-                "content": policy_prompt,
-            },
-            {
-                "role": "system",
-                "content": info_prompt,
-            },
-            {
-                "role": "system",
-                "content": task_prompt,
-            },
-        ]
-        message.extend(
-            dict(role=message.role, content=message.content)
-            for message in session.messages
-        )
+                    task_prompt = get_prompt_template("task").render(
+                        roles_name=roles_name,
+                        user=session.user,
+                        language=session.user.language,
+                    )
+                    policy_prompt = get_prompt_template("policy").render(
+                        roles_name=roles_name,
+                        user=session.user,
+                        jailbreak=True,
+                        policy=True,
+                        language=session.user.language,
+                    )
+                    info_prompt = get_prompt_template("info").render(
+                        roles=session.characters,
+                        user=session.user,
+                        language=session.user.language,
+                    )
+                    summary = session.summary
+                    user = dict(nickname=session.user.nickname)
+                    language = session.user.language
 
-        yield "event: dialog_created\ndata: {}\n\n".format(
-            schemas.ConversationHistoryResponse.model_validate(
-                session.messages[-1]
-            ).model_dump_json()
-        )
+                with timer.stage("history"):
+                    title = None
+                    if not session.title or (
+                        session.summary_message_id is None and len(recent) < 2
+                    ):
+                        title = query[:32]
+                    recent.append(
+                        await history_crud.insert_message(
+                            session_id, str(uuid4()), "user", query
+                        )
+                    )
+                    await crud.touch(session_id, title=title)
+                    history = [
+                        schemas.ConversationHistoryResponse.model_validate(it)
+                        for it in recent
+                    ]
 
-        yield 'event: notice\ndata: {"content": "搜索世界知识中"}\n\n'
-        search_result = await vdb.search(
-            "lorelm",
-            worlds_id=session.world.id if session.world else None,
-            roles_id=list(map(attrgetter("id"), session.characters)),
-            query_string=query_string,
-            query_vector=query_vector,
-            includes=["content"],
-        )
-        if search_result:
-            print(f"检索到 {len(search_result)} 条知识")
-            kb_prompt = get_prompt_template("lorebook").render(
-                knowledgebase=map(itemgetter("content"), search_result)
-            )
-            message.append(
-                {
-                    "role": "system",
-                    "content": kb_prompt,
-                }
+            yield "event: dialog_created\ndata: {}\n\n".format(
+                history[-1].model_dump_json()
             )
 
-        ans: ChatOutput = None
-        async for chunk in client.generate(message):
-            if ans is None:
-                ans = chunk
-                session.messages.append(
-                    models.ConversationHistory(
-                        session_id=session.id,
-                        message_id=ans.id,
-                        role="assistant",
-                        content="",
-                        reasoning="",
-                        token_usage=0,
+            if not search_task.done():
+                yield 'event: notice\ndata: {"content": "搜索世界知识中"}\n\n'
+            search_result = await search_task
+        finally:
+            if not search_task.done():
+                search_task.cancel()
+
+    # 按 token 预算组装上下文，超出的早期对话折叠进摘要
+    with timer.stage("context"):
+        builder = await asyncio.to_thread(get_context_builder)
+        context = await asyncio.to_thread(
+            builder.build,
+            [policy_prompt, info_prompt, task_prompt],
+            history,
+            search_result,
+            summary,
+        )
+    message = context["messages"]
+    logger.info(
+        f"session {session_id} context {context['token_count']} tokens, "
+        f"{len(history) - len(context['overflow'])}/{len(history)} messages, "
+        f"{context['lore_count']}/{len(search_result)} lore"
+    )
+
+    ans: ChatOutput = None
+    writer = TurnWriter(session_id)
+    output = OutputCoalescer()
+    tts = StreamingSynthesizer(tts_cache.synthesize)
+    cancelled = False
+    try:
+        # 增量输出在时间窗口内合并下发，窗口到期时即使没有新增量也会下发
+        async with aclosing(
+            with_deadline(client.generate(message), output.timeout)
+        ) as stream:
+            async for chunk in stream:
+                if chunk is None:
+                    frame = output.flush()
+                elif ans is None:
+                    timer.mark("first_token")
+                    ans = chunk
+                    created = await writer.create(ans.id)
+                    yield "event: dialog_created\ndata: {}\n\n".format(
+                        created.model_dump_json()
                     )
+                    frame = output.add(chunk.content, chunk.reasoning)
+                else:
+                    ans += chunk
+                    frame = output.add(chunk.content, chunk.reasoning)
+                if frame is not None:
+                    yield frame
+                if chunk is not None:
+                    # 按间隔在后台保存部分回答
+                    writer.checkpoint(ans.content, ans.reasoning)
+                    # 边生成边合成，已合成的句子按顺序下发
+                    if chunk.content:
+                        tts.feed(chunk.content)
+                for segment in tts.ready():
+                    yield tts_event(segment)
+
+        frame = output.flush()
+        if frame is not None:
+            yield frame
+        tts.finish()
+        async for segment in tts.drain():
+            yield tts_event(segment)
+    except (asyncio.CancelledError, GeneratorExit):
+        # 客户端断开：大模型流已随 aclosing 关闭，这里取消合成并保存部分回答
+        cancelled = True
+        raise
+    finally:
+        tts.cancel()
+        if cancelled:
+            counters.inc("chat_cancelled")
+            logger.info(
+                f"session {session_id} cancelled by client at {timer.elapsed():.0f}ms"
+            )
+            if ans is not None:
+                # 流中断时大模型可能尚未返回用量
+                usage = ans.usage
+                writer.finish_later(
+                    ans.content,
+                    ans.reasoning,
+                    usage.prompt_tokens if usage else None,
+                    usage.total_tokens if usage else None,
                 )
-                session = await crud.update_data(
-                    session, attribute_names=["messages", "updated_at"]
-                )
-                yield "event: dialog_created\ndata: {}\n\n".format(
-                    schemas.ConversationHistoryResponse.model_validate(
-                        session.messages[-1]
-                    ).model_dump_json()
-                )
-            else:
-                ans += chunk
-            yield f"event: output\ndata: {chunk.model_dump_json(exclude_none=True)}\n\n"
 
-        async with aiohttp.ClientSession() as se:
-            headers = {
-                "Content-Type": "application/json",
-                "Authorization": f"Bearer {QINIU_API_KEY}",
-            }
-            data = {
-                "audio": {
-                    "voice_type": "qiniu_zh_female_tmjxxy",
-                    "encoding": "mp3",
-                    "speed_ratio": 1.0,
-                },
-                "request": {"text": ans.content},
-            }
-            async with se.post(
-                "https://openai.qiniu.com/v1/voice/tts", headers=headers, json=data
-            ) as response:
-                if response.status == 200:
-                    data = await response.content.read()
-                    yield b"event: tts\ndata: " + data + b"\n\n"
-                else:
-                    data = await response.content.read()
-                    print(response.status)
+    # 结束对话
+    yield sse_event("done")
+    timer.mark("done")
+    logger.info(f"session {session_id} stages: {timer.report()}")
+    if ans is None:
+        return
+    # 一次写入最终回答与token使用量
+    usage = ans.usage
+    await writer.finish(
+        ans.content,
+        ans.reasoning,
+        usage.prompt_tokens if usage else None,
+        usage.total_tokens if usage else None,
+    )
+    schedule_fold(session_id, summary, context["fold"], roles_name, user, language)
+
 
-        # 结束对话
-        yield f"event: done\n\n"
-        # 更新token使用量
-        session.messages[-1].content = ans.content
-        session.messages[-1].reasoning = ans.reasoning
-        session.messages[-1].token_usage = ans.usage.prompt_tokens
-        session.token_usage += ans.usage.total_tokens
-        session = await crud.update_data(session)
+async def retrieve_lore(
+    vdb: VectorDatabase,
+    query: str,
+    user_id: int,
+    session_id: int,
+    timer: StageTimer,
+) -> list[str]:
+    """查询分析、查询向量与检索范围查询并行，命中缓存时跳过检索，并在本地重排打包"""
+    # 向量请求最慢，先行发出（与其他会话的查询合批），命中缓存时取消
+    embed_task = asyncio.create_task(embed_batcher.encode([query]))
+
+    async def scope():
+        async with dependencies.get_session_with() as db:
+            world_id, roles_id = await SessionCrud(db).get_retrieval_scope(
+                session_id, user_id
+            )
+            # 知识库版本放入缓存键，其他进程导入后本进程的缓存随之失效
+            version = await IngestJobCrud(db).get_version(roles_id, world_id)
+            return world_id, roles_id, version
+
+    try:
+        (query_string, keywords), (world_id, roles_id, version) = await asyncio.gather(
+            timer.wrap("analyse", asyncio.to_thread(get_queryer().question, query)),
+            timer.wrap("scope", scope()),
+        )
+        includes = ["content", "content_ltks"]
+        key = retrieval_cache.key(
+            VDB_INDEX_NAME,
+            roles_id,
+            world_id,
+            query,
+            OPENAI_EMBED_MODEL,
+            RETRIEVAL_TOP_K,
+            version,
+            *includes,
+        )
+        hits = retrieval_cache.get(key)
+        if hits is None:
+            generations = retrieval_cache.snapshot(key)
+            query_vector = await timer.wrap("embed", embed_task)
+            hits = await timer.wrap(
+                "search",
+                vdb.search(
+                    VDB_INDEX_NAME,
+                    worlds_id=world_id,
+                    roles_id=roles_id,
+                    query_string=query_string,
+                    query_vector=query_vector[0].tolist(),
+                    top_k=RETRIEVAL_TOP_K,
+                    includes=includes,
+                ),
+            )
+            retrieval_cache.set(key, hits, generations)
+        else:
+            timer.mark("cache_hit")
+    finally:
+        if not embed_task.done():
+            embed_task.cancel()
+    with timer.stage("pack"):
+        packer = await asyncio.to_thread(get_lore_packer)
+        lore = await asyncio.to_thread(packer.pack, keywords, hits)
+    logger.debug(f"session {session_id} pack {len(lore)}/{len(hits)} lore")
+    return lore
+
+
+def tts_event(segment: TTSSegmentDict) -> bytes:
+    return sse_event(
+        "tts",
+        {
+            "index": segment["index"],
+            "text": segment["text"],
+            "data": base64.b64encode(segment["audio"]).decode("ascii"),
+        },
+    )
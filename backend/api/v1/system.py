@@ -0,0 +1,20 @@
+from fastapi import APIRouter
+
+from backend import dependencies
+from backend.utils.health import health_monitor
+from backend.utils.metrics import counters
+
+system_router = APIRouter(prefix="/system", tags=["系统"])
+
+
+@system_router.get("/health", summary="服务健康状态")
+async def system_health():
+    # 返回后台定期检查的结果，请求本身不探测、不重连
+    return {"services": health_monitor.snapshot()}
+
+
+@system_router.get(
+    "/metrics", summary="运行计数", dependencies=[dependencies.DependLogin]
+)
+async def system_metrics():
+    return {"counters": counters.snapshot()}
@@ -1 +1 @@
-from .chunk import chunking
+from .chunk import chunking, chunking_stream
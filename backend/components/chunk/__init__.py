@@ -1,14 +1,50 @@
 import asyncio
 import os
-from typing import Literal, Optional
+from functools import cache
+from logging import getLogger
+from typing import (
+    TYPE_CHECKING,
+    AsyncIterable,
+    AsyncIterator,
+    Hashable,
+    Iterable,
+    Literal,
+    Optional,
+    TypeVar,
+    Union,
+)
 
-from ...schemas.components.chunk import DocumentCreateDict
+from ...schemas.components.chunk import ChunkingConfig, DocumentCreateDict
+from ...utils.llm import OPENAI_EMBED_MODEL, get_embed_client
+from ..embedding import get_embedding_cache
+from .pool import chunk_pool_deinit, chunk_pool_init, run_chunker
+from .stream import batched, iter_text_blocks, read_chunks
 
-OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
-OPENAI_BASE_URL = os.getenv("OPENAI_BASE_URL")
-OPENAI_EMBED_MODEL = os.getenv("OPENAI_EMBED_MODEL")
-OPENAI_EMBED_DIMS = int(os.getenv("OPENAI_EMBED_DIMS"))
-assert OPENAI_EMBED_DIMS == 1024, "OPENAI_EMBED_DIMS must be 1024"
+if TYPE_CHECKING:
+    from ._base import ChunkingBase
+
+# 分块的目标 token 数，以及新块开头重复上一块末尾的 token 数
+CHUNK_SIZE = int(os.getenv("CHUNK_SIZE", "128"))
+CHUNK_OVERLAP_SIZE = int(os.getenv("CHUNK_OVERLAP_SIZE", "0"))
+# 单次向量请求的分块数量（服务商批量上限）与同时在途的请求数
+EMBED_CHUNK_BATCH_SIZE = int(os.getenv("EMBED_CHUNK_BATCH_SIZE", "32"))
+EMBED_CHUNK_CONCURRENCY = int(os.getenv("EMBED_CHUNK_CONCURRENCY", "4"))
+# 被限流时的重试次数与初始退避时间（秒）
+EMBED_MAX_RETRIES = int(os.getenv("EMBED_MAX_RETRIES", "5"))
+EMBED_RETRY_BACKOFF = float(os.getenv("EMBED_RETRY_BACKOFF", "1"))
+
+logger = getLogger("lorelm.components.chunk")
+K = TypeVar("K", bound=Hashable)
+T = TypeVar("T")
+
+
+async def chunk_init():
+    """启动分块进程池，预加载默认分块配置"""
+    await chunk_pool_init("naive", _naive_config())
+
+
+async def chunk_deinit():
+    await chunk_pool_deinit()
 
 
 async def chunking(
@@ -16,37 +52,186 @@ async def chunking(
     content: str,
     role_id: Optional[int],
     world_id: Optional[int],
+    doc_id: Optional[int] = None,
 ):
+    docs = list()
+    async for batch in chunking_stream(method, content, role_id, world_id, doc_id):
+        docs.extend(batch)
+    return docs
+
+
+async def chunking_stream(
+    method: Literal["naive"],
+    content: str,
+    role_id: Optional[int],
+    world_id: Optional[int],
+    doc_id: Optional[int] = None,
+) -> AsyncIterator[list[DocumentCreateDict]]:
+    """分块并按批计算向量，每批完成即产出，便于与写入向量库流水线执行"""
     match method:
         case "naive":
-            docs = await naive_chunk(content, role_id, world_id)
+            docs = await naive_chunk(content, role_id, world_id, doc_id)
         case _:
             raise ValueError(f"Unknown chunk method: {method}")
-    return docs
+    async for batch in embed_chunks(docs):
+        yield batch
 
 
-async def naive_chunk(content: str, role_id: Optional[int], world_id: Optional[int]):
-    from omni_llm import async_embedding_factory
+async def naive_chunk(
+    content: str,
+    role_id: Optional[int],
+    world_id: Optional[int],
+    doc_id: Optional[int] = None,
+) -> list[DocumentCreateDict]:
+    docs = await run_chunker("naive", _naive_config(), content)
+    return _set_scope(docs, role_id, world_id, doc_id)
 
-    from ...schemas.components import ChunkingConfig
-    from .naive import ChunkingNaive
 
-    embed_md = async_embedding_factory("siliconflow")(
-        OPENAI_EMBED_MODEL,
-        -1,
-        OPENAI_EMBED_DIMS,
-        OPENAI_BASE_URL,
-        OPENAI_API_KEY,
-    )
-    chunk_config = ChunkingConfig(
-        chunk_size=128, overlap_size=0, embed_tag=OPENAI_EMBED_MODEL
-    )
+async def naive_chunk_stream(
+    blocks: AsyncIterable[str],
+    role_id: Optional[int],
+    world_id: Optional[int],
+    doc_id: Optional[int] = None,
+) -> AsyncIterator[list[DocumentCreateDict]]:
+    """逐段分块，每段文本分块完成即产出，内存占用与段大小相关而与文件大小无关
 
-    docs = await asyncio.to_thread(ChunkingNaive(chunk_config.model_dump()), content)
-    content_vectors = (await embed_md.encode(list(doc["content"] for doc in docs))).v
+    每段末尾未完成的块、标题段落与块间重叠拼到下一段开头再分块，
+    段边界不会提前截断分块。
+    """
+    overlap, tail = "", ""
+    async for block in blocks:
+        content = "\n".join(it for it in (overlap, tail, block) if it)
+        del block
+        docs, overlap, tail = await run_chunker(
+            "naive", _naive_config(), content, partial=True
+        )
+        del content
+        if docs:
+            yield _set_scope(docs, role_id, world_id, doc_id)
+    if tail:
+        content = "\n".join(it for it in (overlap, tail) if it)
+        docs = await naive_chunk(content, role_id, world_id, doc_id)
+        if docs:
+            yield docs
 
-    for doc, content_vector in zip(docs, content_vectors):
-        doc["vector"] = content_vector
+
+def _set_scope(
+    docs: list[DocumentCreateDict],
+    role_id: Optional[int],
+    world_id: Optional[int],
+    doc_id: Optional[int],
+) -> list[DocumentCreateDict]:
+    for doc in docs:
         doc["role_id"] = role_id
         doc["world_id"] = world_id
+        doc["doc_id"] = doc_id
     return docs
+
+
+@cache
+def get_chunker(method: Literal["naive"], config: ChunkingConfig) -> "ChunkingBase":
+    """按分块方式与配置共享的分块器，分词器与 TokenPredicter 只在首次创建时加载
+
+    分块器只读，可在多个线程中同时使用。
+    """
+    from .naive import ChunkingNaive
+
+    match method:
+        case "naive":
+            return ChunkingNaive(config.model_dump())
+        case _:
+            raise ValueError(f"Unknown chunk method: {method}")
+
+
+def _naive_config() -> ChunkingConfig:
+    return ChunkingConfig(
+        chunk_size=CHUNK_SIZE,
+        overlap_size=CHUNK_OVERLAP_SIZE,
+        embed_tag=OPENAI_EMBED_MODEL,
+    )
+
+
+async def embed_chunks(
+    docs: list[DocumentCreateDict],
+    batch_size: int = EMBED_CHUNK_BATCH_SIZE,
+    concurrency: int = EMBED_CHUNK_CONCURRENCY,
+) -> AsyncIterator[list[DocumentCreateDict]]:
+    """按批计算分块向量，按完成顺序产出"""
+    batches = ((i, docs[i : i + batch_size]) for i in range(0, len(docs), batch_size))
+    async for _, batch in embed_batches(batches, concurrency):
+        yield batch
+
+
+async def embed_batches(
+    batches: Union[
+        Iterable[tuple[K, list[DocumentCreateDict]]],
+        AsyncIterable[tuple[K, list[DocumentCreateDict]]],
+    ],
+    concurrency: int = EMBED_CHUNK_CONCURRENCY,
+) -> AsyncIterator[tuple[K, list[DocumentCreateDict]]]:
+    """计算各批分块的向量
+
+    至多 concurrency 批同时在途，被限流时指数退避重试，按完成顺序连同批次键一起产出；
+    在途批次已满时暂停读取 batches，流式输入时内存占用与批大小相关。
+    只有缓存中没有的分块才请求向量模型。
+    """
+    embed_md = get_embed_client()
+    if embed_md is None:
+        raise RuntimeError("embedding client is not initialized")
+    embedding_cache = await asyncio.to_thread(get_embedding_cache)
+
+    async def encode(texts: list[str]):
+        for attempt in range(EMBED_MAX_RETRIES + 1):
+            try:
+                return (await embed_md.encode(texts)).v
+            except Exception as e:
+                if attempt == EMBED_MAX_RETRIES or not _is_rate_limited(e):
+                    raise e
+                delay = EMBED_RETRY_BACKOFF * 2**attempt
+                logger.warning(f"embedding rate limited, retry in {delay:.1f}s")
+                await asyncio.sleep(delay)
+
+    async def embed(key: K, batch: list[DocumentCreateDict]):
+        contents = [doc["content"] for doc in batch]
+        if embedding_cache is not None:
+            vectors = await embedding_cache.encode(contents, encode)
+        else:
+            vectors = await encode(contents)
+        for doc, vector in zip(batch, vectors):
+            doc["vector"] = vector
+        return key, batch
+
+    if not isinstance(batches, AsyncIterable):
+        batches = _aiter(batches)
+    pending: set[asyncio.Task] = set()
+    try:
+        async for key, batch in batches:
+            pending.add(asyncio.create_task(embed(key, batch)))
+            if len(pending) >= concurrency:
+                done, pending = await asyncio.wait(
+                    pending, return_when=asyncio.FIRST_COMPLETED
+                )
+                for task in done:
+                    yield task.result()
+        while pending:
+            done, pending = await asyncio.wait(
+                pending, return_when=asyncio.FIRST_COMPLETED
+            )
+            for task in done:
+                yield task.result()
+    finally:
+        for task in pending:
+            task.cancel()
+
+
+async def _aiter(items: Iterable[T]) -> AsyncIterator[T]:
+    for item in items:
+        yield item
+
+
+def _is_rate_limited(e: Exception) -> bool:
+    status = getattr(e, "status", None) or getattr(e, "status_code", None)
+    if status == 429:
+        return True
+    message = str(e).lower()
+    return "429" in message or "rate limit" in message
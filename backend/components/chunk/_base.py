@@ -5,8 +5,8 @@ from typing import Generic
 from typing_extensions import TypeVar
 
 from ...schemas.components import ChunkingConfig, DocumentDict
-from ...utils.nlp import Tokenizer
-from ...utils.token_predict import TokenPredicter
+from ...utils.nlp import get_tokenizer
+from ...utils.token_predict import get_token_predicter
 
 ConfigType = TypeVar("ConfigType", bound="ChunkingConfig", default="ChunkingConfig")
 
@@ -15,8 +15,8 @@ class ChunkingBase(ABC, Generic[ConfigType]):
     """分块基类"""
 
     def __init__(self, config: ConfigType):
-        self.tokenizer = Tokenizer()
-        self.embed_predict = TokenPredicter(config["embed_tag"])
+        self.tokenizer = get_tokenizer()
+        self.embed_predict = get_token_predicter(config["embed_tag"])
         self._config = config
         self.logger = getLogger("lorelm.components.chunk")
 
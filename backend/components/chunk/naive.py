@@ -1,46 +1,88 @@
 import re
+from bisect import bisect_left
 
 from ...schemas.components.chunk import DocumentCreateDict
 from ...utils.common import get_unix_timestamp
 from ._base import ChunkingBase
 
+# 文本片段与其各 token 在片段内的起始字符位置，token 数即位置列表长度
+Piece = tuple[str, list[int]]
+
 
 class ChunkingNaive(ChunkingBase):
+    """朴素分块
+
+    每行文本与每个表格只分词一次（带字符偏移），段落归并、超长切分、
+    块合并与块间重叠都由偏移推算 token 数，不再重复分词。
+    """
+
     def __call__(self, content: str) -> list[DocumentCreateDict]:
+        return self._chunk(content, partial=False)[0]
+
+    def chunk_partial(self, content: str) -> tuple[list[DocumentCreateDict], str, str]:
+        """流式分块的中间一段，末尾未完成的块不产出
+
+        返回 (分块, overlap, tail)。tail 为末尾不超过 chunk_size 的块与结尾不超过
+        3 倍 chunk_size 的标题段落，尚未产出；overlap 为末尾已完成块的最后
+        overlap_size 个 token，只作为下一块的开头。调用方把两者依次拼到下一段开头
+        重新分块，使段边界处的块合并、标题合并与块间重叠与整篇分块一致。
+        """
+        return self._chunk(content, partial=True)
+
+    def _chunk(
+        self, content: str, partial: bool
+    ) -> tuple[list[DocumentCreateDict], str, str]:
         if not content:
             self.logger.warning(f"file do not contain anything")
-            return []
+            return [], "", ""
+        overlap_size = self.config["overlap_size"]
         chunk_size = self.config["chunk_size"]
 
         no_table_content, tables = self._table_extract(content)
         self.logger.info(f"提取表格 {len(tables)} 个")
 
         wait_for_process = [it for it in no_table_content.split("\n") if it]
-        batch_token_cost = self.embed_predict.encode_batch(wait_for_process)
+        offsets = self.embed_predict.offsets_batch(wait_for_process + tables)
+        line_offsets = offsets[: len(wait_for_process)]
+        table_offsets = offsets[len(wait_for_process) :]
 
-        sections: list[str] = []
+        sections: list[Piece] = []
 
-        for token_cost, section in zip(batch_token_cost, wait_for_process):
-            if token_cost > 3 * chunk_size:
-                sections.append(section[: int(len(section) / 2)])
-                sections.append(section[int(len(section) / 2) :])
+        for section, starts in zip(wait_for_process, line_offsets):
+            if len(starts) > 3 * chunk_size:
+                sections.extend(_split_at(section, starts, len(starts) // 2))
             else:
                 if section.strip().find("#") == 0:
-                    sections.append(section)
-                elif sections and sections[-1][0].strip().find("#") == 0:
+                    sections.append((section, starts))
+                elif sections and sections[-1][0][0].strip().find("#") == 0:
                     sec_ = sections.pop(-1)
-                    sections.append(sec_ + "\n" + section)
+                    sections.append(_join(sec_, (section, starts), "\n"))
                 else:
-                    sections.append(section)
+                    sections.append((section, starts))
 
+        tail: list[str] = []
+        if (
+            partial
+            and sections
+            and sections[-1][0].startswith("#")
+            and len(sections[-1][1]) <= 3 * chunk_size
+        ):
+            # 结尾的标题段落还要并入下一段开头的行，超长时才在本段按分隔符切分
+            tail.append(sections.pop()[0])
         chunks = self._merge_chunking(sections)
+        overlap = ""
+        if partial and chunks:
+            text, starts = chunks[-1]
+            if len(starts) <= chunk_size:
+                tail.insert(0, chunks.pop()[0])
+            elif 0 < overlap_size < len(starts):
+                overlap = _split_at(text, starts, len(starts) - overlap_size)[1][0]
         self.logger.info(f"分块 {len(chunks)} 个")
-        docs = [self.text_tokenize(chunk) for chunk in chunks if chunk.strip()]
+        docs = [self.text_tokenize(text) for text, _ in chunks if text.strip()]
 
-        number_of_tokens = list(self.embed_predict.encode_batch(tables))
-        for table, number_of_token in zip(tables, number_of_tokens):
-            docs.extend(self.table_tokenize(table, number_of_token, False))
-        return docs
+        for table, starts in zip(tables, table_offsets):
+            docs.extend(self.table_tokenize(table, starts, False))
+        return docs, overlap, "\n".join(tail)
 
     def _table_extract(self, content: str):
         tables: list[str] = []
@@ -56,37 +98,38 @@ class ChunkingNaive(ChunkingBase):
             content = HTML_TABLE_PARTERN.sub("", content)
         return content, tables
 
-    def _merge_chunking(self, sections: list[str]) -> list[str]:
+    def _merge_chunking(self, sections: list[Piece]) -> list[Piece]:
         if not sections:
             return []
         chunk_size = self.config["chunk_size"]
         overlap_size = self.config["overlap_size"]
-        cks = [""]
-        tk_nums = [0]
+        cks: list[Piece] = [("", [])]
 
-        def add_chunk(text: str, tnum: int):
-            nonlocal cks, tk_nums
+        def add_chunk(piece: Piece):
             # Ensure that the length of the merged chunk does not exceed chunk_token_num
-            if tk_nums[-1] > chunk_size:
-                cks.append(text)
-                tk_nums.append(tnum)
+            if len(cks[-1][1]) > chunk_size:
+                # 新块以上一块末尾 overlap_size 个 token 开头
+                text, starts = cks[-1]
+                if 0 < overlap_size < len(starts):
+                    overlap = _split_at(text, starts, len(starts) - overlap_size)[1]
+                    piece = _join(overlap, piece)
+                cks.append(piece)
             else:
-                cks[-1] += text
-                tk_nums[-1] += tnum
+                cks[-1] = _join(cks[-1], piece)
 
-        number_of_tokens = self.embed_predict.encode_batch(sections)
         pattern = get_delimiters("\n。；！？")
-        for number_of_token, section in zip(number_of_tokens, sections):
+        for section, starts in sections:
             # 避免一个段落太大超token
-            if number_of_token > 3 * chunk_size:
-                split_sec = re.split(r"(%s)" % pattern, section, flags=re.DOTALL)
-                sub_number_of_tokens = self.embed_predict.encode_batch(split_sec)
-                for sub_sec, sub_n_of_token in zip(split_sec, sub_number_of_tokens):
+            if len(starts) > 3 * chunk_size:
+                pos = 0
+                for sub_sec in re.split(r"(%s)" % pattern, section, flags=re.DOTALL):
+                    sub_piece = _slice(section, starts, pos, pos + len(sub_sec))
+                    pos += len(sub_sec)
                     if re.match(f"^{pattern}$", sub_sec):
                         continue
-                    add_chunk(sub_sec, sub_n_of_token)
+                    add_chunk(sub_piece)
             else:
-                add_chunk(section, number_of_token)
+                add_chunk((section, starts))
 
         return cks
 
@@ -119,23 +162,28 @@ class ChunkingNaive(ChunkingBase):
     def table_tokenize(
         self,
         table: str,
-        number_of_token: int,
+        starts: list[int],
         is_english: bool,
         batch_size: int = 8,
     ) -> list[DocumentCreateDict]:
         docs = []
+        # 去掉首尾空白后偏移整体前移
+        lstrip = len(table) - len(table.lstrip())
         table = table.strip()
         if not table:
             return docs
         # 解决单个表格太大的问题
         # TODO：大表格分隔待优化
-        if number_of_token > 8096:
+        if len(starts) > 8096:
             rows = table.split("<tr>")
-            sub_number_of_tokens = self.embed_predict.encode_batch(rows)
             tbs = [[]]
             row_token = 0
-            for row, sub_number_of_token in zip(rows, sub_number_of_tokens):
-                row_token += sub_number_of_token
+            pos = lstrip
+            for row in rows:
+                row_token += bisect_left(starts, pos + len(row)) - bisect_left(
+                    starts, pos
+                )
+                pos += len(row) + len("<tr>")
                 tbs[-1].append(row)
                 if row_token > 4096:
                     tbs.append([])
@@ -152,6 +200,23 @@ class ChunkingNaive(ChunkingBase):
         return docs
 
 
+def _slice(text: str, starts: list[int], begin: int, end: int) -> Piece:
+    """截取 [begin, end) 字符范围，保留起始位置落在范围内的 token"""
+    lo, hi = bisect_left(starts, begin), bisect_left(starts, end)
+    return text[begin:end], [it - begin for it in starts[lo:hi]]
+
+
+def _split_at(text: str, starts: list[int], index: int) -> tuple[Piece, Piece]:
+    """在第 index 个 token 的起始位置切成两段"""
+    pos = starts[index]
+    return _slice(text, starts, 0, pos), _slice(text, starts, pos, len(text))
+
+
+def _join(left: Piece, right: Piece, sep: str = "") -> Piece:
+    shift = len(left[0]) + len(sep)
+    return left[0] + sep + right[0], left[1] + [it + shift for it in right[1]]
+
+
 # markdown 格式 表格
 BORDER_TABLE_PARTERN = re.compile(
     r"""
@@ -0,0 +1,110 @@
+import asyncio
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from logging import getLogger
+from typing import Literal, Optional, Union
+
+from ...schemas.components.chunk import ChunkingConfig, DocumentCreateDict
+
+# 分块进程数，0 表示不启用进程池，在线程中分块
+CHUNK_WORKERS = int(os.getenv("CHUNK_WORKERS", str(min(os.cpu_count() or 1, 4))))
+
+logger = getLogger("lorelm.components.chunk")
+_executor: Optional[ProcessPoolExecutor] = None
+_preload: Optional[tuple[str, ChunkingConfig]] = None
+
+
+def _worker_init(method: str, config: ChunkingConfig):
+    """子进程启动时预加载分词器前缀树与 TokenPredicter"""
+    from ...utils.nlp import get_tokenizer
+    from . import get_chunker
+
+    get_tokenizer()
+    get_chunker(method, config)
+
+
+def _worker_chunk(
+    method: Literal["naive"], config: ChunkingConfig, content: str
+) -> list[DocumentCreateDict]:
+    from . import get_chunker
+
+    return get_chunker(method, config)(content)
+
+
+def _worker_chunk_partial(
+    method: Literal["naive"], config: ChunkingConfig, content: str
+) -> tuple[list[DocumentCreateDict], str, str]:
+    from . import get_chunker
+
+    return get_chunker(method, config).chunk_partial(content)
+
+
+def _worker_ping() -> int:
+    return os.getpid()
+
+
+def _create_executor() -> ProcessPoolExecutor:
+    # spawn 启动，不继承父进程的事件循环与线程状态
+    return ProcessPoolExecutor(
+        max_workers=CHUNK_WORKERS,
+        mp_context=multiprocessing.get_context("spawn"),
+        initializer=_worker_init,
+        initargs=_preload,
+    )
+
+
+async def chunk_pool_init(method: Literal["naive"], config: ChunkingConfig):
+    """启动分块进程池，子进程随即并行预加载，等待进程池可用后返回"""
+    global _executor, _preload
+
+    if CHUNK_WORKERS <= 0 or _executor is not None:
+        return
+    _preload = (method, config)
+    _executor = _create_executor()
+    loop = asyncio.get_running_loop()
+    await asyncio.gather(
+        *(loop.run_in_executor(_executor, _worker_ping) for _ in range(CHUNK_WORKERS))
+    )
+    logger.info(f"chunk pool started, {CHUNK_WORKERS} workers")
+
+
+async def chunk_pool_deinit():
+    global _executor
+
+    if _executor is not None:
+        await asyncio.to_thread(_executor.shutdown, cancel_futures=True)
+    _executor = None
+    logger.info(f"chunk pool deinit finished")
+
+
+async def run_chunker(
+    method: Literal["naive"],
+    config: ChunkingConfig,
+    content: str,
+    partial: bool = False,
+) -> Union[list[DocumentCreateDict], tuple[list[DocumentCreateDict], str, str]]:
+    """分块，进程池未启动时在线程中执行；进程池损坏时重建并重试一次
+
+    partial 为 True 时按流式分块的中间段处理，见 ChunkingNaive.chunk_partial。
+    """
+    global _executor
+
+    worker = _worker_chunk_partial if partial else _worker_chunk
+    if _executor is None:
+        return await asyncio.to_thread(worker, method, config, content)
+
+    loop = asyncio.get_running_loop()
+    for attempt in range(2):
+        executor = _executor
+        try:
+            return await loop.run_in_executor(executor, worker, method, config, content)
+        except BrokenProcessPool:
+            # 子进程异常退出后进程池不可再用，重建后在新进程池上重试
+            if _executor is executor:
+                logger.warning("chunk pool broken, restarting")
+                _executor = _create_executor()
+                executor.shutdown(wait=False, cancel_futures=True)
+            if attempt:
+                raise
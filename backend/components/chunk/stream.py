@@ -0,0 +1,83 @@
+import codecs
+import os
+from typing import AsyncIterable, AsyncIterator, TypeVar
+
+from aiohttp import ClientResponse
+
+# 流式分块时每段文本的目标字符数，段落在空行处切分
+CHUNK_STREAM_BLOCK_SIZE = int(os.getenv("CHUNK_STREAM_BLOCK_SIZE", "262144"))
+# 读取对象存储文件的单次字节数
+CHUNK_STREAM_READ_SIZE = 64 * 1024
+
+T = TypeVar("T")
+
+
+async def read_chunks(
+    reader: ClientResponse, size: int = CHUNK_STREAM_READ_SIZE
+) -> AsyncIterator[bytes]:
+    """按块读取对象存储返回的文件流，读完或中断时释放连接"""
+    try:
+        async for chunk in reader.content.iter_chunked(size):
+            yield chunk
+    finally:
+        reader.release()
+
+
+async def iter_text_blocks(
+    chunks: AsyncIterable[bytes],
+    block_size: int = CHUNK_STREAM_BLOCK_SIZE,
+    encoding: str = "utf-8",
+) -> AsyncIterator[str]:
+    """增量解码字节流，按段落边界切成不超过约 block_size 字符的文本段
+
+    切分点优先选空行（markdown 表格内没有空行），避免切在未闭合的 html 表格内；
+    找不到空行时退化为换行，缓冲超过 4 倍 block_size 仍无换行时直接切分。
+    """
+    decoder = codecs.getincrementaldecoder(encoding)()
+    buffer = ""
+    async for chunk in chunks:
+        buffer += decoder.decode(chunk)
+        while len(buffer) >= block_size:
+            end = _cut(buffer, block_size)
+            if end <= 0:
+                break
+            yield buffer[:end]
+            buffer = buffer[end:]
+    buffer += decoder.decode(b"", final=True)
+    if buffer:
+        yield buffer
+
+
+def _cut(buffer: str, block_size: int) -> int:
+    """缓冲区中的切分位置，返回 0 表示继续读取"""
+    window = buffer[: block_size * 4]
+    end = window.rfind("\n\n", 0, block_size)
+    if end < 0:
+        end = window.find("\n\n", block_size)
+    if end >= 0:
+        end += 2
+        # 切分点落在 html 表格内时退回到表格之前
+        start = window.rfind("<table", 0, end)
+        if start > window.rfind("</table>", 0, end):
+            line = window.rfind("\n", 0, start) + 1
+            end = line if line > 0 else -1
+    if end < 0 and len(buffer) > block_size * 4:
+        end = window.rfind("\n") + 1 or len(window)
+    return max(end, 0)
+
+
+async def batched(
+    items: AsyncIterable[list[T]], batch_size: int
+) -> AsyncIterator[tuple[int, list[T]]]:
+    """把逐段产出的列表重新分成固定大小的批次，连同批次起始下标一起产出"""
+    batch: list[T] = []
+    offset = 0
+    async for part in items:
+        for item in part:
+            batch.append(item)
+            if len(batch) >= batch_size:
+                yield offset, batch
+                offset += len(batch)
+                batch = []
+    if batch:
+        yield offset, batch
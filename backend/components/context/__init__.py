@@ -0,0 +1 @@
+from .builder import ContextBuilder, get_context_builder, schedule_fold
@@ -0,0 +1,208 @@
+import asyncio
+import os
+from functools import cache
+from logging import getLogger
+from typing import Any, Iterable, Optional, Sequence
+
+from ...crud import SessionCrud
+from ...dependencies.database import get_session_with
+from ...prompts import get_prompt_template
+from ...schemas.components.context import ContextDict
+from ...schemas.conversation import ConversationHistoryResponse
+from ...utils.llm import OPENAI_CHAT_MODEL, get_chat_client
+from ...utils.token_predict import TokenPredicter, get_token_predicter
+
+CHAT_CONTEXT_BUDGET = int(os.getenv("CHAT_CONTEXT_BUDGET", "12288"))
+CHAT_LORE_RATIO = float(os.getenv("CHAT_LORE_RATIO", "0.3"))
+CHAT_SUMMARY_KEEP_RATIO = float(os.getenv("CHAT_SUMMARY_KEEP_RATIO", "0.5"))
+CHAT_SUMMARY_MAX_LENGTH = int(os.getenv("CHAT_SUMMARY_MAX_LENGTH", "800"))
+# 每条消息的格式开销（角色标记、分隔符）
+MESSAGE_OVERHEAD = 4
+
+logger = getLogger("lorelm.components.context")
+
+
+class ContextBuilder:
+    """按 token 预算组装对话上下文
+
+    系统提示词与摘要始终保留，知识库最多占用 ``lore_ratio`` 的预算，
+    剩余预算由新到旧纳入对话历史，放不下的历史交由摘要折叠。
+    """
+
+    def __init__(
+        self,
+        predicter: TokenPredicter,
+        budget: int = CHAT_CONTEXT_BUDGET,
+        lore_ratio: float = CHAT_LORE_RATIO,
+        keep_ratio: float = CHAT_SUMMARY_KEEP_RATIO,
+    ):
+        self.predicter = predicter
+        self.budget = budget
+        self.lore_ratio = lore_ratio
+        self.keep_ratio = keep_ratio
+
+    def build(
+        self,
+        system_prompts: Sequence[str],
+        history: Sequence[ConversationHistoryResponse],
+        lore: Sequence[str] = (),
+        summary: Optional[str] = None,
+    ) -> ContextDict:
+        """组装上下文
+
+        :param system_prompts: 系统提示词，始终保留
+        :type system_prompts: Sequence[str]
+        :param history: 尚未纳入摘要的对话历史，按时间正序，最后一条为当前提问
+        :type history: Sequence[ConversationHistoryResponse]
+        :param lore: 按相关度排序的知识条目
+        :type lore: Sequence[str]
+        :param summary: 早期对话摘要
+        :type summary: Optional[str]
+        :return: 上下文
+        :rtype: ContextDict
+        """
+        messages = [dict(role="system", content=it) for it in system_prompts]
+        if summary:
+            messages.append(
+                dict(
+                    role="system",
+                    content=get_prompt_template("summary").render(summary=summary),
+                )
+            )
+        token_count = sum(self._count(it["content"] for it in messages))
+        remaining = self.budget - token_count
+
+        history_costs = self._count(it.content or "" for it in history)
+        latest_cost = history_costs[-1] if history_costs else 0
+
+        # 知识库
+        lore_budget = min(int(self.budget * self.lore_ratio), remaining - latest_cost)
+        lore_items: list[str] = []
+        lore_tokens = 0
+        if lore and lore_budget > 0:
+            for item, cost in zip(lore, self._count(lore, MESSAGE_OVERHEAD // 2)):
+                if lore_tokens + cost > lore_budget:
+                    break
+                lore_items.append(item)
+                lore_tokens += cost
+        lore_prompt = None
+        if lore_items:
+            lore_prompt = get_prompt_template("lorebook").render(
+                knowledge_base=lore_items
+            )
+            lore_tokens = self._count((lore_prompt,))[0]
+            remaining -= lore_tokens
+
+        # 由新到旧纳入对话历史，当前提问始终保留
+        start = self._window(history_costs, remaining)
+        if start == len(history) and history:
+            start -= 1
+        used = sum(history_costs[start:])
+
+        overflow = list(history[:start])
+        fold: list[ConversationHistoryResponse] = []
+        if overflow:
+            # 多折叠一部分，为后续几轮留出余量，避免每轮都触发摘要
+            keep = self._window(history_costs, int(remaining * self.keep_ratio))
+            fold = list(history[: min(keep, len(history) - 1)])
+
+        messages.extend(dict(role=it.role, content=it.content) for it in history[start:])
+        if lore_prompt is not None:
+            messages.append(dict(role="system", content=lore_prompt))
+
+        return ContextDict(
+            messages=messages,
+            token_count=token_count + used + lore_tokens,
+            lore_count=len(lore_items),
+            overflow=overflow,
+            fold=fold,
+        )
+
+    @staticmethod
+    def _window(costs: list[int], budget: int) -> int:
+        """返回预算内能保留的最早一条历史的下标"""
+        start, used = len(costs), 0
+        while start > 0 and used + costs[start - 1] <= budget:
+            start -= 1
+            used += costs[start]
+        return start
+
+    def _count(self, texts: Iterable[str], overhead: int = MESSAGE_OVERHEAD):
+        texts = list(texts)
+        if not texts:
+            return []
+        return [it + overhead for it in self.predicter.encode_batch(texts)]
+
+
+@cache
+def get_context_builder() -> ContextBuilder:
+    """共享的上下文构建器（首次调用会加载分词器）"""
+    return ContextBuilder(get_token_predicter(OPENAI_CHAT_MODEL))
+
+
+_folding: set[int] = set()
+_background: set[asyncio.Task] = set()
+
+
+def schedule_fold(
+    session_id: int,
+    summary: Optional[str],
+    messages: Sequence[ConversationHistoryResponse],
+    roles_name: str,
+    user: dict[str, Any],
+    language: str,
+):
+    """后台将溢出的对话历史合并进会话摘要，同一会话同时只运行一个"""
+    if not messages or session_id in _folding:
+        return
+    _folding.add(session_id)
+    items = [dict(id=it.id, role=it.role, content=it.content) for it in messages]
+    task = asyncio.create_task(
+        _fold_summary(session_id, summary, items, roles_name, user, language)
+    )
+    _background.add(task)
+    task.add_done_callback(_background.discard)
+
+
+async def _fold_summary(
+    session_id: int,
+    summary: Optional[str],
+    messages: list[dict[str, Any]],
+    roles_name: str,
+    user: dict[str, Any],
+    language: str,
+):
+    try:
+        client = get_chat_client()
+        prompt = get_prompt_template("summarize").render(
+            summary=summary,
+            messages=messages,
+            roles_name=roles_name,
+            user=user,
+            language=language,
+            max_length=CHAT_SUMMARY_MAX_LENGTH,
+        )
+        ans = None
+        async for chunk in client.generate([dict(role="user", content=prompt)]):
+            if ans is None:
+                ans = chunk
+            else:
+                ans += chunk
+        if ans is None or not ans.content:
+            logger.warning(f"session {session_id} summary empty")
+            return
+        async with get_session_with() as db:
+            crud = SessionCrud(db)
+            values = {
+                "summary": ans.content.strip(),
+                "summary_message_id": messages[-1]["id"],
+            }
+            # 大模型未返回用量时不累计
+            if ans.usage is not None:
+                values["token_usage"] = crud.model.token_usage + ans.usage.total_tokens
+            await crud.update_data(values, session_id)
+        logger.info(f"session {session_id} fold {len(messages)} messages into summary")
+    except Exception as e:
+        logger.exception(f"session {session_id} summary failed: {e}")
+    finally:
+        _folding.discard(session_id)
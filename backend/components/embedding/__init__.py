@@ -0,0 +1,2 @@
+from .batcher import EmbeddingBatcher, embed_batcher
+from .cache import EmbeddingCache, get_embedding_cache
@@ -0,0 +1,155 @@
+import asyncio
+import os
+from logging import getLogger
+from typing import Any, Optional
+
+from ...utils.llm import get_embed_client
+from ...utils.metrics import counters
+from .cache import get_embedding_cache
+
+# 攒满该数量的文本或等待超过该时间（毫秒）即发出一次批量请求
+EMBED_BATCH_SIZE = int(os.getenv("EMBED_BATCH_SIZE", "16"))
+EMBED_BATCH_DELAY = float(os.getenv("EMBED_BATCH_DELAY", "5")) / 1e3
+# 同时在途的批量请求数
+EMBED_BATCH_CONCURRENCY = int(os.getenv("EMBED_BATCH_CONCURRENCY", "4"))
+
+
+class _Request:
+    __slots__ = ("texts", "future")
+
+    def __init__(self, texts: list[str], future: asyncio.Future):
+        self.texts = texts
+        self.future = future
+
+
+class EmbeddingBatcher:
+    """向量请求合批
+
+    各协程的 ``encode`` 请求进入同一队列，攒满 ``batch_size`` 条文本或等待超过
+    ``delay`` 后合并为一次 ``encode`` 调用，再按顺序把向量分发回调用方。
+    在途请求数达到 ``concurrency`` 时新请求继续排队，批次随之变大。
+    """
+
+    def __init__(
+        self,
+        batch_size: int = EMBED_BATCH_SIZE,
+        delay: float = EMBED_BATCH_DELAY,
+        concurrency: int = EMBED_BATCH_CONCURRENCY,
+    ):
+        self.batch_size = batch_size
+        self.delay = delay
+        self.concurrency = concurrency
+        self._pending: list[_Request] = []
+        self._pending_texts = 0
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self._background: set[asyncio.Task] = set()
+        self.logger = getLogger("lorelm.components.embedding")
+
+    async def encode(self, texts: list[str]) -> Any:
+        """获取查询文本向量，先查缓存，未命中的文本进入队列
+
+        :param texts: 文本列表
+        :type texts: list[str]
+        :return: 与 texts 顺序一致的向量
+        :rtype: np.ndarray
+        """
+        if not texts:
+            return []
+        embedding_cache = await asyncio.to_thread(get_embedding_cache)
+        if embedding_cache is not None:
+            # 查询文本只放入内存缓存，不持久化
+            return await embedding_cache.encode(texts, self._enqueue, persist=False)
+        return await self._enqueue(texts)
+
+    async def _enqueue(self, texts: list[str]) -> Any:
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.concurrency)
+        future = asyncio.get_running_loop().create_future()
+        self._pending.append(_Request(list(texts), future))
+        self._pending_texts += len(texts)
+        counters.inc("embed_requests")
+        self._schedule()
+        return await future
+
+    def _schedule(self):
+        if self._pending_texts >= self.batch_size:
+            self._cancel_timer()
+            self._spawn()
+        elif self._pending and self._timer is None:
+            self._timer = asyncio.get_running_loop().call_later(
+                self.delay, self._on_timer
+            )
+
+    def _on_timer(self):
+        self._timer = None
+        if self._pending:
+            self._spawn()
+
+    def _cancel_timer(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+
+    def _spawn(self):
+        task = asyncio.create_task(self._send())
+        self._background.add(task)
+        task.add_done_callback(self._background.discard)
+
+    def _take(self) -> list[_Request]:
+        """取出一批请求，调用方已取消的请求直接丢弃"""
+        batch: list[_Request] = []
+        size = 0
+        while self._pending and (not batch or size < self.batch_size):
+            request = self._pending[0]
+            if batch and size + len(request.texts) > self.batch_size:
+                break
+            self._pending.pop(0)
+            self._pending_texts -= len(request.texts)
+            if request.future.done():
+                continue
+            batch.append(request)
+            size += len(request.texts)
+        return batch
+
+    async def _send(self):
+        async with self._semaphore:
+            # 取得并发名额后再取批次，等待期间到达的请求可以并入
+            batch = self._take()
+            if self._pending:
+                self._schedule()
+            if not batch:
+                return
+            texts = [text for request in batch for text in request.texts]
+            counters.inc("embed_batches")
+            counters.inc("embed_texts", len(texts))
+            counters.inc(f"embed_batch_size_le_{_bucket(len(texts))}")
+            try:
+                client = get_embed_client()
+                if client is None:
+                    raise RuntimeError("embedding client is not initialized")
+                vectors = (await client.encode(texts)).v
+            except Exception as e:
+                for request in batch:
+                    if not request.future.done():
+                        request.future.set_exception(e)
+                self.logger.warning(f"batch of {len(texts)} texts failed: {e}")
+                return
+        start = 0
+        for request in batch:
+            end = start + len(request.texts)
+            if not request.future.done():
+                request.future.set_result(vectors[start:end])
+            start = end
+        self.logger.debug(f"batch {len(batch)} requests, {len(texts)} texts")
+
+
+def _bucket(size: int) -> int:
+    """批大小所在的 2 的幂区间上界"""
+    bucket = 1
+    while bucket < size:
+        bucket *= 2
+    return bucket
+
+
+embed_batcher = EmbeddingBatcher()
@@ -0,0 +1,333 @@
+import asyncio
+import fcntl
+import hashlib
+import os
+import re
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+from functools import cache
+from logging import getLogger
+from typing import Awaitable, Callable, Optional, Sequence
+
+import numpy as np
+
+from ...utils.common import get_root_dir
+from ...utils.llm import OPENAI_EMBED_DIMS, OPENAI_EMBED_MODEL
+from ...utils.metrics import counters
+from ...utils.oss import get_oss_instance
+
+EMBED_CACHE_ENABLED = os.getenv("EMBED_CACHE_ENABLED", "true").lower() == "true"
+EMBED_CACHE_DIR = os.getenv("EMBED_CACHE_DIR", get_root_dir("data/embedding"))
+# 是否同步到对象存储，多实例部署时共享
+EMBED_CACHE_OSS = os.getenv("EMBED_CACHE_OSS", "false").lower() == "true"
+EMBED_CACHE_BUCKET = "lorelm"
+EMBED_CACHE_PREFIX = "embedding"
+# 查询向量的内存缓存条数
+EMBED_QUERY_CACHE_SIZE = int(os.getenv("EMBED_QUERY_CACHE_SIZE", "4096"))
+# 回源对象存储的并发数
+EMBED_CACHE_OSS_CONCURRENCY = 16
+
+DIGEST_SIZE = 32
+INITIAL_CAPACITY = 1024
+
+Encoder = Callable[[list[str]], Awaitable[Sequence]]
+
+
+def content_digest(text: str) -> bytes:
+    return hashlib.sha256(text.encode("utf-8")).digest()
+
+
+class _Store:
+    """本地向量文件
+
+    ``vectors.bin`` 为 float32 内存映射矩阵，``index.bin`` 按行顺序追加内容摘要，
+    行号即摘要在索引文件中的位置。先写向量再写摘要，中断后以两者较短者为准。
+    多个进程可共享同一目录：追加时持有 ``.lock`` 的排他锁，
+    并先读入其他进程追加的摘要，行号以索引文件中的记录数为准。
+    """
+
+    def __init__(self, path: str, dims: int):
+        self.path = path
+        self.dims = dims
+        self.rows: dict[bytes, int] = dict()
+        # 已读入的索引记录数
+        self.count = 0
+        self.vectors: Optional[np.memmap] = None
+        self._lock = threading.Lock()
+        self._index_file = os.path.join(path, "index.bin")
+        self._vectors_file = os.path.join(path, "vectors.bin")
+        os.makedirs(path, exist_ok=True)
+        with self._flock(fcntl.LOCK_EX):
+            self._truncate()
+            self._refresh()
+
+    @property
+    def size(self) -> int:
+        return len(self.rows)
+
+    def get(self, digests: Sequence[bytes]) -> list[Optional[np.ndarray]]:
+        with self._lock:
+            if any(it not in self.rows for it in digests) and self._stale():
+                with self._flock(fcntl.LOCK_SH):
+                    self._refresh()
+            return [
+                np.array(self.vectors[self.rows[it]]) if it in self.rows else None
+                for it in digests
+            ]
+
+    def put(self, digests: Sequence[bytes], vectors: np.ndarray):
+        with self._lock, self._flock(fcntl.LOCK_EX):
+            self._refresh()
+            items: dict[bytes, np.ndarray] = dict()
+            for digest, vector in zip(digests, vectors):
+                if digest not in self.rows:
+                    items.setdefault(digest, vector)
+            if not items:
+                return
+            start = self.count
+            self._reserve(start + len(items))
+            self.vectors[start : start + len(items)] = np.stack(list(items.values()))
+            self.vectors.flush()
+            with open(self._index_file, "ab") as f:
+                f.write(b"".join(items.keys()))
+            for row, digest in enumerate(items, start):
+                self.rows[digest] = row
+            self.count += len(items)
+
+    @contextmanager
+    def _flock(self, operation: int):
+        with open(os.path.join(self.path, ".lock"), "a") as f:
+            fcntl.flock(f, operation)
+            try:
+                yield
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+    def _stale(self) -> bool:
+        """其他进程是否追加了新记录"""
+        try:
+            return os.path.getsize(self._index_file) >= (self.count + 1) * DIGEST_SIZE
+        except FileNotFoundError:
+            return False
+
+    def _capacity(self) -> int:
+        try:
+            return os.path.getsize(self._vectors_file) // (self.dims * 4)
+        except FileNotFoundError:
+            return 0
+
+    def _map(self, capacity: int):
+        if self.vectors is None or self.vectors.shape[0] != capacity:
+            self.vectors = np.memmap(
+                self._vectors_file,
+                dtype=np.float32,
+                mode="r+",
+                shape=(capacity, self.dims),
+            )
+
+    def _reserve(self, size: int):
+        capacity = self._capacity()
+        if size > capacity:
+            capacity = max(INITIAL_CAPACITY, capacity)
+            while capacity < size:
+                capacity *= 2
+            with open(self._vectors_file, "ab") as f:
+                f.truncate(capacity * self.dims * 4)
+        self._map(capacity)
+
+    def _refresh(self):
+        """读入索引文件中尚未读入的完整记录"""
+        if not os.path.exists(self._index_file):
+            return
+        with open(self._index_file, "rb") as f:
+            f.seek(self.count * DIGEST_SIZE)
+            tail = f.read()
+        # 先写向量再写摘要，已写入的摘要一定有对应的向量
+        count = min(len(tail) // DIGEST_SIZE, self._capacity() - self.count)
+        if count <= 0:
+            return
+        self._map(self._capacity())
+        for i in range(count):
+            digest = tail[i * DIGEST_SIZE : (i + 1) * DIGEST_SIZE]
+            self.rows.setdefault(digest, self.count + i)
+        self.count += count
+
+    def _truncate(self):
+        """丢弃未写完的记录，需持有排他锁"""
+        if not os.path.exists(self._index_file):
+            return
+        size = os.path.getsize(self._index_file)
+        count = min(size // DIGEST_SIZE, self._capacity())
+        if count * DIGEST_SIZE != size:
+            with open(self._index_file, "r+b") as f:
+                f.truncate(count * DIGEST_SIZE)
+
+
+class EmbeddingCache:
+    """以 (向量模型, 维度, sha256(文本)) 为键的向量缓存
+
+    分块向量持久化到本地内存映射文件，可选同步到对象存储；
+    查询向量只放在容量有限的内存 LRU 中，不写入磁盘。
+    ``encode`` 先查缓存，只把未命中的文本（去重后）交给向量模型，
+    新向量在后台写入，调用方无需等待落盘。
+    """
+
+    def __init__(
+        self,
+        model: str,
+        dims: int,
+        path: str = EMBED_CACHE_DIR,
+        use_oss: bool = EMBED_CACHE_OSS,
+        memory_size: int = EMBED_QUERY_CACHE_SIZE,
+    ):
+        self.model = model
+        self.dims = dims
+        self.namespace = "{}_{}".format(re.sub(r"[^\w.-]+", "_", model), dims)
+        self.use_oss = use_oss
+        self.memory_size = memory_size
+        self._store = _Store(os.path.join(path, self.namespace), dims)
+        self._memory: OrderedDict[bytes, np.ndarray] = OrderedDict()
+        self._background: set[asyncio.Task] = set()
+        self.logger = getLogger("lorelm.components.embedding")
+
+    async def encode(
+        self, texts: list[str], encoder: Encoder, persist: bool = True
+    ) -> np.ndarray:
+        """获取文本向量
+
+        :param texts: 文本列表
+        :type texts: list[str]
+        :param encoder: 未命中文本的向量函数，返回与输入顺序一致的向量
+        :type encoder: Encoder
+        :param persist: 新向量是否持久化，查询文本传 False，只放入内存 LRU
+        :type persist: bool, optional
+        :return: 与 texts 顺序一致的向量矩阵
+        :rtype: np.ndarray
+        """
+        if not texts:
+            return np.zeros((0, self.dims), dtype=np.float32)
+        digests = [content_digest(it) for it in texts]
+        vectors = [self._memory_get(it) for it in digests]
+        missing = [i for i, it in enumerate(vectors) if it is None]
+        if missing:
+            stored = await asyncio.to_thread(
+                self._store.get, [digests[i] for i in missing]
+            )
+            for i, vector in zip(missing, stored):
+                vectors[i] = vector
+            missing = [i for i in missing if vectors[i] is None]
+
+        if missing and persist and self.use_oss:
+            found = await self._oss_fill(digests, vectors, missing)
+            if found:
+                self._spawn(
+                    self._persist(
+                        [digests[i] for i in found],
+                        np.stack([vectors[i] for i in found]),
+                        mirror=False,
+                    )
+                )
+            missing = [i for i in missing if vectors[i] is None]
+
+        # 相同文本只请求一次
+        pending: dict[bytes, list[int]] = dict()
+        for i in missing:
+            pending.setdefault(digests[i], []).append(i)
+        counters.inc("embed_cache_hit", len(texts) - len(missing))
+        counters.inc("embed_cache_miss", len(pending))
+        if pending:
+            first = [rows[0] for rows in pending.values()]
+            encoded = np.asarray(
+                await encoder([texts[i] for i in first]), dtype=np.float32
+            )
+            for rows, vector in zip(pending.values(), encoded):
+                for i in rows:
+                    vectors[i] = vector
+            if persist:
+                self._spawn(self._persist(list(pending.keys()), encoded))
+            else:
+                for digest, vector in zip(pending.keys(), encoded):
+                    self._memory_set(digest, vector)
+        return np.stack(vectors)
+
+    def _memory_get(self, digest: bytes) -> Optional[np.ndarray]:
+        vector = self._memory.get(digest)
+        if vector is not None:
+            self._memory.move_to_end(digest)
+        return vector
+
+    def _memory_set(self, digest: bytes, vector: np.ndarray):
+        if self.memory_size <= 0:
+            return
+        self._memory[digest] = vector
+        self._memory.move_to_end(digest)
+        while len(self._memory) > self.memory_size:
+            self._memory.popitem(last=False)
+
+    def _spawn(self, coro: Awaitable):
+        task = asyncio.create_task(coro)
+        self._background.add(task)
+        task.add_done_callback(self._background.discard)
+
+    async def _persist(
+        self, digests: list[bytes], vectors: np.ndarray, mirror: bool = True
+    ):
+        try:
+            await asyncio.to_thread(self._store.put, digests, vectors)
+        except Exception as e:
+            self.logger.warning(f"persist failed: {e}")
+        if mirror and self.use_oss:
+            await self._oss_set(digests, vectors)
+
+    def _object_path(self, digest: bytes) -> str:
+        return f"{EMBED_CACHE_PREFIX}/{self.namespace}/{digest.hex()}.bin"
+
+    async def _oss_fill(
+        self,
+        digests: list[bytes],
+        vectors: list[Optional[np.ndarray]],
+        missing: list[int],
+    ) -> list[int]:
+        """从对象存储回源，返回命中的下标"""
+        oss = get_oss_instance()
+        if oss is None:
+            return []
+        semaphore = asyncio.Semaphore(EMBED_CACHE_OSS_CONCURRENCY)
+
+        async def fetch(i: int):
+            path = self._object_path(digests[i])
+            async with semaphore:
+                try:
+                    # 先查询是否存在，未命中时不产生错误日志
+                    if not await oss.document_exists(EMBED_CACHE_BUCKET, path):
+                        return
+                    data = await oss.document_get(EMBED_CACHE_BUCKET, path)
+                except Exception:
+                    return
+            if data and len(data) == self.dims * 4:
+                vectors[i] = np.frombuffer(data, dtype=np.float32)
+
+        await asyncio.gather(*(fetch(i) for i in missing))
+        return [i for i in missing if vectors[i] is not None]
+
+    async def _oss_set(self, digests: list[bytes], vectors: np.ndarray):
+        oss = get_oss_instance()
+        if oss is None:
+            return
+        try:
+            for digest, vector in zip(digests, vectors):
+                data = vector.astype(np.float32).tobytes()
+                await oss.document_create(
+                    EMBED_CACHE_BUCKET, self._object_path(digest), data, len(data)
+                )
+        except Exception as e:
+            self.logger.warning(f"oss mirror failed: {e}")
+
+
+@cache
+def get_embedding_cache() -> Optional[EmbeddingCache]:
+    """当前向量模型的共享缓存，未启用时返回 None"""
+    if not EMBED_CACHE_ENABLED:
+        return None
+    return EmbeddingCache(OPENAI_EMBED_MODEL or "default", OPENAI_EMBED_DIMS)
@@ -0,0 +1,104 @@
+import asyncio
+import os
+import time
+from logging import getLogger
+from typing import Optional
+
+from ...crud import ConversationHistoryCrud, SessionCrud
+from ...dependencies.database import get_session_with
+from ...schemas.conversation import ConversationHistoryResponse
+
+CHAT_CHECKPOINT_INTERVAL = float(os.getenv("CHAT_CHECKPOINT_INTERVAL", "2"))
+
+_background: set[asyncio.Task] = set()
+
+
+class TurnWriter:
+    """对话轮次的写后持久化
+
+    每次写入使用独立的短事务并立即提交，不持有请求级会话：
+    消息各以一条 INSERT 写入，生成过程中按间隔在后台保存部分回答，
+    结束时以 UPDATE 写入最终内容与 token 用量，全程不刷新会话的关联数据。
+    """
+
+    def __init__(self, session_id: int, interval: float = CHAT_CHECKPOINT_INTERVAL):
+        self.session_id = session_id
+        self.interval = interval
+        self.history_id: Optional[int] = None
+        self._last = 0.0
+        self._task: Optional[asyncio.Task] = None
+        self.logger = getLogger("lorelm.components.history")
+
+    async def create(self, message_id: str) -> ConversationHistoryResponse:
+        """写入助手消息占位"""
+        async with get_session_with() as db:
+            model = await ConversationHistoryCrud(db).insert_message(
+                self.session_id, message_id, "assistant", "", "", 0
+            )
+            data = ConversationHistoryResponse.model_validate(model)
+        self.history_id = data.id
+        self._last = time.monotonic()
+        return data
+
+    def checkpoint(self, content: Optional[str], reasoning: Optional[str]):
+        """距上次保存超过间隔时，在后台保存部分回答，不阻塞输出"""
+        if self.history_id is None or self.interval <= 0:
+            return
+        if self._task is not None and not self._task.done():
+            return
+        if time.monotonic() - self._last < self.interval:
+            return
+        self._last = time.monotonic()
+        self._task = asyncio.create_task(
+            self._update(content=content, reasoning=reasoning)
+        )
+
+    async def finish(
+        self,
+        content: Optional[str],
+        reasoning: Optional[str],
+        prompt_tokens: Optional[int],
+        total_tokens: Optional[int],
+    ):
+        """写入最终回答，并累计会话 token 用量（未返回用量时为 None，不更新）"""
+        # 等待进行中的检查点，避免其晚于最终结果提交
+        if self._task is not None:
+            await asyncio.wait((self._task,))
+        async with get_session_with() as db:
+            if self.history_id is not None:
+                values = dict(content=content, reasoning=reasoning)
+                if prompt_tokens is not None:
+                    values["token_usage"] = prompt_tokens
+                await ConversationHistoryCrud(db).update_message(
+                    self.history_id, **values
+                )
+            await SessionCrud(db).touch(self.session_id, token_usage=total_tokens)
+
+    def finish_later(
+        self,
+        content: Optional[str],
+        reasoning: Optional[str],
+        prompt_tokens: Optional[int],
+        total_tokens: Optional[int],
+    ):
+        """在后台写入回答，用于被取消的轮次，调用方无需等待"""
+        task = asyncio.create_task(
+            self._finish(content, reasoning, prompt_tokens, total_tokens)
+        )
+        _background.add(task)
+        task.add_done_callback(_background.discard)
+
+    async def _finish(self, *args):
+        try:
+            await self.finish(*args)
+        except Exception as e:
+            self.logger.warning(f"message {self.history_id} finish failed: {e}")
+
+    async def _update(self, **values):
+        try:
+            async with get_session_with() as db:
+                await ConversationHistoryCrud(db).update_message(
+                    self.history_id, **values
+                )
+        except Exception as e:
+            self.logger.warning(f"message {self.history_id} checkpoint failed: {e}")
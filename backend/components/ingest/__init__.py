@@ -0,0 +1 @@
+from .pool import IngestWorkerPool, ingest_pool
@@ -0,0 +1,284 @@
+import asyncio
+import os
+import time
+from contextlib import aclosing
+from logging import getLogger
+from typing import Iterable, Optional
+
+from aiohttp import ClientResponse
+
+from ...crud import DocumentCrud, IngestJobCrud
+from ...dependencies.database import get_session_with
+from ...schemas.character import IngestStage, IngestStatus
+from ...utils.metrics import counters
+from ...utils.oss import get_oss_with
+from ...utils.vector import get_vdb_with
+from ..chunk import (
+    batched,
+    embed_batches,
+    iter_text_blocks,
+    naive_chunk_stream,
+    read_chunks,
+)
+from ..retrieval import retrieval_cache
+
+# 同时执行的导入任务数
+INGEST_WORKERS = int(os.getenv("INGEST_WORKERS", "2"))
+# 扫描待执行任务的间隔（秒），兜底其他进程提交或重启前未完成的任务
+INGEST_POLL_INTERVAL = float(os.getenv("INGEST_POLL_INTERVAL", "10"))
+# 执行中的任务超过该时间（秒）没有进度，视为所在进程已退出，可被重新抢占
+INGEST_STALE_TIMEOUT = float(os.getenv("INGEST_STALE_TIMEOUT", "600"))
+# 失败后自动重试的次数上限，之后需手动重试
+INGEST_MAX_ATTEMPTS = int(os.getenv("INGEST_MAX_ATTEMPTS", "3"))
+
+
+class IngestCancelled(Exception):
+    """任务已取消或文档已删除，已写入的分块需要清理"""
+
+
+class IngestLost(Exception):
+    """任务已被其他执行重新抢占，由对方继续写入"""
+
+
+class IngestWorkerPool:
+    """知识文件导入任务池
+
+    任务持久化在 ingest_job 表中，固定数量的协程从队列取任务执行：
+    流式读取对象存储中的文件、逐段分块、按批计算向量并写入向量库。
+    每写入一批即记录批次，失败后重新执行时跳过已写入的批次，
+    已计算过的向量由向量缓存直接命中。
+    """
+
+    def __init__(
+        self,
+        workers: int = INGEST_WORKERS,
+        poll_interval: float = INGEST_POLL_INTERVAL,
+        stale_timeout: float = INGEST_STALE_TIMEOUT,
+        max_attempts: int = INGEST_MAX_ATTEMPTS,
+    ):
+        self.workers = workers
+        self.poll_interval = poll_interval
+        self.stale_timeout = stale_timeout
+        self.max_attempts = max_attempts
+        self._queue: Optional[asyncio.Queue[int]] = None
+        self._queued: set[int] = set()
+        self._tasks: list[asyncio.Task] = []
+        self.logger = getLogger("lorelm.components.ingest")
+
+    def start(self):
+        if self._tasks:
+            return
+        self._queue = asyncio.Queue()
+        self._tasks = [
+            asyncio.create_task(self._work()) for _ in range(max(self.workers, 1))
+        ]
+        self._tasks.append(asyncio.create_task(self._poll()))
+        self.logger.info(f"started, {self.workers} workers")
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        self._queue = None
+        self._queued.clear()
+        self.logger.info("stopped")
+
+    def submit(self, job_ids: Iterable[int]):
+        """提交任务（需在任务写入数据库并提交之后调用）"""
+        if self._queue is None:
+            return
+        for job_id in job_ids:
+            if job_id not in self._queued:
+                self._queued.add(job_id)
+                self._queue.put_nowait(job_id)
+
+    async def _poll(self):
+        while True:
+            try:
+                async with get_session_with() as db:
+                    job_ids = await IngestJobCrud(db).get_claimable_ids(
+                        self.stale_timeout
+                    )
+                self.submit(job_ids)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self.logger.warning(f"poll failed: {e}")
+            await asyncio.sleep(self.poll_interval)
+
+    async def _work(self):
+        while True:
+            job_id = await self._queue.get()
+            try:
+                await self.run(job_id)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self.logger.exception(f"job {job_id} crashed: {e}")
+            finally:
+                self._queued.discard(job_id)
+
+    async def run(self, job_id: int):
+        """执行一个任务，已被其他进程抢占或已完成时直接返回"""
+        async with get_session_with() as db:
+            job = await IngestJobCrud(db).claim(job_id, self.stale_timeout)
+            if job is None:
+                return
+            document = await DocumentCrud(db).get_data(job.document_id)
+            document_id = job.document_id
+            attempts = job.attempts
+            batch_size = job.batch_size
+            batches_done = set(job.batches_done or ())
+            chunk_done = job.chunk_done
+            if document is not None:
+                doc_id = document.id
+                path = document.path
+                index_name = document.index
+                role_id = document.character_id
+                world_id = document.world_id
+
+        start = time.perf_counter()
+        if document is None:
+            # 文档在任务执行前已删除
+            await self._progress(
+                job_id,
+                attempts,
+                status=IngestStatus.cancelled,
+                error="document deleted",
+            )
+            self.logger.info(f"job {job_id} document {document_id} deleted, cancelled")
+            return
+        try:
+            await self._progress(job_id, stage=IngestStage.read)
+            bucket, obj_path = path.strip("/").split("/", maxsplit=1)
+            async with get_oss_with() as oss:
+                reader = await oss.document_get_reader(bucket, obj_path)
+            try:
+                chunk_total, chunk_done = await self._index(
+                    job_id,
+                    attempts,
+                    reader,
+                    index_name,
+                    (role_id, world_id, doc_id),
+                    batch_size,
+                    batches_done,
+                    chunk_done,
+                )
+            finally:
+                reader.release()
+            await self._progress(job_id, chunk_total=chunk_total)
+            await self._check(job_id, attempts)
+            if not await self._progress(
+                job_id, attempts, status=IngestStatus.succeeded, stage=IngestStage.done
+            ):
+                await self._check(job_id, attempts)
+        except IngestCancelled:
+            # 取消前后写入的分块都按文档ID删除
+            async with get_vdb_with() as vdb:
+                await vdb.doc_delete(index_name, docs_id=doc_id)
+            retrieval_cache.invalidate(roles_id=role_id, worlds_id=world_id)
+            counters.inc("ingest_cancelled")
+            self.logger.info(f"job {job_id} cancelled, chunks of {doc_id} removed")
+            return
+        except IngestLost:
+            self.logger.warning(f"job {job_id} attempt {attempts} taken over, stop")
+            return
+        except asyncio.CancelledError:
+            # 进程退出，交还任务
+            await asyncio.shield(
+                self._progress(job_id, attempts, status=IngestStatus.pending)
+            )
+            raise
+        except Exception as e:
+            status = (
+                IngestStatus.failed
+                if attempts >= self.max_attempts
+                else IngestStatus.pending
+            )
+            await self._progress(job_id, attempts, status=status, error=str(e)[:1024])
+            counters.inc("ingest_failed")
+            self.logger.warning(
+                f"job {job_id} attempt {attempts} failed, {status}: {e}"
+            )
+            return
+
+        if role_id is not None or world_id is not None:
+            retrieval_cache.invalidate(roles_id=role_id, worlds_id=world_id)
+        counters.inc("ingest_succeeded")
+        self.logger.info(
+            f"job {job_id} document {doc_id} indexed {chunk_done}/{chunk_total} chunks "
+            f"in {time.perf_counter() - start:.1f}s"
+        )
+
+    async def _index(
+        self,
+        job_id: int,
+        attempts: int,
+        reader: ClientResponse,
+        index_name: str,
+        scope: tuple[Optional[int], Optional[int], int],
+        batch_size: int,
+        batches_done: set[int],
+        chunk_done: int,
+    ) -> tuple[int, int]:
+        """边读取边分块，凑满一批即计算向量并写入，内存占用与批大小相关
+
+        分块ID由文档ID与分块下标组成，重复写入同一批次时覆盖而不是新增。
+        每批写入前确认任务仍由本次执行持有且文档未删除。
+        """
+        role_id, world_id, doc_id = scope
+        await self._progress(job_id, stage=IngestStage.chunk)
+        chunk_total = 0
+
+        async def pending_batches():
+            nonlocal chunk_total
+            blocks = iter_text_blocks(read_chunks(reader))
+            chunks = naive_chunk_stream(blocks, role_id, world_id, doc_id)
+            # 分块结果确定，批次按起始下标标识，跳过之前已写入的批次
+            async for i, batch in batched(chunks, batch_size):
+                chunk_total = i + len(batch)
+                if i not in batches_done:
+                    yield i, batch
+
+        # 整个导入任务期间暂停索引刷新，而不是每批写入各自暂停
+        async with (
+            get_vdb_with() as vdb,
+            vdb.bulk_import(index_name),
+            aclosing(embed_batches(pending_batches())) as stream,
+        ):
+            async for i, batch in stream:
+                await self._check(job_id, attempts)
+                ids = [f"{doc_id}-{i + j}" for j in range(len(batch))]
+                await vdb.doc_batch_insert(index_name, batch, ids=ids)
+                batches_done.add(i)
+                chunk_done += len(batch)
+                await self._progress(
+                    job_id,
+                    stage=IngestStage.index,
+                    batches_done=sorted(batches_done),
+                    chunk_done=chunk_done,
+                    chunk_total=chunk_total,
+                )
+        return chunk_total, chunk_done
+
+    async def _progress(
+        self, job_id: int, attempts: Optional[int] = None, **values
+    ) -> bool:
+        async with get_session_with() as db:
+            return await IngestJobCrud(db).update_progress(job_id, attempts, **values)
+
+    async def _check(self, job_id: int, attempts: int):
+        """任务已取消或文档已删除时抛出 IngestCancelled，被重新抢占时抛出 IngestLost"""
+        async with get_session_with() as db:
+            state = await IngestJobCrud(db).get_state(job_id)
+        if state is None:
+            raise IngestCancelled(f"job {job_id} not exists")
+        status, current, deleted = state
+        if deleted or status == IngestStatus.cancelled:
+            raise IngestCancelled(f"job {job_id} cancelled")
+        if status != IngestStatus.running or current != attempts:
+            raise IngestLost(f"job {job_id} taken over")
+
+
+ingest_pool = IngestWorkerPool()
@@ -0,0 +1,2 @@
+from .cache import RetrievalCache, retrieval_cache
+from .packer import RETRIEVAL_TOP_K, LorePacker, get_lore_packer
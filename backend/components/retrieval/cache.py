@@ -0,0 +1,125 @@
+import os
+import time
+from collections import OrderedDict
+from logging import getLogger
+from typing import Hashable, Iterable, Optional, Union
+
+from ...schemas.components import DocumentDict
+from ...utils.metrics import counters
+from ...utils.nlp import normalize_text
+
+RETRIEVAL_CACHE_SIZE = int(os.getenv("RETRIEVAL_CACHE_SIZE", "1024"))
+# 缓存只在进程内失效，多进程部署时由过期时间兜底
+RETRIEVAL_CACHE_TTL = float(os.getenv("RETRIEVAL_CACHE_TTL", "300"))
+
+IdsType = Optional[Union[int, Iterable[int]]]
+
+
+def _ids(ids: IdsType) -> tuple[int, ...]:
+    if ids is None:
+        return tuple()
+    if isinstance(ids, int):
+        return (ids,)
+    return tuple(sorted(set(ids)))
+
+
+class RetrievalCache:
+    """检索结果缓存
+
+    以 (索引, 角色ID, 世界ID, 归一化查询, 向量模型, 其余检索参数) 为键。
+    每个角色、世界各有一个代数，知识库写入或删除时递增；
+    缓存条目记录检索开始前的代数，读取时代数不一致即视为失效。
+
+    缓存与代数都只在当前进程内，其他进程的导入不会递增本进程的代数，
+    跨进程的失效由调用方把知识库版本（导入任务的更新时间）放入键中，
+    过期时间兜底。
+    """
+
+    def __init__(
+        self, size: int = RETRIEVAL_CACHE_SIZE, ttl: float = RETRIEVAL_CACHE_TTL
+    ):
+        self.size = size
+        self.ttl = ttl
+        self._entries: OrderedDict[
+            Hashable, tuple[float, tuple[int, ...], list[DocumentDict]]
+        ] = OrderedDict()
+        self._generations: dict[tuple[str, int], int] = dict()
+        self.logger = getLogger("lorelm.components.retrieval")
+
+    @staticmethod
+    def key(
+        index_name: str,
+        roles_id: IdsType,
+        worlds_id: IdsType,
+        query: str,
+        embed_model: Optional[str],
+        *args: Hashable,
+    ) -> Hashable:
+        return (
+            index_name,
+            _ids(roles_id),
+            _ids(worlds_id),
+            normalize_text(query).lower(),
+            embed_model,
+            *args,
+        )
+
+    def snapshot(self, key: Hashable) -> tuple[int, ...]:
+        """检索开始前记录代数，检索期间发生的失效使结果不会被当作最新结果缓存"""
+        return self._scope(key)
+
+    def _scope(self, key: Hashable) -> tuple[int, ...]:
+        """键对应的角色与世界代数"""
+        _, roles_id, worlds_id, *_ = key
+        scope = [("role", it) for it in roles_id] + [("world", it) for it in worlds_id]
+        return tuple(self._generations.get(it, 0) for it in scope)
+
+    def get(self, key: Hashable) -> Optional[list[DocumentDict]]:
+        entry = self._entries.get(key)
+        if entry is not None:
+            expire_at, generations, hits = entry
+            if expire_at > time.monotonic() and generations == self._scope(key):
+                self._entries.move_to_end(key)
+                counters.inc("retrieval_cache_hit")
+                return hits
+            del self._entries[key]
+        counters.inc("retrieval_cache_miss")
+        return None
+
+    def set(
+        self,
+        key: Hashable,
+        hits: list[DocumentDict],
+        generations: Optional[tuple[int, ...]] = None,
+    ):
+        """写入缓存
+
+        :param generations: 检索开始前 ``snapshot`` 的代数，
+            defaults to None（使用当前代数）
+        :type generations: Optional[tuple[int, ...]], optional
+        """
+        if self.size <= 0:
+            return
+        if generations is None:
+            generations = self._scope(key)
+        elif generations != self._scope(key):
+            # 检索期间知识库已变化，结果可能过时
+            return
+        self._entries[key] = (time.monotonic() + self.ttl, generations, hits)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.size:
+            self._entries.popitem(last=False)
+
+    def invalidate(self, roles_id: IdsType = None, worlds_id: IdsType = None):
+        """角色或世界的知识库发生变化，递增其代数"""
+        for kind, ids in (("role", roles_id), ("world", worlds_id)):
+            for it in _ids(ids):
+                scope = (kind, it)
+                self._generations[scope] = self._generations.get(scope, 0) + 1
+        self.logger.debug(f"invalidate roles {roles_id}, worlds {worlds_id}")
+
+    def clear(self):
+        self._entries.clear()
+
+
+retrieval_cache = RetrievalCache()
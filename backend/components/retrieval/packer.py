@@ -0,0 +1,95 @@
+import os
+from functools import cache
+from typing import Sequence
+
+from ...schemas.components import DocumentDict
+from ...utils.nlp import FullTextQueryer, get_queryer
+from ...utils.token_predict import TokenPredicter
+from ..context.builder import CHAT_CONTEXT_BUDGET, CHAT_LORE_RATIO, get_context_builder
+
+# 向检索引擎请求的候选数量
+RETRIEVAL_TOP_K = int(os.getenv("RETRIEVAL_TOP_K", "32"))
+# 本地词项相似度在重排分数中的权重，其余为检索引擎分数
+RETRIEVAL_TOKEN_WEIGHT = float(os.getenv("RETRIEVAL_TOKEN_WEIGHT", "0.3"))
+# 分词集合的 Jaccard 相似度超过该值视为近似重复
+RETRIEVAL_DEDUP_THRESHOLD = float(os.getenv("RETRIEVAL_DEDUP_THRESHOLD", "0.8"))
+
+
+class LorePacker:
+    """知识条目打包：本地重排、去除近似重复，并按 token 预算截取"""
+
+    def __init__(
+        self,
+        queryer: FullTextQueryer,
+        predicter: TokenPredicter,
+        budget: int,
+        token_weight: float = RETRIEVAL_TOKEN_WEIGHT,
+        dedup_threshold: float = RETRIEVAL_DEDUP_THRESHOLD,
+    ):
+        self.queryer = queryer
+        self.predicter = predicter
+        self.budget = budget
+        self.token_weight = token_weight
+        self.dedup_threshold = dedup_threshold
+
+    def pack(self, keywords: list[str], hits: Sequence[DocumentDict]) -> list[str]:
+        """打包知识条目
+
+        :param keywords: 查询关键词，来自 ``FullTextQueryer.question``
+        :type keywords: list[str]
+        :param hits: 检索结果，需包含 content、content_ltks 与 score
+        :type hits: Sequence[DocumentDict]
+        :return: 按相关度排序、总 token 数不超过预算的知识内容
+        :rtype: list[str]
+        """
+        if not hits:
+            return list()
+        tokens = [hit.get("content_ltks", "").split() for hit in hits]
+        if keywords:
+            token_scores = self.queryer.token_similarity(keywords, tokens)
+        else:
+            token_scores = [0.0] * len(hits)
+        max_score = max(hit.get("score") or 0.0 for hit in hits) or 1.0
+        scores = [
+            self.token_weight * token_score
+            + (1 - self.token_weight) * (hit.get("score") or 0.0) / max_score
+            for hit, token_score in zip(hits, token_scores)
+        ]
+        order = sorted(range(len(hits)), key=scores.__getitem__, reverse=True)
+
+        # 去除近似重复
+        kept: list[int] = []
+        kept_sets: list[set[str]] = []
+        for i in order:
+            current = set(tokens[i])
+            if any(_jaccard(current, it) >= self.dedup_threshold for it in kept_sets):
+                continue
+            kept.append(i)
+            kept_sets.append(current)
+
+        # 按预算截取，放不下的条目跳过，由后续较短的条目补位
+        contents = [hits[i]["content"] for i in kept]
+        outputs: list[str] = []
+        used = 0
+        for content, cost in zip(contents, self.predicter.encode_batch(contents)):
+            if used + cost > self.budget:
+                continue
+            outputs.append(content)
+            used += cost
+        return outputs
+
+
+def _jaccard(a: set[str], b: set[str]) -> float:
+    if not a or not b:
+        return 0.0
+    return len(a & b) / len(a | b)
+
+
+@cache
+def get_lore_packer() -> LorePacker:
+    """共享的知识打包器，与上下文构建器共用 token 计数器"""
+    return LorePacker(
+        get_queryer(),
+        get_context_builder().predicter,
+        int(CHAT_CONTEXT_BUDGET * CHAT_LORE_RATIO),
+    )
@@ -0,0 +1,3 @@
+from .cache import TTSCache, tts_cache
+from .qiniu import qiniu_tts
+from .stream import SentenceSegmenter, StreamingSynthesizer
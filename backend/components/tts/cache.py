@@ -0,0 +1,198 @@
+import asyncio
+import hashlib
+import os
+from collections import OrderedDict
+from logging import getLogger
+from typing import Optional
+
+from ...utils.common import parse_unit_str
+from ...utils.nlp import normalize_text
+from ...utils.oss import get_oss_with
+from .qiniu import qiniu_tts
+
+TTS_CACHE_MEMORY_SIZE = parse_unit_str(os.getenv("TTS_CACHE_MEMORY_SIZE", "64m"))
+TTS_CACHE_MAX_ENTRY_SIZE = parse_unit_str(os.getenv("TTS_CACHE_MAX_ENTRY_SIZE", "2m"))
+TTS_CACHE_OSS = os.getenv("TTS_CACHE_OSS", "true").lower() == "true"
+# 对象存储中缓存的保留天数，到期由存储桶生命周期规则删除
+TTS_CACHE_OSS_EXPIRE_DAYS = int(os.getenv("TTS_CACHE_OSS_EXPIRE_DAYS", "30"))
+# 短于该字符数的句子合成很快，只使用进程内缓存
+TTS_CACHE_OSS_MIN_LENGTH = int(os.getenv("TTS_CACHE_OSS_MIN_LENGTH", "16"))
+TTS_CACHE_BUCKET = "lorelm"
+TTS_CACHE_PREFIX = "tts"
+
+
+class TTSCache:
+    """语音合成缓存
+
+    以 (voice_type, encoding, speed_ratio, 文本哈希) 为键。
+    一级缓存为进程内按字节数淘汰的 LRU，二级缓存为对象存储，按天数过期。
+    未命中一级缓存时，对象存储查找与合成同时进行，不让查找推迟合成。
+    """
+
+    def __init__(
+        self,
+        memory_size: int = TTS_CACHE_MEMORY_SIZE,
+        max_entry_size: int = TTS_CACHE_MAX_ENTRY_SIZE,
+        use_oss: bool = TTS_CACHE_OSS,
+    ):
+        self.memory_size = memory_size
+        self.max_entry_size = max_entry_size
+        self.use_oss = use_oss
+        self._memory: OrderedDict[str, bytes] = OrderedDict()
+        self._memory_used = 0
+        self._inflight: dict[str, asyncio.Task] = dict()
+        # 各合成任务仍在等待结果的调用方数量
+        self._waiters: dict[asyncio.Task, int] = dict()
+        self._background: set[asyncio.Task] = set()
+        self.logger = getLogger("lorelm.components.tts")
+
+    @staticmethod
+    def key(text: str, voice_type: str, encoding: str, speed_ratio: float) -> str:
+        digest = hashlib.sha256(normalize_text(text).encode("utf-8")).hexdigest()
+        return f"{voice_type}/{encoding}/{speed_ratio:g}/{digest}.{encoding}"
+
+    async def init(self):
+        """为对象存储中的缓存设置过期规则，避免其无限增长"""
+        if not self.use_oss:
+            return
+        try:
+            async with get_oss_with() as oss:
+                await oss.bucket_set_expiration(
+                    TTS_CACHE_BUCKET,
+                    f"{TTS_CACHE_PREFIX}/",
+                    TTS_CACHE_OSS_EXPIRE_DAYS,
+                    rule_id="tts-cache",
+                )
+        except Exception as e:
+            self.logger.warning(f"tts cache expiration setup failed: {e}")
+
+    async def get(self, key: str) -> Optional[bytes]:
+        audio = self._memory_get(key)
+        if audio is None and self.use_oss:
+            audio = await self._oss_get(key)
+            if audio is not None:
+                self._memory_set(key, audio)
+        return audio
+
+    def set(self, key: str, audio: bytes, oss: bool = True):
+        if len(audio) > self.max_entry_size:
+            return
+        self._memory_set(key, audio)
+        if self.use_oss and oss:
+            # 写入对象存储不阻塞音频下发
+            task = asyncio.create_task(self._oss_set(key, audio))
+            self._background.add(task)
+            task.add_done_callback(self._background.discard)
+
+    async def synthesize(
+        self,
+        text: str,
+        voice_type: str = "qiniu_zh_female_tmjxxy",
+        encoding: str = "mp3",
+        speed_ratio: float = 1.0,
+    ) -> Optional[bytes]:
+        """优先读取缓存的语音合成，相同文本的并发请求只合成一次
+
+        合成在独立任务中进行，任一调用方断开不影响其他调用方，
+        所有调用方都离开后才取消合成。
+        """
+        key = self.key(text, voice_type, encoding, speed_ratio)
+        audio = self._memory_get(key)
+        if audio is not None:
+            return audio
+
+        task = self._inflight.get(key)
+        if task is None:
+            task = asyncio.create_task(
+                self._synthesize(key, text, voice_type, encoding, speed_ratio)
+            )
+            self._inflight[key] = task
+            self._waiters[task] = 0
+            task.add_done_callback(lambda it: self._release(key, it))
+        self._waiters[task] += 1
+        try:
+            return await asyncio.shield(task)
+        finally:
+            # 未完成即离开说明调用方被取消
+            if not task.done():
+                self._waiters[task] -= 1
+                if self._waiters[task] == 0:
+                    self._release(key, task)
+                    task.cancel()
+
+    async def _synthesize(
+        self, key: str, text: str, voice_type: str, encoding: str, speed_ratio: float
+    ) -> Optional[bytes]:
+        if self.use_oss and len(text) >= TTS_CACHE_OSS_MIN_LENGTH:
+            return await self._lookup_or_synthesize(
+                key, text, voice_type, encoding, speed_ratio
+            )
+        audio = await qiniu_tts(text, voice_type, encoding, speed_ratio)
+        if audio is not None:
+            self.set(key, audio, oss=False)
+        return audio
+
+    def _release(self, key: str, task: asyncio.Task):
+        # 已取消的任务不再被新的调用方复用
+        if self._inflight.get(key) is task:
+            self._inflight.pop(key)
+        self._waiters.pop(task, None)
+
+    async def _lookup_or_synthesize(
+        self, key: str, text: str, voice_type: str, encoding: str, speed_ratio: float
+    ) -> Optional[bytes]:
+        """对象存储查找与合成同时开始，查找命中时取消合成"""
+        lookup = asyncio.create_task(self._oss_get(key))
+        synthesis = asyncio.create_task(
+            qiniu_tts(text, voice_type, encoding, speed_ratio)
+        )
+        try:
+            audio = await lookup
+            if audio is not None:
+                self._memory_set(key, audio)
+                return audio
+            audio = await synthesis
+        finally:
+            lookup.cancel()
+            synthesis.cancel()
+        if audio is not None:
+            self.set(key, audio)
+        return audio
+
+    def _memory_get(self, key: str) -> Optional[bytes]:
+        audio = self._memory.get(key)
+        if audio is not None:
+            self._memory.move_to_end(key)
+        return audio
+
+    def _memory_set(self, key: str, audio: bytes):
+        if key in self._memory:
+            self._memory_used -= len(self._memory.pop(key))
+        self._memory[key] = audio
+        self._memory_used += len(audio)
+        # 按字节数淘汰最久未使用的条目
+        while self._memory_used > self.memory_size and self._memory:
+            _, evicted = self._memory.popitem(last=False)
+            self._memory_used -= len(evicted)
+
+    async def _oss_get(self, key: str) -> Optional[bytes]:
+        try:
+            async with get_oss_with() as oss:
+                audio = await oss.document_get(
+                    TTS_CACHE_BUCKET, f"{TTS_CACHE_PREFIX}/{key}"
+                )
+        except Exception:
+            return None
+        return audio or None
+
+    async def _oss_set(self, key: str, audio: bytes):
+        try:
+            async with get_oss_with() as oss:
+                await oss.document_create(
+                    TTS_CACHE_BUCKET, f"{TTS_CACHE_PREFIX}/{key}", audio, len(audio)
+                )
+        except Exception as e:
+            self.logger.warning(f"tts cache upload failed: {e}")
+
+
+tts_cache = TTSCache()
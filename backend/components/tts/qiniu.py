@@ -0,0 +1,47 @@
+import base64
+from logging import getLogger
+from typing import Optional
+
+from ...utils.llm import QINIU_API_KEY, get_http_session
+
+QINIU_TTS_URL = "https://openai.qiniu.com/v1/voice/tts"
+
+logger = getLogger("lorelm.components.tts")
+
+
+async def qiniu_tts(
+    text: str,
+    voice_type: str = "qiniu_zh_female_tmjxxy",
+    encoding: str = "mp3",
+    speed_ratio: float = 1.0,
+) -> Optional[bytes]:
+    """七牛云语音合成
+
+    :param text: 待合成文本
+    :type text: str
+    :return: 音频内容，合成失败返回 None
+    :rtype: Optional[bytes]
+    """
+    headers = {
+        "Content-Type": "application/json",
+        "Authorization": f"Bearer {QINIU_API_KEY}",
+    }
+    data = {
+        "audio": {
+            "voice_type": voice_type,
+            "encoding": encoding,
+            "speed_ratio": speed_ratio,
+        },
+        "request": {"text": text},
+    }
+    async with get_http_session().post(
+        QINIU_TTS_URL, headers=headers, json=data
+    ) as response:
+        if response.status != 200:
+            logger.warning(f"tts failed, code: {response.status}")
+            return None
+        result = await response.json(content_type=None)
+    if not result.get("data"):
+        logger.warning(f"tts failed, empty audio: {result}")
+        return None
+    return base64.b64decode(result["data"])
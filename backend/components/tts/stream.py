@@ -0,0 +1,126 @@
+import asyncio
+import os
+import re
+from collections import deque
+from logging import getLogger
+from typing import AsyncIterator, Awaitable, Callable, Iterator, Optional
+
+from ...schemas.components.tts import TTSSegmentDict
+
+TTS_PARALLELISM = int(os.getenv("TTS_PARALLELISM", "3"))
+
+# 句末标点（含紧随其后的引号、括号）
+SENTENCE_END_PATTERN = re.compile(r"[。！？!?；;…\n]+[”’」』）)\"']*")
+# 超长句时的次级断点
+SOFT_BREAK_PATTERN = re.compile(r"[，,、：:\s]")
+
+SynthesizeFunc = Callable[[str], Awaitable[Optional[bytes]]]
+
+
+class SentenceSegmenter:
+    """将流式输出的增量文本切分为句子"""
+
+    def __init__(self, min_length: int = 8, max_length: int = 120):
+        self.min_length = min_length
+        self.max_length = max_length
+        self._buffer = ""
+
+    def feed(self, delta: str) -> list[str]:
+        """输入增量文本，返回已经完整的句子"""
+        self._buffer += delta
+        sentences: list[str] = []
+        start = 0
+        for matched in SENTENCE_END_PATTERN.finditer(self._buffer):
+            end = matched.end()
+            # 标点位于末尾时，后续增量可能还会补充引号或标点
+            if end == len(self._buffer):
+                break
+            if end - start < self.min_length:
+                continue
+            sentences.append(self._buffer[start:end])
+            start = end
+        self._buffer = self._buffer[start:]
+
+        while len(self._buffer) > self.max_length:
+            cut = self.max_length
+            for matched in SOFT_BREAK_PATTERN.finditer(self._buffer, 0, self.max_length):
+                cut = matched.end()
+            sentences.append(self._buffer[:cut])
+            self._buffer = self._buffer[cut:]
+        return [it for it in sentences if _speakable(it)]
+
+    def flush(self) -> list[str]:
+        """结束输入，返回剩余文本"""
+        rest, self._buffer = self._buffer, ""
+        return [rest] if _speakable(rest) else []
+
+
+class StreamingSynthesizer:
+    """边生成边合成：按句切分增量文本，限定并发地合成，并按句子顺序产出音频"""
+
+    def __init__(
+        self,
+        synthesize: SynthesizeFunc,
+        parallelism: int = TTS_PARALLELISM,
+        segmenter: Optional[SentenceSegmenter] = None,
+    ):
+        self._synthesize = synthesize
+        self._semaphore = asyncio.Semaphore(parallelism)
+        self._segmenter = segmenter or SentenceSegmenter()
+        self._pending: deque[tuple[int, str, asyncio.Task]] = deque()
+        self._index = 0
+        self.logger = getLogger("lorelm.components.tts")
+
+    def feed(self, delta: str):
+        """输入大模型增量输出"""
+        for sentence in self._segmenter.feed(delta):
+            self._submit(sentence)
+
+    def finish(self):
+        """大模型输出结束，合成剩余文本"""
+        for sentence in self._segmenter.flush():
+            self._submit(sentence)
+
+    def ready(self) -> Iterator[TTSSegmentDict]:
+        """按顺序取出已经合成完毕的音频，不等待"""
+        while self._pending and self._pending[0][2].done():
+            segment = self._pop(self._pending.popleft())
+            if segment is not None:
+                yield segment
+
+    async def drain(self) -> AsyncIterator[TTSSegmentDict]:
+        """按顺序等待并取出全部音频"""
+        while self._pending:
+            index, text, task = self._pending[0]
+            await asyncio.wait((task,))
+            segment = self._pop(self._pending.popleft())
+            if segment is not None:
+                yield segment
+
+    def cancel(self):
+        """取消尚未完成的合成任务"""
+        while self._pending:
+            self._pending.popleft()[2].cancel()
+
+    def _submit(self, text: str):
+        task = asyncio.create_task(self._run(text.strip()))
+        self._pending.append((self._index, text, task))
+        self._index += 1
+
+    async def _run(self, text: str) -> Optional[bytes]:
+        async with self._semaphore:
+            try:
+                return await self._synthesize(text)
+            except Exception as e:
+                self.logger.warning(f"tts segment failed: {e}")
+                return None
+
+    def _pop(self, item: tuple[int, str, asyncio.Task]) -> Optional[TTSSegmentDict]:
+        index, text, task = item
+        if task.cancelled() or task.result() is None:
+            return None
+        return TTSSegmentDict(index=index, text=text, audio=task.result())
+
+
+def _speakable(text: str) -> bool:
+    return re.search(r"\w", text) is not None
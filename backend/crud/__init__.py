@@ -1,3 +1,9 @@
 from .admin.user import UserCrud
-from .character import CharacterCrud, DocumentCrud, LabelCrud, WorldCrud
-from .conversation import SessionCrud
+from .character import (
+    CharacterCrud,
+    DocumentCrud,
+    IngestJobCrud,
+    LabelCrud,
+    WorldCrud,
+)
+from .conversation import ConversationHistoryCrud, SessionCrud
@@ -1,7 +1,8 @@
+from datetime import datetime, timedelta
 from operator import attrgetter
-from typing import Sequence
+from typing import Optional, Sequence
 
-from sqlalchemy import and_, func, select
+from sqlalchemy import Update, and_, false, func, or_, select
 from sqlalchemy.orm import selectinload
 
 from ..exceptions.common import CustomException, ErrorCode
@@ -232,3 +233,126 @@ class DocumentCrud(CrudBase[models.Document, schemas.DocumentResponse]):
 
     _DBModelType = models.Document
     _DBSchemaType = schemas.DocumentResponse
+
+
+class IngestJobCrud(CrudBase[models.IngestJob, schemas.IngestJobResponse]):
+    """
+    知识导入任务Crud
+    """
+
+    _DBModelType = models.IngestJob
+    _DBSchemaType = schemas.IngestJobResponse
+
+    async def batch_create(
+        self, documents_id: Sequence[int], batch_size: int
+    ) -> list[models.IngestJob]:
+        models = [
+            self.model(document_id=it, batch_size=batch_size) for it in documents_id
+        ]
+        self.db.add_all(models)
+        await self.db.flush(models)
+        return models
+
+    def _claimable(self, stale: float):
+        """待执行的任务，以及执行中但超过 stale 秒没有进度的任务（所在进程已退出）"""
+        return or_(
+            self.model.status == schemas.IngestStatus.pending,
+            and_(
+                self.model.status == schemas.IngestStatus.running,
+                self.model.updated_at
+                < func.current_timestamp() - timedelta(seconds=stale),
+            ),
+        )
+
+    async def get_claimable_ids(self, stale: float, limit: int = 100) -> list[int]:
+        rsp = await self.db.execute(
+            select(self.model.id)
+            .where(self._claimable(stale), self.model.is_delete == false())
+            .order_by(self.model.id)
+            .limit(limit)
+        )
+        return list(rsp.scalars())
+
+    async def claim(self, job_id: int, stale: float) -> Optional[models.IngestJob]:
+        """以单条 UPDATE 抢占任务，多进程同时抢占时只有一个成功"""
+        rsp = await self.db.execute(
+            Update(self.model)
+            .where(self.model.id == job_id, self._claimable(stale))
+            .values(
+                status=schemas.IngestStatus.running,
+                attempts=self.model.attempts + 1,
+                error=None,
+                updated_at=func.current_timestamp(),
+            )
+            .returning(self.model)
+            .execution_options(synchronize_session=False)
+        )
+        return rsp.scalar_one_or_none()
+
+    async def cancel(self, documents_id: Sequence[int]):
+        """取消文档的导入任务（文档删除时），执行中的任务在写入下一批前退出"""
+        await self.db.execute(
+            Update(self.model)
+            .where(
+                self.model.document_id.in_(documents_id),
+                self.model.status.in_(
+                    (schemas.IngestStatus.pending, schemas.IngestStatus.running)
+                ),
+            )
+            .values(
+                status=schemas.IngestStatus.cancelled,
+                error="document deleted",
+                updated_at=func.current_timestamp(),
+            )
+            .execution_options(synchronize_session=False)
+        )
+
+    async def get_state(self, job_id: int) -> Optional[tuple[str, int, bool]]:
+        """任务的 (状态, 执行次数, 文档是否已删除)"""
+        rsp = await self.db.execute(
+            select(self.model.status, self.model.attempts, models.Document.is_delete)
+            .join(models.Document, models.Document.id == self.model.document_id)
+            .where(self.model.id == job_id)
+        )
+        row = rsp.one_or_none()
+        return None if row is None else tuple(row)
+
+    async def get_version(
+        self, roles_id: Sequence[int], world_id: Optional[int]
+    ) -> Optional[datetime]:
+        """角色与世界知识库的版本：相关导入任务的最近更新时间
+
+        导入任务的每次写入都会刷新 updated_at，可作为跨进程的检索缓存版本。
+        """
+        scope = []
+        if roles_id:
+            scope.append(models.Document.character_id.in_(roles_id))
+        if world_id is not None:
+            scope.append(models.Document.world_id == world_id)
+        if not scope:
+            return None
+        return await self.db.scalar(
+            select(func.max(self.model.updated_at))
+            .join(models.Document, models.Document.id == self.model.document_id)
+            .where(or_(*scope))
+        )
+
+    async def update_progress(
+        self, job_id: int, attempts: Optional[int] = None, **values
+    ) -> bool:
+        """更新进度，同时刷新 updated_at 作为心跳
+
+        给出 attempts 时只在任务仍是该次执行持有（执行中且未被重新抢占）时更新，
+        用于写入最终状态，避免覆盖已取消的任务。
+        """
+        wheres = [self.model.id == job_id]
+        if attempts is not None:
+            wheres.append(self.model.status == schemas.IngestStatus.running)
+            wheres.append(self.model.attempts == attempts)
+        rsp = await self.db.execute(
+            Update(self.model)
+            .where(*wheres)
+            .values(updated_at=func.current_timestamp(), **values)
+            .execution_options(synchronize_session=False)
+        )
+        return rsp.rowcount > 0
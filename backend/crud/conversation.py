@@ -1,8 +1,8 @@
 from operator import attrgetter
-from typing import Sequence
+from typing import Optional, Sequence
 from uuid import uuid4
 
-from sqlalchemy import and_, func, select
+from sqlalchemy import Insert, Update, and_, func, select
 from sqlalchemy.orm import selectinload
 
 from ..exceptions.common import CustomException, ErrorCode
@@ -52,9 +52,92 @@ class SessionCrud(CrudBase[models.ConversationSession, schemas.SessionResponse])
         )
         return model
 
+    async def get_retrieval_scope(
+        self, session_id: int, user_id: int
+    ) -> tuple[Optional[int], list[int]]:
+        """只查询检索所需的世界ID与角色ID，不加载会话关联数据"""
+        result = await self.execute(
+            select(
+                self.model.world_id,
+                func.array_agg(models.Session2Character.character_id),
+            )
+            .outerjoin(
+                models.Session2Character,
+                models.Session2Character.session_id == self.model.id,
+            )
+            .where(self.model.id == session_id, self.model.user_id == user_id)
+            .group_by(self.model.id)
+        )
+        row = result.one_or_none()
+        if row is None:
+            raise CustomException(ErrorCode.NotExist)
+        world_id, characters_id = row
+        return world_id, [it for it in characters_id if it is not None]
+
+    async def touch(
+        self, session_id: int, title: Optional[str] = None, token_usage: int = 0
+    ):
+        """单条 UPDATE 更新会话时间、标题与累计 token，不加载关联数据"""
+        values = dict(updated_at=func.current_timestamp())
+        if title is not None:
+            values["title"] = title
+        if token_usage:
+            values["token_usage"] = self.model.token_usage + token_usage
+        async with self._lock:
+            await self.db.execute(
+                Update(self.model)
+                .where(self.model.id == session_id)
+                .values(values)
+                .execution_options(synchronize_session=False)
+            )
+
 
 class ConversationHistoryCrud(
     CrudBase[models.ConversationHistory, schemas.ConversationHistoryResponse]
 ):
     _DBModelType = models.ConversationHistory
     _DBSchemaType = schemas.ConversationHistoryResponse
+
+    async def insert_message(
+        self,
+        session_id: int,
+        message_id: str,
+        role: str,
+        content: str,
+        reasoning: Optional[str] = None,
+        token_usage: int = 0,
+    ) -> models.ConversationHistory:
+        """单条 INSERT ... RETURNING 写入对话历史，不刷新会话的消息集合"""
+        async with self._lock:
+            result = await self.db.execute(
+                Insert(self.model)
+                .values(
+                    session_id=session_id,
+                    message_id=message_id,
+                    role=role,
+                    content=content,
+                    reasoning=reasoning,
+                    token_usage=token_usage,
+                )
+                .returning(self.model)
+            )
+        return result.scalar_one()
+
+    async def update_message(self, history_id: int, **values):
+        """单条 UPDATE 更新对话历史"""
+        async with self._lock:
+            await self.db.execute(
+                Update(self.model)
+                .where(self.model.id == history_id)
+                .values(values)
+                .execution_options(synchronize_session=False)
+            )
+
+    async def get_recent(
+        self, session_id: int, after_id: Optional[int] = None
+    ) -> list[models.ConversationHistory]:
+        """获取指定ID之后（尚未纳入摘要）的对话历史"""
+        wheres = [self.model.session_id == session_id]
+        if after_id is not None:
+            wheres.append(self.model.id > after_id)
+        return await self.get_datas(wheres=wheres, order_field="id", scalar=True)
@@ -3,7 +3,7 @@ from typing import Annotated
 from fastapi import Depends
 
 from ..utils.oss import Minio, get_oss
-from ..utils.vector import ElasticSearch, get_vdb
+from ..utils.vector import VectorDatabase, get_vdb
 
 DependOSS = Annotated[Minio, Depends(get_oss)]
-DependVDB = Annotated[ElasticSearch, Depends(get_vdb)]
+DependVDB = Annotated[VectorDatabase, Depends(get_vdb)]
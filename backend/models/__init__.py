@@ -1,4 +1,4 @@
 from .admin import User
 from .base import DbBase
-from .character import Character, Document
+from .character import Character, Document, DocumentChunk, IngestJob
 from .conversation import ConversationHistory, ConversationSession
@@ -2,11 +2,24 @@ from typing import Optional
 
 from numpy import ndarray
 from pgvector.sqlalchemy import Vector
-from sqlalchemy import Boolean, ForeignKey, Index, String, Text, event, func, select
+from sqlalchemy import (
+    Boolean,
+    Computed,
+    JSON,
+    ForeignKey,
+    Index,
+    Integer,
+    String,
+    Text,
+    event,
+    func,
+    select,
+)
 from sqlalchemy.dialects.postgresql import TSVECTOR
 from sqlalchemy.orm import Mapped, Session, mapped_column, relationship
 
 from ..schemas import DataRange
+from ..schemas.character import IngestStage, IngestStatus
 from .base import BigInteger, ORMBase, TableBase
 
 
@@ -134,6 +147,103 @@ class Document(ORMBase):
     )
 
 
+class IngestJob(ORMBase):
+    """知识文件导入任务，每个文档一个，按阶段记录进度以便失败后续做"""
+
+    __tablename__ = "ingest_job"
+    __table_args__ = {"comment": "知识导入任务表"}
+
+    document_id: Mapped[int] = mapped_column(
+        BigInteger,
+        ForeignKey("document.id"),
+        unique=True,
+        index=True,
+        comment="文档ID",
+    )
+    status: Mapped[str] = mapped_column(
+        String(16), default=IngestStatus.pending, index=True, comment="状态"
+    )
+    stage: Mapped[str] = mapped_column(
+        String(16), default=IngestStage.read, comment="当前阶段"
+    )
+    chunk_total: Mapped[int] = mapped_column(Integer, default=0, comment="分块总数")
+    chunk_done: Mapped[int] = mapped_column(Integer, default=0, comment="已写入分块数")
+    batch_size: Mapped[int] = mapped_column(Integer, comment="写入批大小")
+    batches_done: Mapped[list[int]] = mapped_column(
+        JSON, default=list, comment="已写入批次的起始下标"
+    )
+    attempts: Mapped[int] = mapped_column(Integer, default=0, comment="执行次数")
+    error: Mapped[Optional[str]] = mapped_column(Text, nullable=True, comment="错误")
+
+
+class DocumentChunk(TableBase):
+    """文档分块，PGVector 向量库的存储表"""
+
+    __tablename__ = "document_chunk"
+    __table_args__ = (
+        Index(
+            "ix_document_chunk_embedding_hnsw",
+            "embedding",
+            postgresql_using="hnsw",
+            postgresql_with={"m": 16, "ef_construction": 64},
+            postgresql_ops={"embedding": "vector_cosine_ops"},
+        ),
+        Index(
+            "ix_document_chunk_content_ltks_gin",
+            "content_ltks_tsvector",
+            postgresql_using="gin",
+        ),
+        Index(
+            "ix_document_chunk_content_sm_ltks_gin",
+            "content_sm_ltks_tsvector",
+            postgresql_using="gin",
+        ),
+        {"comment": "文档分块表"},
+    )
+
+    index: Mapped[str] = mapped_column(
+        String(64), index=True, default="lorelm", comment="索引名称"
+    )
+    role_id: Mapped[Optional[int]] = mapped_column(
+        BigInteger, index=True, nullable=True, comment="角色ID"
+    )
+    world_id: Mapped[Optional[int]] = mapped_column(
+        BigInteger, index=True, nullable=True, comment="世界ID"
+    )
+    doc_id: Mapped[Optional[int]] = mapped_column(
+        BigInteger, index=True, nullable=True, comment="文档ID"
+    )
+    chunk_key: Mapped[Optional[str]] = mapped_column(
+        String(64), unique=True, nullable=True, comment="分块ID，重复写入时覆盖"
+    )
+
+    content: Mapped[str] = mapped_column(Text, comment="内容")
+    content_ltks: Mapped[str] = mapped_column(Text, default="", comment="内容粗分词")
+    content_sm_ltks: Mapped[str] = mapped_column(
+        Text, default="", comment="内容细分词"
+    )
+    # 'simple' 词典按空格分词，无停用词过滤，对应 ES 的 whitespace analyzer
+    content_ltks_tsvector: Mapped[str] = mapped_column(
+        TSVECTOR,
+        Computed("to_tsvector('simple', coalesce(content_ltks, ''))", persisted=True),
+        comment="内容粗分词",
+    )
+    content_sm_ltks_tsvector: Mapped[str] = mapped_column(
+        TSVECTOR,
+        Computed(
+            "to_tsvector('simple', coalesce(content_sm_ltks, ''))", persisted=True
+        ),
+        comment="内容细分词",
+    )
+    embedding: Mapped[ndarray] = mapped_column(Vector(1024), comment="嵌入")
+
+    create_at: Mapped[int] = mapped_column(BigInteger, comment="创建时间（毫秒）")
+    update_at: Mapped[int] = mapped_column(BigInteger, comment="更新时间（毫秒）")
+    delete_at: Mapped[Optional[int]] = mapped_column(
+        BigInteger, nullable=True, comment="删除时间（毫秒）"
+    )
+
+
 def generate_tsvector(mapper, connection, target):
     session = Session.object_session(target)
     if session is None:
@@ -69,6 +69,12 @@ class ConversationSession(ORMBase):
     token_usage: Mapped[int] = mapped_column(
         Integer, default=0, comment="对话消耗的token数"
     )
+    summary: Mapped[Optional[str]] = mapped_column(
+        Text, nullable=True, comment="早期对话摘要"
+    )
+    summary_message_id: Mapped[Optional[int]] = mapped_column(
+        BigInteger, nullable=True, comment="已纳入摘要的最后一条对话历史ID"
+    )
 
     user: Mapped["User"] = relationship(uselist=False)
     world: Mapped["World"] = relationship(uselist=False)
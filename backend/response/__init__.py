@@ -1 +1,2 @@
 from .common import SuccessResponse
+from .sse import OutputCoalescer, cancel_on_disconnect, sse_event, with_deadline
@@ -0,0 +1,168 @@
+import asyncio
+import os
+import time
+from typing import (
+    Any,
+    AsyncGenerator,
+    AsyncIterable,
+    AsyncIterator,
+    Callable,
+    Optional,
+    TypeVar,
+)
+
+import orjson
+from starlette.requests import Request
+
+from ..utils.common import parse_unit_str
+
+T = TypeVar("T")
+
+# 增量输出合并窗口（毫秒）与合并字节上限
+SSE_FLUSH_INTERVAL = float(os.getenv("SSE_FLUSH_INTERVAL", "30")) / 1e3
+SSE_FLUSH_BYTES = parse_unit_str(os.getenv("SSE_FLUSH_BYTES", "1k"))
+# 检查客户端是否断开的间隔（秒）
+SSE_DISCONNECT_POLL = float(os.getenv("SSE_DISCONNECT_POLL", "0.5"))
+
+
+def sse_event(event: str, data: Any = None) -> bytes:
+    """编码一条 SSE 事件，data 使用 orjson 序列化"""
+    if data is None:
+        return b"event: " + event.encode() + b"\n\n"
+    return b"event: " + event.encode() + b"\ndata: " + orjson.dumps(data) + b"\n\n"
+
+
+class OutputCoalescer:
+    """将大模型增量输出合并为 ``output`` 事件
+
+    首个 token 立即下发，之后在 ``interval`` 秒窗口内或累计超过 ``max_bytes``
+    字节时合并为一帧。content 与 reasoning 分别按序拼接，客户端逐帧追加即可还原全文。
+    """
+
+    def __init__(
+        self, interval: float = SSE_FLUSH_INTERVAL, max_bytes: int = SSE_FLUSH_BYTES
+    ):
+        self.interval = interval
+        self.max_bytes = max_bytes
+        self._content: list[str] = []
+        self._reasoning: list[str] = []
+        self._size = 0
+        self._first = True
+        self._since: Optional[float] = None
+
+    def add(
+        self, content: Optional[str] = None, reasoning: Optional[str] = None
+    ) -> Optional[bytes]:
+        """加入增量，需要下发时返回合并后的事件"""
+        for delta, parts in ((content, self._content), (reasoning, self._reasoning)):
+            if delta:
+                parts.append(delta)
+                self._size += len(delta.encode("utf-8"))
+        if not self._size:
+            return None
+        if self._since is None:
+            self._since = time.monotonic()
+        if (
+            self._first
+            or self._size >= self.max_bytes
+            or time.monotonic() - self._since >= self.interval
+        ):
+            return self.flush()
+        return None
+
+    def timeout(self) -> Optional[float]:
+        """距离当前窗口结束的秒数，没有待下发内容时返回 None"""
+        if self._since is None:
+            return None
+        return max(0.0, self.interval - (time.monotonic() - self._since))
+
+    def flush(self) -> Optional[bytes]:
+        """下发全部待合并内容"""
+        if not self._size:
+            return None
+        data = dict()
+        if self._content:
+            data["content"] = "".join(self._content)
+        if self._reasoning:
+            data["reasoning"] = "".join(self._reasoning)
+        self._content.clear()
+        self._reasoning.clear()
+        self._size = 0
+        self._first = False
+        self._since = None
+        return sse_event("output", data)
+
+
+async def with_deadline(
+    iterable: AsyncIterable[T], timeout: Callable[[], Optional[float]]
+) -> AsyncIterator[Optional[T]]:
+    """迭代异步流，等待下一项超过 ``timeout()`` 秒时产出 None
+
+    超时不会中断底层迭代，调用方可借此按时下发已合并的内容。
+    """
+    iterator = aiter(iterable)
+
+    async def next_item():
+        return await anext(iterator)
+
+    task: Optional[asyncio.Task] = None
+    try:
+        while True:
+            if task is None:
+                task = asyncio.create_task(next_item())
+            done, _ = await asyncio.wait((task,), timeout=timeout())
+            if not done:
+                yield None
+                continue
+            current, task = task, None
+            try:
+                item = current.result()
+            except StopAsyncIteration:
+                return
+            yield item
+    finally:
+        if task is not None:
+            task.cancel()
+            await asyncio.wait((task,))
+        if hasattr(iterator, "aclose"):
+            await iterator.aclose()
+
+
+async def cancel_on_disconnect(
+    request: Request,
+    stream: AsyncGenerator[T, None],
+    interval: float = SSE_DISCONNECT_POLL,
+) -> AsyncIterator[T]:
+    """客户端断开后立即终止流
+
+    每隔 ``interval`` 秒检查一次连接，断开时取消流中正在等待的操作
+    （``CancelledError`` 在流内部抛出），随后关闭流，由流自身负责清理。
+    """
+
+    async def next_item():
+        return await anext(stream)
+
+    task: Optional[asyncio.Task] = None
+    checked = time.monotonic()
+    try:
+        while True:
+            if task is None:
+                task = asyncio.create_task(next_item())
+            done, _ = await asyncio.wait((task,), timeout=interval)
+            if not done or time.monotonic() - checked >= interval:
+                checked = time.monotonic()
+                if await request.is_disconnected():
+                    return
+            if not done:
+                continue
+            current, task = task, None
+            try:
+                item = current.result()
+            except StopAsyncIteration:
+                return
+            yield item
+    finally:
+        if task is not None:
+            task.cancel()
+            await asyncio.wait((task,))
+        await stream.aclose()
@@ -1,3 +1,4 @@
+from enum import StrEnum
 from typing import Annotated, NotRequired, Optional, TypedDict, Union
 
 from fastapi import UploadFile
@@ -137,3 +138,36 @@ class DocumentUpdateRequest(DocumentCreateRequest):
     """文档更新请求"""
 
     pass
+
+
+class IngestStatus(StrEnum):
+    """知识导入状态"""
+
+    pending = "pending"
+    running = "running"
+    succeeded = "succeeded"
+    failed = "failed"
+    cancelled = "cancelled"
+
+
+class IngestStage(StrEnum):
+    """知识导入阶段"""
+
+    read = "read"
+    chunk = "chunk"
+    index = "index"
+    done = "done"
+
+
+class IngestJobResponse(ORMBase):
+    """知识导入任务响应"""
+
+    document_id: int = Field(description="文档ID")
+    status: IngestStatus = Field(description="状态")
+    stage: IngestStage = Field(description="当前阶段")
+    chunk_total: int = Field(description="分块总数")
+    chunk_done: int = Field(description="已写入分块数")
+    attempts: int = Field(description="执行次数")
+    error: Optional[str] = Field(None, description="错误")
+
+    model_config = ConfigDict(from_attributes=True)
@@ -7,6 +7,7 @@ from pydantic import BaseModel, ConfigDict
 class DocumentCreateDict(TypedDict, total=False):
     role_id: int
     world_id: int
+    doc_id: int
 
     content: str
     content_ltks: str
@@ -23,6 +24,7 @@ class DocumentDict(TypedDict):
 
     role_id: int
     world_id: int
+    doc_id: NotRequired[int]
 
     create_at: int
     update_at: int
@@ -31,6 +33,10 @@ class DocumentDict(TypedDict):
     method: str
 
     content: str
+    content_ltks: NotRequired[str]
+
+    score: NotRequired[float]
+    """检索得分，仅检索结果包含"""
 
 
 class ChunkingConfig(BaseModel):
@@ -38,4 +44,5 @@ class ChunkingConfig(BaseModel):
     overlap_size: int
     embed_tag: str
 
-    model_config = ConfigDict(from_attributes=True)
+    # 不可变，可作为分块器缓存的键
+    model_config = ConfigDict(from_attributes=True, frozen=True)
@@ -0,0 +1,14 @@
+from typing import Any, TypedDict
+
+
+class ContextDict(TypedDict):
+    messages: list[dict[str, str]]
+    """发送给大模型的消息"""
+    token_count: int
+    """消息的 token 总数"""
+    lore_count: int
+    """纳入上下文的知识条数"""
+    overflow: list[Any]
+    """超出预算、未纳入上下文的对话历史"""
+    fold: list[Any]
+    """需要合并进摘要的对话历史"""
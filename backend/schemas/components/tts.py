@@ -0,0 +1,7 @@
+from typing import TypedDict
+
+
+class TTSSegmentDict(TypedDict):
+    index: int
+    text: str
+    audio: bytes
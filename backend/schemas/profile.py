@@ -36,6 +36,7 @@ class ProfileProvider(StrEnum):
     # 向量数据库
     ElasticSearch = "elasticsearch"
     PGVector = "pgvector"
+    Embedded = "embedded"
 
     # 图数据库
     NEPTUNE = "neptune"
@@ -4,4 +4,4 @@ from .common import (
     get_unix_timestamp,
     parse_unit_str,
 )
-from .token_predict import TokenPredicter
+from .token_predict import TokenPredicter, get_token_predicter
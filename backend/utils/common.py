@@ -107,6 +107,19 @@ class BaseTool(ABC, Generic[DBType]):
     async def close(self):
         pass
 
+    async def ping(self) -> bool:
+        """连接是否可用"""
+        return True
+
+    async def reconnect(self):
+        """关闭旧连接并重建客户端"""
+        try:
+            await self.close()
+        except Exception as e:
+            self.logger.warning(f"close before reconnect failed: {e}")
+        self._client = self._get_client()
+        self.logger.info("reconnected")
+
     async def __aenter__(self):
         return self
 
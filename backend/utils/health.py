@@ -0,0 +1,79 @@
+import asyncio
+import os
+from logging import getLogger
+from typing import Callable, Optional
+
+from .common import BaseTool
+
+HEALTH_CHECK_INTERVAL = float(os.getenv("HEALTH_CHECK_INTERVAL", "30"))
+HEALTH_CHECK_TIMEOUT = float(os.getenv("HEALTH_CHECK_TIMEOUT", "5"))
+
+
+class HealthMonitor:
+    """定期检查共享客户端，不可用时重建连接"""
+
+    def __init__(
+        self,
+        interval: float = HEALTH_CHECK_INTERVAL,
+        timeout: float = HEALTH_CHECK_TIMEOUT,
+    ):
+        self.interval = interval
+        self.timeout = timeout
+        self.status: dict[str, bool] = dict()
+        self._tools: dict[str, Callable[[], Optional[BaseTool]]] = dict()
+        self._task: Optional[asyncio.Task] = None
+        self.logger = getLogger("lorelm.health")
+
+    def register(self, name: str, getter: Callable[[], Optional[BaseTool]]):
+        """注册需要检查的客户端，getter 返回当前共享实例"""
+        self._tools[name] = getter
+
+    async def check(self) -> dict[str, bool]:
+        """检查全部客户端，不可用的尝试重连一次"""
+        for name, getter in self._tools.items():
+            tool = getter()
+            if tool is None:
+                self.status[name] = False
+                continue
+            healthy = await self._ping(tool)
+            if not healthy:
+                self.logger.warning(f"{name} unhealthy, reconnecting")
+                try:
+                    await tool.reconnect()
+                    healthy = await self._ping(tool)
+                except Exception as e:
+                    self.logger.error(f"{name} reconnect failed: {e}")
+            self.status[name] = healthy
+        return dict(self.status)
+
+    def snapshot(self) -> dict[str, Optional[bool]]:
+        """最近一次检查的结果，不发起检查，尚未检查过的为 None"""
+        return {name: self.status.get(name) for name in self._tools}
+
+    def start(self):
+        if self._task is None and self.interval > 0:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.wait((self._task,))
+            self._task = None
+
+    async def _ping(self, tool: BaseTool) -> bool:
+        try:
+            return await asyncio.wait_for(tool.ping(), self.timeout)
+        except Exception:
+            return False
+
+    async def _run(self):
+        # 启动后先检查一次，使 snapshot 尽早有结果
+        while True:
+            try:
+                await self.check()
+            except Exception as e:
+                self.logger.exception(f"health check failed: {e}")
+            await asyncio.sleep(self.interval)
+
+
+health_monitor = HealthMonitor()
@@ -0,0 +1,82 @@
+import os
+from logging import getLogger
+from typing import Optional
+
+import aiohttp
+from omni_llm import AsyncChatBase, async_chat_factory, async_embedding_factory
+
+OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
+OPENAI_BASE_URL = os.getenv("OPENAI_BASE_URL")
+OPENAI_CHAT_MODEL = os.getenv("OPENAI_CHAT_MODEL", "Qwen/Qwen3-Next-80B-A3B-Instruct")
+OPENAI_EMBED_MODEL = os.getenv("OPENAI_EMBED_MODEL")
+OPENAI_EMBED_DIMS = int(os.getenv("OPENAI_EMBED_DIMS"))
+QINIU_API_KEY = os.getenv("QINIU_API_KEY")
+assert OPENAI_EMBED_DIMS == 1024, "OPENAI_EMBED_DIMS must be 1024"
+
+# 连接池配置
+HTTP_POOL_LIMIT = int(os.getenv("HTTP_POOL_LIMIT", "128"))
+HTTP_POOL_LIMIT_PER_HOST = int(os.getenv("HTTP_POOL_LIMIT_PER_HOST", "32"))
+HTTP_KEEPALIVE_TIMEOUT = float(os.getenv("HTTP_KEEPALIVE_TIMEOUT", "60"))
+
+logger = getLogger("lorelm.llm")
+_chat_client: Optional[AsyncChatBase] = None
+_embed_client = None
+_http_session: Optional[aiohttp.ClientSession] = None
+
+
+async def llm_init():
+    """创建进程级共享的大模型客户端与 HTTP 连接池"""
+    global _chat_client, _embed_client, _http_session
+
+    _http_session = aiohttp.ClientSession(
+        connector=aiohttp.TCPConnector(
+            limit=HTTP_POOL_LIMIT,
+            limit_per_host=HTTP_POOL_LIMIT_PER_HOST,
+            keepalive_timeout=HTTP_KEEPALIVE_TIMEOUT,
+            ttl_dns_cache=300,
+        ),
+    )
+    if not all([OPENAI_API_KEY, OPENAI_BASE_URL]):
+        logger.warning("OPENAI_API_KEY or OPENAI_BASE_URL not set, llm disabled")
+    else:
+        _chat_client = async_chat_factory("siliconflow")(
+            OPENAI_CHAT_MODEL, -1, OPENAI_BASE_URL, OPENAI_API_KEY
+        )
+        _embed_client = async_embedding_factory("siliconflow")(
+            OPENAI_EMBED_MODEL,
+            -1,
+            OPENAI_EMBED_DIMS,
+            OPENAI_BASE_URL,
+            OPENAI_API_KEY,
+        )
+    logger.info(
+        f"init finished, pool limit {HTTP_POOL_LIMIT}, "
+        f"per host {HTTP_POOL_LIMIT_PER_HOST}"
+    )
+
+
+async def llm_deinit():
+    global _chat_client, _embed_client, _http_session
+
+    if _http_session is not None:
+        await _http_session.close()
+    _chat_client = None
+    _embed_client = None
+    _http_session = None
+    logger.info(f"deinit finished")
+
+
+def get_chat_client() -> Optional[AsyncChatBase]:
+    """共享的对话模型客户端，未配置时返回 None"""
+    return _chat_client
+
+
+def get_embed_client():
+    """共享的向量模型客户端，未配置时返回 None"""
+    return _embed_client
+
+
+def get_http_session() -> aiohttp.ClientSession:
+    """共享的 keep-alive HTTP 会话（TTS 等直连接口使用）"""
+    assert _http_session is not None, "llm_init must be called before use"
+    return _http_session
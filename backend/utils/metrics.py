@@ -0,0 +1,69 @@
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+from typing import Awaitable, TypeVar
+
+T = TypeVar("T")
+
+
+class StageTimer:
+    """记录流水线各阶段的起止时间（相对于创建时刻，毫秒）
+
+    阶段之间可以并发，``report`` 会同时给出每个阶段的耗时与起止点，
+    便于观察关键路径。
+    """
+
+    def __init__(self):
+        self._origin = time.perf_counter()
+        self.stages: dict[str, tuple[float, float]] = dict()
+
+    def elapsed(self) -> float:
+        return (time.perf_counter() - self._origin) * 1e3
+
+    @contextmanager
+    def stage(self, name: str):
+        start = self.elapsed()
+        try:
+            yield
+        finally:
+            self.stages[name] = (start, self.elapsed())
+
+    async def wrap(self, name: str, awaitable: Awaitable[T]) -> T:
+        """计时一个可等待对象"""
+        with self.stage(name):
+            return await awaitable
+
+    def mark(self, name: str):
+        """记录一个时间点"""
+        now = self.elapsed()
+        self.stages[name] = (now, now)
+
+    def report(self) -> str:
+        return ", ".join(
+            f"{name} {end - start:.0f}ms [{start:.0f}-{end:.0f}]"
+            if end > start
+            else f"{name} @{start:.0f}ms"
+            for name, (start, end) in sorted(
+                self.stages.items(), key=lambda it: it[1]
+            )
+        )
+
+
+class Counters:
+    """进程内计数器"""
+
+    def __init__(self):
+        self._values: defaultdict[str, int] = defaultdict(int)
+
+    def inc(self, name: str, value: int = 1) -> int:
+        self._values[name] += value
+        return self._values[name]
+
+    def get(self, name: str) -> int:
+        return self._values.get(name, 0)
+
+    def snapshot(self) -> dict[str, int]:
+        return dict(self._values)
+
+
+counters = Counters()
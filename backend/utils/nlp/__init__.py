@@ -1,2 +1,37 @@
+import threading
+from typing import Optional
+
 from .query import FullTextQueryer
+from .text import normalize_text
 from .tokenizer import Tokenizer
+
+_lock = threading.Lock()
+_tokenizer: Optional[Tokenizer] = None
+_queryer: Optional[FullTextQueryer] = None
+
+
+def nlp_init():
+    """预加载分词器、同义词与 TF-IDF 词典（阻塞，需在线程中调用）"""
+    get_queryer()
+
+
+def get_tokenizer() -> Tokenizer:
+    """进程内共享的只读分词器"""
+    global _tokenizer
+    if _tokenizer is None:
+        # 构建前缀树缓存会写文件，且 jieba 初始化不可重入，需要加锁
+        with _lock:
+            if _tokenizer is None:
+                _tokenizer = Tokenizer()
+    return _tokenizer
+
+
+def get_queryer() -> FullTextQueryer:
+    """进程内共享的只读全文检索查询构造器"""
+    global _queryer
+    if _queryer is None:
+        tokenizer = get_tokenizer()
+        with _lock:
+            if _queryer is None:
+                _queryer = FullTextQueryer(tokenizer)
+    return _queryer
@@ -1,6 +1,6 @@
 import re
 from operator import itemgetter
-from typing import Union
+from typing import Optional, Union
 
 import jieba.analyse
 
@@ -11,10 +11,12 @@ from .tokenizer import Tokenizer
 class FullTextQueryer:
     MAX_KEYWORDS = 32
 
-    def __init__(self):
-        self.tokenizer = Tokenizer()
+    def __init__(self, tokenizer: Optional[Tokenizer] = None):
+        self.tokenizer = tokenizer or Tokenizer()
         self.syn = SynonymDealer()
         self.tf_idf = jieba.analyse.TFIDF()
+        # TF-IDF 使用 jieba 默认分词器，提前加载词典，避免在工作线程中懒加载
+        self.tf_idf.tokenizer.check_initialized()
 
     @staticmethod
     def rmWWW(txt):
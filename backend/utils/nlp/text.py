@@ -0,0 +1,8 @@
+import re
+import unicodedata
+
+
+def normalize_text(text: str) -> str:
+    """归一化文本，使仅有空白、全半角差异的文本得到相同结果"""
+    text = unicodedata.normalize("NFKC", text)
+    return re.sub(r"\s+", " ", text).strip()
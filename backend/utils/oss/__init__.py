@@ -1,5 +1,7 @@
 import os
 from contextlib import asynccontextmanager
+from logging import getLogger
+from typing import Optional
 
 from ...schemas import ProfileProvider, ProfileType, SystemProfile
 from ._base import ObjectStoreServiceBase
@@ -11,8 +13,14 @@ MINIO_USER = os.getenv("MINIO_USER", "lorelm")
 MINIO_PASSWORD = os.getenv("MINIO_PASSWORD", "lorelm123")
 MINIO_SECURE = os.getenv("MINIO_SECURE", "false").lower() == "true"
 
+logger = getLogger("lorelm.oss")
+_oss: Optional[Minio] = None
+
+
+async def oss_init():
+    """创建进程级共享的对象存储客户端"""
+    global _oss
 
-async def get_oss():
     profile = SystemProfile(
         name="minio",
         type=ProfileType.OSS,
@@ -24,11 +32,27 @@ async def get_oss():
         db=None,
         extra={"secure": MINIO_SECURE},
     )
-    async with Minio(profile) as client:
-        try:
-            yield client
-        finally:
-            pass
+    _oss = Minio(profile)
+    logger.info(f"init finished")
+
+
+async def oss_deinit():
+    global _oss
+
+    if _oss is not None:
+        await _oss.close()
+    _oss = None
+    logger.info(f"deinit finished")
+
+
+def get_oss_instance() -> Optional[Minio]:
+    """共享的对象存储客户端，未初始化时返回 None"""
+    return _oss
+
+
+async def get_oss():
+    assert _oss is not None, "object storage is not initialized"
+    yield _oss
 
 
 get_oss_with = asynccontextmanager(get_oss)
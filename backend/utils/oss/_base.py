@@ -25,6 +25,23 @@ class ObjectStoreServiceBase(BaseTool[DBType], Generic[DBType]):
     async def bucket_list(self) -> List[str]:
         pass
 
+    @abstractmethod
+    async def bucket_set_expiration(
+        self, bucket_name: str, prefix: str, days: int, rule_id: str
+    ):
+        """为前缀下的文件设置过期删除规则，同 rule_id 的规则被替换，其他规则保留
+
+        :param bucket_name: 存储桶名称
+        :type bucket_name: str
+        :param prefix: 文件前缀
+        :type prefix: str
+        :param days: 创建后保留的天数
+        :type days: int
+        :param rule_id: 规则ID
+        :type rule_id: str
+        """
+        pass
+
     @abstractmethod
     async def document_exists(self, bucket_name: str, obj_path: str) -> bool:
         pass
@@ -6,9 +6,11 @@ from typing import BinaryIO, Iterable, List, Optional, Union
 
 from aiohttp import ClientResponse
 from miniopy_async import Minio as _Minio
+from miniopy_async.commonconfig import ENABLED, Filter
 from miniopy_async.deleteobjects import DeleteObject
 from miniopy_async.error import S3Error
 from miniopy_async.helpers import check_bucket_name, check_object_name
+from miniopy_async.lifecycleconfig import Expiration, LifecycleConfig, Rule
 
 from backend.schemas import ProfileProvider
 from backend.utils import get_root_dir
@@ -60,6 +62,22 @@ class Minio(ObjectStoreServiceBase[_Minio]):
         buckets = await self._client.list_buckets()
         return [bucket.name for bucket in buckets]
 
+    async def bucket_set_expiration(
+        self, bucket_name: str, prefix: str, days: int, rule_id: str
+    ):
+        config = await self._client.get_bucket_lifecycle(bucket_name)
+        rules = [it for it in (config.rules if config else []) if it.rule_id != rule_id]
+        rules.append(
+            Rule(
+                ENABLED,
+                rule_filter=Filter(prefix=prefix),
+                rule_id=rule_id,
+                expiration=Expiration(days=days),
+            )
+        )
+        await self._client.set_bucket_lifecycle(bucket_name, LifecycleConfig(rules))
+        self.logger.info(f"Bucket {bucket_name} {prefix}* expires after {days} days")
+
     async def document_exists(self, bucket_name: str, obj_path: str) -> bool:
         try:
             check_object_name(obj_path)
@@ -168,5 +186,13 @@ class Minio(ObjectStoreServiceBase[_Minio]):
             if error:
                 self.logger.error(error)
 
+    async def ping(self) -> bool:
+        try:
+            await self._client.list_buckets()
+        except Exception as e:
+            self.logger.warning(f"ping failed: {e}")
+            return False
+        return True
+
     async def close(self):
         await self._client.close_session()
@@ -1,17 +1,63 @@
 import os.path
 import re
+import shutil
+import threading
 from abc import ABC, abstractmethod
+from functools import cache
+from logging import getLogger
 from typing import Iterable
 
 import tiktoken  # OpenAI
-from modelscope import snapshot_download
 from tiktoken import Encoding as OpenAITokenizer
 from tokenizers import Tokenizer  # Hugging Face
 
+from .common import get_root_dir
+
+# 本地分词器目录，按 {TOKENIZER_DIR}/{tag}/tokenizer.json 存放
+TOKENIZER_DIR = os.getenv("TOKENIZER_DIR", get_root_dir("data/tokenizer"))
+# 离线模式下本地没有分词器文件时直接报错，不访问网络
+TOKENIZER_OFFLINE = os.getenv("TOKENIZER_OFFLINE", "false").lower() == "true"
+# tiktoken 的 BPE 文件同样缓存到本地目录（tiktoken 在加载时读取该变量）
+os.environ.setdefault("TIKTOKEN_CACHE_DIR", os.path.join(TOKENIZER_DIR, "tiktoken"))
+
 # import sentencepiece as spm # LLaMA
 
 OPENAI_MODEL = re.compile(r"^(o[1,3,4].*|" r"gpt-\d[\.\d]+.*|text-embedding-.*)$")
 
+logger = getLogger("lorelm.utils.token_predict")
+_lock = threading.Lock()
+
+
+def resolve_tokenizer_file(tag: str) -> str:
+    """获取 tokenizer.json 的本地路径
+
+    依次查找：tag 本身为本地文件或目录、``TOKENIZER_DIR`` 下的缓存；
+    都没有且未开启离线模式时从 modelscope 下载，并复制到 ``TOKENIZER_DIR``，
+    之后不再访问网络。
+    """
+    for path in (tag, os.path.join(tag, "tokenizer.json")):
+        if os.path.isfile(path):
+            return path
+    local_file = os.path.join(TOKENIZER_DIR, tag, "tokenizer.json")
+    if os.path.isfile(local_file):
+        return local_file
+    if TOKENIZER_OFFLINE:
+        raise FileNotFoundError(f"tokenizer of {tag} not found in {TOKENIZER_DIR}")
+
+    from modelscope import snapshot_download
+
+    with _lock:
+        if not os.path.isfile(local_file):
+            logger.info(f"download tokenizer of {tag}")
+            cache_dir = snapshot_download(tag, allow_file_pattern="tokenizer.json")
+            os.makedirs(os.path.dirname(local_file), exist_ok=True)
+            # 先写临时文件再改名，避免并发读到不完整的文件
+            shutil.copyfile(
+                os.path.join(cache_dir, "tokenizer.json"), local_file + ".tmp"
+            )
+            os.replace(local_file + ".tmp", local_file)
+    return local_file
+
 
 class TokenPredicterBase(ABC):
     def __init__(self, tag: str):
@@ -29,11 +75,16 @@ class TokenPredicterBase(ABC):
     def encode_batch(self, texts: Iterable[str]) -> Iterable[int]:
         pass
 
+    @abstractmethod
+    def offsets_batch(self, texts: Iterable[str]) -> list[list[int]]:
+        """各文本每个 token 的起始字符位置（不含特殊 token），长度即 token 数"""
+        pass
+
 
 class HuggingfaceTokenPredict(TokenPredicterBase):
     def __init__(self, tag: str):
-        cache_dir = snapshot_download(tag, allow_file_pattern="tokenizer.json")
-        self._tk = Tokenizer.from_file(os.path.join(cache_dir, "tokenizer.json"))
+        super().__init__(tag)
+        self._tk = Tokenizer.from_file(resolve_tokenizer_file(tag))
 
     def encode(self, text: str) -> int:
         return len(self._tk.encode(text).ids)
@@ -41,6 +92,10 @@ class HuggingfaceTokenPredict(TokenPredicterBase):
     def encode_batch(self, texts: Iterable[str]) -> Iterable[int]:
         return (len(it.ids) for it in self._tk.encode_batch_fast(texts))
 
+    def offsets_batch(self, texts: Iterable[str]) -> list[list[int]]:
+        encodings = self._tk.encode_batch(list(texts), add_special_tokens=False)
+        return [[start for start, _ in it.offsets] for it in encodings]
+
 
 class OpenaiTokenPredict(TokenPredicterBase):
     def __init__(self, tag: str):
@@ -53,6 +108,12 @@ class OpenaiTokenPredict(TokenPredicterBase):
     def encode_batch(self, texts: Iterable[str]) -> Iterable[int]:
         return map(len, self._tk.encode_batch(texts))
 
+    def offsets_batch(self, texts: Iterable[str]) -> list[list[int]]:
+        return [
+            self._tk.decode_with_offsets(tokens)[1]
+            for tokens in self._tk.encode_ordinary_batch(list(texts))
+        ]
+
 
 class TokenPredicter(TokenPredicterBase):
     def __init__(self, tag: str):
@@ -71,6 +132,15 @@ class TokenPredicter(TokenPredicterBase):
     def encode_batch(self, texts: Iterable[str]) -> Iterable[int]:
         return self._imp.encode_batch(texts)
 
+    def offsets_batch(self, texts: Iterable[str]) -> list[list[int]]:
+        return self._imp.offsets_batch(texts)
+
+
+@cache
+def get_token_predicter(tag: str) -> TokenPredicter:
+    """进程内按模型共享的 TokenPredicter，分词器只加载一次"""
+    return TokenPredicter(tag)
+
 
 if __name__ == "__main__":
     tag = "BAAI/bge-m3"
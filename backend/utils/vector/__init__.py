@@ -1,31 +1,97 @@
 import os
 from contextlib import asynccontextmanager
+from logging import getLogger
+from typing import Optional
 
 from ...schemas import ProfileProvider, ProfileType, SystemProfile
 from ._base import VectorDatabase
 from ._elastic import ElasticSearch
+from ._embedded import EMBEDDED_VDB_DIR, EmbeddedVectorDatabase
+from ._pgvector import PGVector
+
+# 向量库：elasticsearch、pgvector（复用业务数据库）或 embedded（进程内）
+VDB_PROVIDER = ProfileProvider(os.getenv("VDB_PROVIDER", "elasticsearch"))
 
 ES_HOST = os.getenv("ES_HOST", "127.0.0.1")
 ES_PORT = int(os.getenv("ES_PORT", "9200"))
 ES_USER = os.getenv("ES_USER", "elastic")
 ES_PASSWORD = os.getenv("ES_PASSWORD", "lorelm")
 
+logger = getLogger("lorelm.vector")
+_vdb: Optional[VectorDatabase] = None
+
+
+def _get_profile() -> SystemProfile:
+    match VDB_PROVIDER:
+        case ProfileProvider.ElasticSearch:
+            return SystemProfile(
+                name="elasticsearch",
+                type=ProfileType.Vector,
+                provider=ProfileProvider.ElasticSearch,
+                host=ES_HOST,
+                port=ES_PORT,
+                username=ES_USER,
+                password=ES_PASSWORD,
+            )
+        case ProfileProvider.PGVector:
+            # 连接信息由业务数据库引擎提供
+            return SystemProfile(
+                name="pgvector",
+                type=ProfileType.Vector,
+                provider=ProfileProvider.PGVector,
+                host=os.getenv("POSTGRES_HOST", "localhost"),
+                port=int(os.getenv("POSTGRES_PORT", "5432")),
+                username=None,
+                password=None,
+            )
+        case ProfileProvider.Embedded:
+            return SystemProfile(
+                name="embedded",
+                type=ProfileType.Vector,
+                provider=ProfileProvider.Embedded,
+                host="localhost",
+                port=0,
+                username=None,
+                password=None,
+                extra=dict(path=EMBEDDED_VDB_DIR),
+            )
+        case _:
+            raise ValueError(f"Unknown vector database: {VDB_PROVIDER}")
+
+
+async def vdb_init():
+    """创建进程级共享的向量库客户端（pgvector 需在 db_init 之后调用）"""
+    global _vdb
+
+    profile = _get_profile()
+    match profile.provider:
+        case ProfileProvider.PGVector:
+            vdb_class = PGVector
+        case ProfileProvider.Embedded:
+            vdb_class = EmbeddedVectorDatabase
+        case _:
+            vdb_class = ElasticSearch
+    _vdb = vdb_class(profile)
+    logger.info(f"init finished, provider {profile.provider}")
+
+
+async def vdb_deinit():
+    global _vdb
+
+    if _vdb is not None:
+        await _vdb.close()
+    _vdb = None
+    logger.info(f"deinit finished")
+
+
+def get_vdb_instance() -> Optional[VectorDatabase]:
+    """共享的向量库客户端，未初始化时返回 None"""
+    return _vdb
+
 
 async def get_vdb():
-    profile = SystemProfile(
-        name="elasticsearch",
-        type=ProfileType.Vector,
-        provider=ProfileProvider.ElasticSearch,
-        host=ES_HOST,
-        port=ES_PORT,
-        username=ES_USER,
-        password=ES_PASSWORD,
-    )
-    async with ElasticSearch(profile) as client:
-        try:
-            yield client
-        finally:
-            pass
+    assert _vdb is not None, "vector database is not initialized"
+    yield _vdb
 
 
 get_vdb_with = asynccontextmanager(get_vdb)
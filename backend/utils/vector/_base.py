@@ -1,4 +1,6 @@
+import re
 from abc import abstractmethod
+from contextlib import asynccontextmanager
 from logging import getLogger
 from typing import Final, Generic, List, Optional, Tuple, Union
 
@@ -16,6 +18,20 @@ DEFAULT_QUERY_FIELDS: Final[tuple[str, ...]] = (
     "content_ltks^2",
     "content_sm_ltks",
 )
+QUERY_BOOST_PATTERN = re.compile(r"[\^~][\d.]+")
+QUERY_TERM_PATTERN = re.compile(r"\w+")
+QUERY_OPERATORS = {"OR", "AND", "NOT"}
+
+
+def query_terms(query_string: str) -> list[str]:
+    """取出 ``FullTextQueryer.question`` 生成的 query_string 中的全部词项（去重）
+
+    供不支持 query_string 语法的向量库使用，权重与短语距离会被忽略。
+    """
+    terms = QUERY_TERM_PATTERN.findall(QUERY_BOOST_PATTERN.sub(" ", query_string))
+    return list(
+        dict.fromkeys(it.lower() for it in terms if it not in QUERY_OPERATORS)
+    )
 
 
 class VectorDatabase(BaseTool[DBType], Generic[DBType]):
@@ -126,7 +142,10 @@ class VectorDatabase(BaseTool[DBType], Generic[DBType]):
 
     @abstractmethod
     async def doc_batch_insert(
-        self, index_name: str, docs: List[DocumentDict]
+        self,
+        index_name: str,
+        docs: List[DocumentDict],
+        ids: Optional[List[str]] = None,
     ) -> List[str]:
         """批量文档插入
 
@@ -134,9 +153,21 @@ class VectorDatabase(BaseTool[DBType], Generic[DBType]):
         :type index_name: str
         :param docs: 文档列表
         :type docs: List[DocumentDict]
+        :param ids: 文档ID，已存在的同ID文档被覆盖，使重复写入幂等，
+            defaults to None（自动生成）
+        :type ids: Optional[List[str]], optional
         """
         pass
 
+    @asynccontextmanager
+    async def bulk_import(self, index_name: str):
+        """批量导入期间的索引设置（如暂停刷新），默认不做处理
+
+        :param index_name: 索引名称
+        :type index_name: str
+        """
+        yield
+
     @abstractmethod
     async def doc_list(
         self, index_name: str, kb_id: Optional[int] = None, doc_id: Optional[int] = None
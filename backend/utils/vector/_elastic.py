@@ -1,21 +1,93 @@
+import asyncio
+import math
+import os
+import time
+from contextlib import asynccontextmanager, nullcontext
 from copy import deepcopy
-from typing import Optional, Set, Tuple, Union
+from functools import cache
+from typing import Any, Optional, Set, Tuple, Union
 
+import orjson
 import yaml
-from elasticsearch import AsyncElasticsearch
+from elasticsearch import ApiError, AsyncElasticsearch
 from elasticsearch.dsl import AsyncSearch
 from elasticsearch.dsl.response import Hit
 from elasticsearch.dsl.utils import recursive_to_dict
 
 from ...schemas.components import DocumentDict
 from ...schemas.profile import ProfileProvider
-from ...utils import get_root_dir
+from ...utils import get_root_dir, parse_unit_str
 from ._base import DEFAULT_QUERY_FIELDS, LenAbleVar, VectorDatabase
 
 # num_candidates 最大值为10,000
 # https://www.elastic.co/docs/reference/query-languages/query-dsl/query-dsl-knn-query
 MAX_CANDIDATES = 10000
 
+# 连接池配置
+ES_CONNECTIONS_PER_NODE = int(os.getenv("ES_CONNECTIONS_PER_NODE", "32"))
+ES_REQUEST_TIMEOUT = float(os.getenv("ES_REQUEST_TIMEOUT", "30"))
+ES_MAX_RETRIES = int(os.getenv("ES_MAX_RETRIES", "3"))
+
+# 批量写入配置
+ES_BULK_MAX_BYTES = parse_unit_str(os.getenv("ES_BULK_MAX_BYTES", "5m"))
+ES_BULK_MAX_DOCS = int(os.getenv("ES_BULK_MAX_DOCS", "500"))
+ES_BULK_CONCURRENCY = int(os.getenv("ES_BULK_CONCURRENCY", "4"))
+ES_BULK_MAX_RETRIES = int(os.getenv("ES_BULK_MAX_RETRIES", "5"))
+ES_BULK_BACKOFF = float(os.getenv("ES_BULK_BACKOFF", "0.5"))
+# 单次写入文档数达到该值时，导入期间关闭 refresh_interval
+ES_BULK_PAUSE_REFRESH_DOCS = int(os.getenv("ES_BULK_PAUSE_REFRESH_DOCS", "2000"))
+
+# 向量量化：none、int8、int4、bbq，只在创建索引时生效
+ES_VECTOR_QUANTIZATION = os.getenv("ES_VECTOR_QUANTIZATION", "none")
+ES_HNSW_M = int(os.getenv("ES_HNSW_M", "16"))
+ES_HNSW_EF_CONSTRUCTION = int(os.getenv("ES_HNSW_EF_CONSTRUCTION", "100"))
+# 量化索引检索时的过采样倍数，大于1时用原始向量重新打分（需要 ES 8.18+），0 关闭
+ES_KNN_OVERSAMPLE = float(os.getenv("ES_KNN_OVERSAMPLE", "0"))
+# 混合检索：linear（线性加权）、rrf（ES retriever 融合）、
+# rrf_local（msearch 一次请求取回两路结果后在本地融合，不依赖 RRF 许可）
+ES_SEARCH_MODE = os.getenv("ES_SEARCH_MODE", "linear")
+# RRF 每路检索的候选窗口与排名常数
+ES_RRF_WINDOW = int(os.getenv("ES_RRF_WINDOW", "64"))
+ES_RRF_RANK_CONSTANT = int(os.getenv("ES_RRF_RANK_CONSTANT", "60"))
+VECTOR_INDEX_TYPES = {
+    "none": "hnsw",
+    "int8": "int8_hnsw",
+    "int4": "int4_hnsw",
+    "bbq": "bbq_hnsw",
+}
+
+
+@cache
+def load_es_setting() -> dict[str, Any]:
+    """读取索引配置（只解析一次，使用方需自行深拷贝后再修改）"""
+    with open(get_root_dir("resources/vector/es/config.yml"), encoding="utf-8") as f:
+        setting = yaml.load(f, Loader=yaml.FullLoader)
+    assert "mapping" in setting and "setting" in setting, "elasticsearch config error"
+    return setting
+
+
+def vector_index_options(quantization: str, vector_dims: int) -> dict[str, Any]:
+    """dense_vector 的 HNSW 索引参数
+
+    :param quantization: 量化方式，none、int8、int4 或 bbq
+    :type quantization: str
+    :param vector_dims: 向量维度
+    :type vector_dims: int
+    :return: index_options
+    :rtype: dict[str, Any]
+    """
+    if quantization not in VECTOR_INDEX_TYPES:
+        raise ValueError(f"unknown vector quantization: {quantization}")
+    if quantization == "int4" and vector_dims % 2:
+        raise ValueError("int4 quantization requires even vector dims")
+    if quantization == "bbq" and vector_dims < 64:
+        raise ValueError("bbq quantization requires at least 64 vector dims")
+    return {
+        "type": VECTOR_INDEX_TYPES[quantization],
+        "m": ES_HNSW_M,
+        "ef_construction": ES_HNSW_EF_CONSTRUCTION,
+    }
+
 
 class ElasticSearch(VectorDatabase[AsyncElasticsearch]):
     """ElasticSearch vector database"""
@@ -25,13 +97,10 @@ class ElasticSearch(VectorDatabase[AsyncElasticsearch]):
 
     def __init__(self, *args, **kwargs):
         super(ElasticSearch, self).__init__(*args, **kwargs)
-        with open(
-            get_root_dir("resources/vector/es/config.yml"), encoding="utf-8"
-        ) as f:
-            self._setting = yaml.load(f, Loader=yaml.FullLoader)
-        assert (
-            "mapping" in self._setting and "setting" in self._setting
-        ), "elasticsearch config error"
+        self._setting = load_es_setting()
+        # 各索引进行中的批量导入数，归零时恢复 refresh_interval
+        self._paused: dict[str, int] = dict()
+        self._paused_lock = asyncio.Lock()
 
     def _get_client(self):
         return AsyncElasticsearch(
@@ -39,18 +108,39 @@ class ElasticSearch(VectorDatabase[AsyncElasticsearch]):
                 host=self._config.host, port=self._config.port
             ),
             basic_auth=(self._config.username, self._config.password),
+            connections_per_node=ES_CONNECTIONS_PER_NODE,
+            request_timeout=ES_REQUEST_TIMEOUT,
+            max_retries=ES_MAX_RETRIES,
+            retry_on_timeout=True,
         )
 
-    async def index_create(self, index_name: str, vector_dims: int) -> bool:
+    async def index_create(
+        self, index_name: str, vector_dims: int, quantization: Optional[str] = None
+    ) -> bool:
+        """索引创建
+
+        :param index_name: 索引名字
+        :type index_name: str
+        :param vector_dims: 向量维度
+        :type vector_dims: int
+        :param quantization: 向量量化方式（none、int8、int4、bbq），
+            默认使用 ES_VECTOR_QUANTIZATION
+        :type quantization: Optional[str], optional
+        :return: 状态
+        :rtype: bool
+        """
         if await self.index_exists(index_name):
             self.logger.warning(f"op create, index {index_name} already exists")
             return False
         mapping = deepcopy(self._setting["mapping"])
         mapping["properties"]["vector"]["dims"] = vector_dims
+        mapping["properties"]["vector"]["index_options"] = vector_index_options(
+            quantization or ES_VECTOR_QUANTIZATION, vector_dims
+        )
         await self._client.indices.create(
             index=index_name,
             mappings=mapping,
-            settings=self._setting["setting"],
+            settings=deepcopy(self._setting["setting"]),
         )
         self.logger.info(f"op create, index {index_name} created")
         return True
@@ -161,22 +251,156 @@ class ElasticSearch(VectorDatabase[AsyncElasticsearch]):
         return rsp["index"]["_id"]
 
     async def doc_batch_insert(
-        self, index_name: str, docs: list[DocumentDict]
+        self,
+        index_name: str,
+        docs: list[DocumentDict],
+        ids: Optional[list[str]] = None,
+        pause_refresh: Optional[bool] = None,
     ) -> list[str]:
-        batch_size = 32
-        operations = list()
-        outputs = list()
-        for doc in docs:
-            operations.append({"index": {"_index": index_name}})
-            operations.append(doc)
-        for i in range(0, len(operations), batch_size):
-            rsp = await self._client.bulk(operations=operations[i : i + batch_size])
-            if rsp["errors"]:
-                raise Exception(rsp["errors"])
-            outputs.extend(it["index"]["_id"] for it in rsp["items"])
-        self.logger.info(f"index:{index_name} create {len(outputs)} docs success")
+        """批量文档插入
+
+        按请求体字节数切分批次，限定并发发送；被限流（429）的文档指数退避后重试。
+
+        :param index_name: 索引名称
+        :type index_name: str
+        :param docs: 文档列表
+        :type docs: list[DocumentDict]
+        :param ids: 文档ID（_id），已存在时覆盖，defaults to None（自动生成）
+        :type ids: Optional[list[str]], optional
+        :param pause_refresh: 本次写入期间是否关闭 refresh_interval（见 bulk_import），
+            默认文档数达到 ES_BULK_PAUSE_REFRESH_DOCS 时关闭
+        :type pause_refresh: Optional[bool], optional
+        :return: 文档ID，与 docs 顺序一致
+        :rtype: list[str]
+        """
+        if not docs:
+            return list()
+        start = time.perf_counter()
+        if ids is None:
+            actions = [orjson.dumps({"index": {"_index": index_name}})] * len(docs)
+        else:
+            actions = [
+                orjson.dumps({"index": {"_index": index_name, "_id": it}}) for it in ids
+            ]
+        lines = [
+            action
+            + b"\n"
+            + orjson.dumps(doc, option=orjson.OPT_SERIALIZE_NUMPY)
+            + b"\n"
+            for action, doc in zip(actions, docs)
+        ]
+        outputs: list[Optional[str]] = [None] * len(docs)
+        semaphore = asyncio.Semaphore(ES_BULK_CONCURRENCY)
+
+        if pause_refresh is None:
+            pause_refresh = len(docs) >= ES_BULK_PAUSE_REFRESH_DOCS
+        async with self.bulk_import(index_name) if pause_refresh else nullcontext():
+            batches = list(self._bulk_batches(lines))
+            await asyncio.gather(
+                *(self._bulk(lines, it, outputs, semaphore) for it in batches)
+            )
+
+        elapsed = time.perf_counter() - start
+        self.logger.info(
+            f"index:{index_name} create {len(outputs)} docs success "
+            f"in {len(batches)} batches, {elapsed:.2f}s, "
+            f"{len(outputs) / max(elapsed, 1e-6):.0f} docs/s"
+        )
         return outputs
 
+    @staticmethod
+    def _bulk_batches(lines: list[bytes]):
+        """按字节数与文档数切分批次，产出文档下标列表"""
+        batch: list[int] = []
+        size = 0
+        for i, line in enumerate(lines):
+            if batch and (
+                size + len(line) > ES_BULK_MAX_BYTES or len(batch) >= ES_BULK_MAX_DOCS
+            ):
+                yield batch
+                batch, size = [], 0
+            batch.append(i)
+            size += len(line)
+        if batch:
+            yield batch
+
+    async def _bulk(
+        self,
+        lines: list[bytes],
+        pending: list[int],
+        outputs: list[Optional[str]],
+        semaphore: asyncio.Semaphore,
+    ):
+        for attempt in range(ES_BULK_MAX_RETRIES + 1):
+            if attempt > 0:
+                await asyncio.sleep(ES_BULK_BACKOFF * 2 ** (attempt - 1))
+            async with semaphore:
+                try:
+                    rsp = await self._client.bulk(
+                        operations=b"".join(lines[i] for i in pending)
+                    )
+                except ApiError as e:
+                    if e.meta.status != 429:
+                        raise e
+                    self.logger.warning(f"bulk rejected, retry {attempt + 1}")
+                    continue
+            rejected = list()
+            for i, item in zip(pending, rsp["items"]):
+                result = item["index"]
+                if result.get("status") == 429:
+                    rejected.append(i)
+                elif "error" in result:
+                    raise Exception(f"bulk index failed: {result['error']}")
+                else:
+                    outputs[i] = result["_id"]
+            if not rejected:
+                return
+            self.logger.warning(
+                f"bulk {len(rejected)}/{len(pending)} docs rejected, "
+                f"retry {attempt + 1}"
+            )
+            pending = rejected
+        raise Exception(f"bulk index rejected after {ES_BULK_MAX_RETRIES} retries")
+
+    @asynccontextmanager
+    async def bulk_import(self, index_name: str):
+        """导入期间关闭 refresh_interval
+
+        同一索引的并发导入按引用计数，最后一个导入结束时恢复为索引配置中的
+        refresh_interval 并立即刷新，不依赖导入开始时读到的当前值。
+        """
+        paused = await self._pause_refresh(index_name)
+        try:
+            yield
+        finally:
+            if paused:
+                # 取消时也要恢复，避免索引一直停留在 -1
+                await asyncio.shield(self._restore_refresh(index_name))
+
+    async def _pause_refresh(self, index_name: str) -> bool:
+        async with self._paused_lock:
+            count = self._paused.get(index_name, 0)
+            if count == 0:
+                if not await self.index_exists(index_name):
+                    return False
+                await self._client.indices.put_settings(
+                    index=index_name, settings={"index": {"refresh_interval": "-1"}}
+                )
+            self._paused[index_name] = count + 1
+            return True
+
+    async def _restore_refresh(self, index_name: str):
+        async with self._paused_lock:
+            count = self._paused.pop(index_name) - 1
+            if count > 0:
+                self._paused[index_name] = count
+                return
+            interval = self._setting["setting"]["index"].get("refresh_interval")
+            await self._client.indices.put_settings(
+                index=index_name, settings={"index": {"refresh_interval": interval}}
+            )
+        await self._client.indices.refresh(index=index_name)
+
     async def search(
         self,
         index_name: Union[str, LenAbleVar[str]],
@@ -190,7 +414,42 @@ class ElasticSearch(VectorDatabase[AsyncElasticsearch]):
         query_vector_weight: float = 0.95,
         includes: Optional[list[str]] = None,
         excludes: Optional[list[str]] = None,
+        oversample: Optional[float] = None,
+        mode: Optional[str] = None,
     ) -> list[DocumentDict]:
+        """混合检索
+
+        ``mode`` 默认使用 ES_SEARCH_MODE，同时给出查询语句与向量时才会走 RRF。
+        RRF 模式下两路检索各自独立召回 ``ES_RRF_WINDOW`` 个候选再按排名融合，
+        ``query_vector_weight`` 不再生效。
+        """
+        filters = self._scope_filters(roles_id, worlds_id)
+        mode = mode or ES_SEARCH_MODE
+        if mode != "linear" and query_string and query_vector is not None:
+            window = max(ES_RRF_WINDOW, top_k)
+            lexical = {
+                "bool": {
+                    "must": self._query_string(query_string, query_string_fields),
+                    "filter": filters,
+                }
+            }
+            knn = self.knn_clause(
+                query_vector,
+                window,
+                oversample,
+                filter=filters,
+                similarity=vector_similarity,
+            )
+            if mode == "rrf":
+                return await self._rrf_search(
+                    index_name, lexical, knn, window, top_k, includes, excludes
+                )
+            if mode == "rrf_local":
+                return await self._rrf_local_search(
+                    index_name, lexical, knn, window, top_k, includes, excludes
+                )
+            raise ValueError(f"unknown search mode: {mode}")
+
         s = AsyncSearch(
             using=self._client, index=index_name, extra=dict(timeout="600s")
         )
@@ -198,47 +457,163 @@ class ElasticSearch(VectorDatabase[AsyncElasticsearch]):
             s = s.source(includes=includes)
         if excludes is not None:
             s = s.source(excludes=excludes)
+        s = s.extra(size=top_k)
 
         # # 过滤
         # s = s.filter("term", disabled=False)
-        if worlds_id:
-            s = (
-                s.filter("term", world_id=worlds_id)
-                if isinstance(worlds_id, int)
-                else s.filter("terms", world_id=worlds_id)
-            )
-        if roles_id:
-            # 查询 元数据里面的 id 字段
-            s = (
-                s.filter("term", role_id=roles_id)
-                if isinstance(roles_id, int)
-                else s.filter("terms", role_id=roles_id)
-            )
+        for it in filters:
+            s = s.filter(it)
         if query_string:
-            s = s.query(
-                "query_string",
-                query=query_string,
-                minimum_should_match="30%",
-                fields=list(query_string_fields),
-                type="best_fields",
-                boost=1,
-            )
+            s = s.query(self._query_string(query_string, query_string_fields))
         if query_vector is not None:
             s.query.boost = 1 - query_vector_weight
-            s = s.knn(
-                "vector",
-                top_k,
-                min(top_k * 2, MAX_CANDIDATES),
-                query_vector,
-                filter=s.query.to_dict(),
-                similarity=vector_similarity,
+            s = s.extra(
+                knn=self.knn_clause(
+                    query_vector,
+                    top_k,
+                    oversample,
+                    filter=s.query.to_dict(),
+                    similarity=vector_similarity,
+                )
             )
 
         rsp = await s.execute()
         # TODO 优化这个id的提取
         for hit in rsp.hits:
             hit["id"] = hit.meta.id
+            hit["score"] = hit.meta.score
         return recursive_to_dict(rsp.hits)
 
+    @staticmethod
+    def _scope_filters(
+        roles_id: Optional[Union[int, LenAbleVar[int]]],
+        worlds_id: Optional[Union[int, LenAbleVar[int]]],
+    ) -> list[dict[str, Any]]:
+        """角色与世界范围过滤（term 过滤不参与打分，可被缓存）"""
+        filters = list()
+        if worlds_id:
+            op = "term" if isinstance(worlds_id, int) else "terms"
+            filters.append({op: {"world_id": worlds_id}})
+        if roles_id:
+            op = "term" if isinstance(roles_id, int) else "terms"
+            filters.append({op: {"role_id": roles_id}})
+        return filters
+
+    @staticmethod
+    def _query_string(query_string: str, fields: LenAbleVar[str]) -> dict[str, Any]:
+        return {
+            "query_string": {
+                "query": query_string,
+                "minimum_should_match": "30%",
+                "fields": list(fields),
+                "type": "best_fields",
+                "boost": 1,
+            }
+        }
+
+    async def _rrf_search(
+        self,
+        index_name: Union[str, LenAbleVar[str]],
+        lexical: dict[str, Any],
+        knn: dict[str, Any],
+        window: int,
+        top_k: int,
+        includes: Optional[list[str]] = None,
+        excludes: Optional[list[str]] = None,
+    ) -> list[DocumentDict]:
+        """ES retriever 在服务端完成 RRF 融合"""
+        s = AsyncSearch(using=self._client, index=index_name)
+        if includes is not None:
+            s = s.source(includes=includes)
+        if excludes is not None:
+            s = s.source(excludes=excludes)
+        s = s.extra(
+            size=top_k,
+            retriever={
+                "rrf": {
+                    "retrievers": [{"standard": {"query": lexical}}, {"knn": knn}],
+                    "rank_window_size": window,
+                    "rank_constant": ES_RRF_RANK_CONSTANT,
+                }
+            },
+        )
+        rsp = await s.execute()
+        for hit in rsp.hits:
+            hit["id"] = hit.meta.id
+            hit["score"] = hit.meta.score
+        return recursive_to_dict(rsp.hits)
+
+    async def _rrf_local_search(
+        self,
+        index_name: Union[str, LenAbleVar[str]],
+        lexical: dict[str, Any],
+        knn: dict[str, Any],
+        window: int,
+        top_k: int,
+        includes: Optional[list[str]] = None,
+        excludes: Optional[list[str]] = None,
+    ) -> list[DocumentDict]:
+        """msearch 一次请求取回两路结果，在本地按 RRF 融合"""
+        source = dict()
+        if includes is not None:
+            source["includes"] = includes
+        if excludes is not None:
+            source["excludes"] = excludes
+        header = {"index": index_name}
+        rsp = await self._client.msearch(
+            searches=[
+                header,
+                {"query": lexical, "size": window, "_source": source or True},
+                header,
+                {"knn": knn, "size": window, "_source": source or True},
+            ]
+        )
+        scores: dict[str, float] = dict()
+        docs: dict[str, DocumentDict] = dict()
+        for result in rsp["responses"]:
+            if "error" in result:
+                raise Exception(f"search failed: {result['error']}")
+            for rank, hit in enumerate(result["hits"]["hits"], 1):
+                scores[hit["_id"]] = scores.get(hit["_id"], 0.0) + 1 / (
+                    ES_RRF_RANK_CONSTANT + rank
+                )
+                docs.setdefault(hit["_id"], hit.get("_source", {}))
+        order = sorted(scores, key=scores.__getitem__, reverse=True)[:top_k]
+        return [dict(docs[it], id=it, score=scores[it]) for it in order]
+
+    @staticmethod
+    def knn_clause(
+        query_vector: LenAbleVar[float],
+        top_k: int,
+        oversample: Optional[float] = None,
+        **kwargs,
+    ) -> dict[str, Any]:
+        """kNN 检索子句
+
+        过采样时候选数随之放大，并用原始浮点向量对前 ``top_k * oversample``
+        个结果重新打分，弥补量化带来的召回损失。
+
+        :param query_vector: 查询向量
+        :type query_vector: LenAbleVar[float]
+        :param top_k: 返回数量
+        :type top_k: int
+        :param oversample: 过采样倍数，默认使用 ES_KNN_OVERSAMPLE，不大于1时不重新打分
+        :type oversample: Optional[float], optional
+        :return: knn
+        :rtype: dict[str, Any]
+        """
+        if oversample is None:
+            oversample = ES_KNN_OVERSAMPLE
+        candidates = top_k * 2
+        knn = dict(field="vector", k=top_k, query_vector=query_vector, **kwargs)
+        if oversample > 1:
+            candidates = max(candidates, math.ceil(top_k * oversample))
+            knn["rescore_vector"] = {"oversample": oversample}
+        knn["num_candidates"] = min(candidates, MAX_CANDIDATES)
+        return knn
+
+    async def ping(self) -> bool:
+        return await self._client.ping()
+
     async def close(self):
         await self._client.close()
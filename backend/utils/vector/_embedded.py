@@ -0,0 +1,701 @@
+import asyncio
+import fcntl
+import math
+import os
+import shutil
+import threading
+import uuid
+from collections import defaultdict
+from typing import Any, Callable, Iterable, Optional, Union
+
+import numpy as np
+import orjson
+
+from ...schemas.components import DocumentDict
+from ...schemas.profile import ProfileProvider
+from ..common import get_root_dir, get_unix_timestamp
+from ._base import DEFAULT_QUERY_FIELDS, LenAbleVar, VectorDatabase, query_terms
+
+EMBEDDED_VDB_DIR = os.getenv("EMBEDDED_VDB_DIR", get_root_dir("data/vector"))
+# 向量存储精度：float32 或 float16
+EMBEDDED_VDB_DTYPE = np.dtype(os.getenv("EMBEDDED_VDB_DTYPE", "float32"))
+assert EMBEDDED_VDB_DTYPE in (np.float32, np.float16), "EMBEDDED_VDB_DTYPE error"
+
+BM25_K1 = 1.2
+BM25_B = 0.75
+# 已删除的行超过该比例时压缩分区
+COMPACT_RATIO = 0.5
+INITIAL_CAPACITY = 64
+
+DOCUMENT_FIELDS = (
+    "role_id",
+    "world_id",
+    "doc_id",
+    "content",
+    "content_ltks",
+    "content_sm_ltks",
+    "create_at",
+    "update_at",
+    "delete_at",
+)
+
+PartitionKey = tuple[Optional[int], Optional[int]]
+
+
+class _Partition:
+    """同一 (role_id, world_id) 的分块
+
+    向量归一化后存放在内存映射文件中，元数据以 JSON Lines 日志追加写入：
+    每行一个文档（行号即向量行号），删除记为 ``{"delete": [行号]}``，
+    只在删除比例过高或关闭时压缩重写。压缩把存活行写入下一代文件，落盘后
+    原子替换 CURRENT 指向新一代，中途失败时仍使用原文件。内存中维护 id 到
+    行号的映射与 content_ltks 的 BM25 倒排索引。
+    """
+
+    def __init__(self, path: str, dims: int, dtype: np.dtype):
+        self.path = path
+        self.dims = dims
+        self.dtype = dtype
+        self.docs: list[dict[str, Any]] = list()
+        self.alive = np.zeros(0, dtype=bool)
+        self.vectors: Optional[np.memmap] = None
+        # 存活文档的 id -> 行号
+        self.ids: dict[str, int] = dict()
+        # 当前使用的文件代数，记录在 CURRENT 中
+        self.generation = 0
+        self._postings: defaultdict[str, dict[int, int]] = defaultdict(dict)
+        self._lengths = np.zeros(0, dtype=np.float32)
+        os.makedirs(path, exist_ok=True)
+        self._load()
+
+    @property
+    def size(self) -> int:
+        return len(self.docs)
+
+    @property
+    def live_count(self) -> int:
+        return int(self.alive[: self.size].sum())
+
+    @property
+    def _vectors_file(self) -> str:
+        return os.path.join(self.path, f"vectors.{self.generation}.bin")
+
+    @property
+    def _log_file(self) -> str:
+        return os.path.join(self.path, f"docs.{self.generation}.jsonl")
+
+    def append(self, docs: list[dict[str, Any]], vectors: np.ndarray):
+        start = self.size
+        self._reserve(start + len(docs))
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        norms[norms == 0] = 1
+        self.vectors[start : start + len(docs)] = vectors / norms
+        self.vectors.flush()
+        # 向量落盘后再追加元数据，日志中的文档总有对应的向量
+        self._write(docs)
+        self.docs.extend(docs)
+        self.alive[start : start + len(docs)] = True
+        for row, doc in enumerate(docs, start):
+            self.ids[doc["id"]] = row
+            self._index(row, doc.get("content_ltks", ""))
+
+    def delete(self, predicate: Callable[[dict[str, Any]], bool]) -> int:
+        rows = [
+            row
+            for row, doc in enumerate(self.docs)
+            if self.alive[row] and predicate(doc)
+        ]
+        return self._delete_rows(rows)
+
+    def delete_ids(self, ids: Iterable[str]) -> int:
+        """按文档ID删除，只查找映射表，不扫描全部文档"""
+        return self._delete_rows([self.ids[it] for it in ids if it in self.ids])
+
+    def close(self):
+        """存在已删除的行时压缩，重写后的日志只包含存活文档"""
+        if self.live_count < self.size:
+            self._compact()
+
+    def rows(self) -> np.ndarray:
+        return np.flatnonzero(self.alive[: self.size])
+
+    def vector_scores(self, query: np.ndarray) -> np.ndarray:
+        """全部行的余弦相似度（已删除的行为 -inf）"""
+        scores = np.full(self.size, -np.inf, dtype=np.float32)
+        rows = self.rows()
+        if len(rows):
+            scores[rows] = self.vectors[rows].astype(np.float32) @ query
+        return scores
+
+    def bm25_scores(self, terms: list[str]) -> np.ndarray:
+        scores = np.zeros(self.size, dtype=np.float32)
+        live = self.live_count
+        if not live or not terms:
+            return scores
+        avg_length = float(self._lengths[: self.size][self.alive[: self.size]].mean())
+        avg_length = avg_length or 1.0
+        for term in terms:
+            postings = self._postings.get(term)
+            if not postings:
+                continue
+            idf = math.log(1 + (live - len(postings) + 0.5) / (len(postings) + 0.5))
+            rows = np.fromiter(postings.keys(), dtype=np.int64, count=len(postings))
+            tf = np.fromiter(postings.values(), dtype=np.float32, count=len(postings))
+            norm = BM25_K1 * (1 - BM25_B + BM25_B * self._lengths[rows] / avg_length)
+            scores[rows] += idf * tf * (BM25_K1 + 1) / (tf + norm)
+        return scores
+
+    def vector(self, row: int) -> list[float]:
+        return self.vectors[row].astype(np.float32).tolist()
+
+    def _index(self, row: int, content_ltks: str):
+        tokens = content_ltks.split()
+        self._lengths[row] = len(tokens)
+        for token in tokens:
+            self._postings[token][row] = self._postings[token].get(row, 0) + 1
+
+    def _reserve(self, size: int):
+        capacity = 0 if self.vectors is None else self.vectors.shape[0]
+        if size <= capacity:
+            return
+        capacity = _capacity(size, capacity)
+        with open(self._vectors_file, "ab") as f:
+            f.truncate(capacity * self.dims * self.dtype.itemsize)
+        self.vectors = np.memmap(
+            self._vectors_file, dtype=self.dtype, mode="r+", shape=(capacity, self.dims)
+        )
+        self.alive = np.concatenate(
+            [self.alive, np.zeros(capacity - len(self.alive), dtype=bool)]
+        )
+        self._lengths = np.concatenate(
+            [self._lengths, np.zeros(capacity - len(self._lengths), dtype=np.float32)]
+        )
+
+    def _delete_rows(self, rows: list[int]) -> int:
+        if not rows:
+            return 0
+        self.alive[rows] = False
+        for row in rows:
+            doc = self.docs[row]
+            self.ids.pop(doc["id"], None)
+            for term in set(doc.get("content_ltks", "").split()):
+                self._postings[term].pop(row, None)
+        if self.size - self.live_count > self.size * COMPACT_RATIO:
+            self._compact()
+        else:
+            self._write([{"delete": rows}])
+        return len(rows)
+
+    def _compact(self):
+        rows = self.rows()
+        generation = self.generation + 1
+        vectors_file = os.path.join(self.path, f"vectors.{generation}.bin")
+        log_file = os.path.join(self.path, f"docs.{generation}.jsonl")
+        capacity = _capacity(len(rows))
+        # 先完整写入并落盘下一代文件，再切换 CURRENT，当前文件在切换前保持不变
+        with open(vectors_file, "wb") as f:
+            if len(rows):
+                # 已归一化，原样写入
+                f.write(np.ascontiguousarray(self.vectors[rows]).tobytes())
+            f.truncate(capacity * self.dims * self.dtype.itemsize)
+            f.flush()
+            os.fsync(f.fileno())
+        with open(log_file, "wb") as f:
+            f.write(b"".join(orjson.dumps(self.docs[row]) + b"\n" for row in rows))
+            f.flush()
+            os.fsync(f.fileno())
+        _atomic_write(os.path.join(self.path, "CURRENT"), str(generation).encode())
+
+        self.vectors = None
+        self.docs = list()
+        self.ids.clear()
+        self.alive = np.zeros(0, dtype=bool)
+        self._lengths = np.zeros(0, dtype=np.float32)
+        self._postings.clear()
+        self._load()
+
+    def _load(self):
+        current = os.path.join(self.path, "CURRENT")
+        if os.path.exists(current):
+            with open(current, "rb") as f:
+                self.generation = int(f.read())
+        # 清理旧代文件与压缩中断留下的文件
+        for name in os.listdir(self.path):
+            if name.startswith(("vectors.", "docs.")) and name not in (
+                os.path.basename(self._vectors_file),
+                os.path.basename(self._log_file),
+            ):
+                os.remove(os.path.join(self.path, name))
+        if not os.path.exists(self._log_file):
+            return
+        docs: list[dict[str, Any]] = list()
+        deleted: list[int] = list()
+        with open(self._log_file, "rb") as f:
+            end = 0
+            for line in f:
+                try:
+                    record = orjson.loads(line)
+                except orjson.JSONDecodeError:
+                    break
+                end += len(line)
+                if "delete" in record:
+                    deleted.extend(record["delete"])
+                else:
+                    docs.append(record)
+        if end < os.path.getsize(self._log_file):
+            # 丢弃写入中断留下的不完整行，之后的追加从完整行之后开始
+            os.truncate(self._log_file, end)
+        self._reserve(len(docs))
+        self.docs = docs
+        self.alive[: len(docs)] = True
+        self.alive[deleted] = False
+        for row, doc in enumerate(docs):
+            if self.alive[row]:
+                self.ids[doc["id"]] = row
+                self._index(row, doc.get("content_ltks", ""))
+
+    def _write(self, records: list[Any]):
+        """追加写入日志，每条记录一行"""
+        with open(self._log_file, "ab") as f:
+            f.write(b"".join(orjson.dumps(it) + b"\n" for it in records))
+
+
+class _Index:
+    """一个索引：按 (role_id, world_id) 划分的分区集合"""
+
+    def __init__(self, path: str, dims: int, dtype: np.dtype):
+        self.path = path
+        self.dims = dims
+        self.dtype = dtype
+        self.lock = threading.Lock()
+        self.partitions: dict[PartitionKey, _Partition] = dict()
+        for name in sorted(os.listdir(path)):
+            key = _parse_partition_name(name)
+            if key is not None:
+                self.partitions[key] = _Partition(
+                    os.path.join(path, name), dims, dtype
+                )
+
+    def partition(self, key: PartitionKey) -> _Partition:
+        if key not in self.partitions:
+            self.partitions[key] = _Partition(
+                os.path.join(self.path, _partition_name(key)), self.dims, self.dtype
+            )
+        return self.partitions[key]
+
+    def select(
+        self,
+        roles_id: Optional[Union[int, LenAbleVar[int]]],
+        worlds_id: Optional[Union[int, LenAbleVar[int]]],
+    ) -> list[_Partition]:
+        roles = _as_set(roles_id)
+        worlds = _as_set(worlds_id)
+        return [
+            partition
+            for (role_id, world_id), partition in self.partitions.items()
+            if (roles is None or role_id in roles)
+            and (worlds is None or world_id in worlds)
+        ]
+
+
+class EmbeddedStore:
+    """进程内的索引注册表，同一目录只加载一次
+
+    各进程在内存中各自维护分区状态，同一目录只允许一个进程打开：
+    初始化时对目录加排他锁，已被其他进程持有时直接报错。
+    """
+
+    def __init__(self, root: str, dtype: np.dtype):
+        self.root = root
+        self.dtype = dtype
+        self.lock = threading.Lock()
+        self.indexes: dict[str, _Index] = dict()
+        os.makedirs(root, exist_ok=True)
+        # 锁随进程退出释放
+        self._lock_file = open(os.path.join(root, ".lock"), "wb")
+        try:
+            fcntl.flock(self._lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            self._lock_file.close()
+            raise RuntimeError(
+                f"embedded vector database {root} is opened by another process, "
+                "use a single worker or ElasticSearch/PGVector"
+            )
+
+    def get(self, index_name: str) -> Optional[_Index]:
+        with self.lock:
+            if index_name not in self.indexes:
+                path = os.path.join(self.root, index_name)
+                meta_file = os.path.join(path, "index.json")
+                if not os.path.exists(meta_file):
+                    return None
+                with open(meta_file, "rb") as f:
+                    meta = orjson.loads(f.read())
+                self.indexes[index_name] = _Index(
+                    path, meta["dims"], np.dtype(meta["dtype"])
+                )
+            return self.indexes[index_name]
+
+    def create(self, index_name: str, dims: int) -> bool:
+        if self.get(index_name) is not None:
+            return False
+        with self.lock:
+            path = os.path.join(self.root, index_name)
+            os.makedirs(path, exist_ok=True)
+            with open(os.path.join(path, "index.json"), "wb") as f:
+                f.write(orjson.dumps({"dims": dims, "dtype": self.dtype.name}))
+            self.indexes[index_name] = _Index(path, dims, self.dtype)
+        return True
+
+    def delete(self, index_name: str) -> bool:
+        index = self.get(index_name)
+        if index is None:
+            return False
+        with self.lock, index.lock:
+            self.indexes.pop(index_name, None)
+            for partition in index.partitions.values():
+                partition.vectors = None
+            shutil.rmtree(index.path)
+        return True
+
+    def close(self):
+        """压缩已加载索引中删除过文档的分区"""
+        with self.lock:
+            indexes = list(self.indexes.values())
+        for index in indexes:
+            with index.lock:
+                for partition in index.partitions.values():
+                    partition.close()
+
+    def list(self) -> list[str]:
+        return [
+            name
+            for name in os.listdir(self.root)
+            if os.path.exists(os.path.join(self.root, name, "index.json"))
+        ]
+
+
+_stores: dict[str, EmbeddedStore] = dict()
+_stores_lock = threading.Lock()
+
+
+def get_embedded_store(
+    root: str = EMBEDDED_VDB_DIR, dtype: np.dtype = EMBEDDED_VDB_DTYPE
+) -> EmbeddedStore:
+    with _stores_lock:
+        if root not in _stores:
+            _stores[root] = EmbeddedStore(root, dtype)
+        return _stores[root]
+
+
+class EmbeddedVectorDatabase(VectorDatabase[EmbeddedStore]):
+    """进程内向量库
+
+    适合单机部署与压测：向量按 (role_id, world_id) 分区存放在内存映射文件中，
+    检索时只对过滤后的分区做向量化的余弦相似度计算，并与 BM25 得分加权。
+    同一数据目录只能由一个进程打开，多进程部署请使用 ElasticSearch 或 PGVector。
+    """
+
+    # 元数据
+    type = ProfileProvider.Embedded
+
+    def _get_client(self):
+        return get_embedded_store(self._config.extra.get("path", EMBEDDED_VDB_DIR))
+
+    async def close(self):
+        await asyncio.to_thread(self._client.close)
+
+    async def index_create(self, index_name: str, vector_dims: int) -> bool:
+        created = await asyncio.to_thread(self._client.create, index_name, vector_dims)
+        if created:
+            self.logger.info(f"op create, index {index_name} created")
+        else:
+            self.logger.warning(f"op create, index {index_name} already exists")
+        return created
+
+    async def index_delete(self, index_name: str) -> bool:
+        deleted = await asyncio.to_thread(self._client.delete, index_name)
+        if deleted:
+            self.logger.info(f"op delete, index {index_name} deleted")
+        else:
+            self.logger.warning(f"op delete, index {index_name} not exists")
+        return deleted
+
+    async def index_exists(self, index_name: str) -> bool:
+        return await asyncio.to_thread(self._client.get, index_name) is not None
+
+    async def index_list(self) -> list[str]:
+        return await asyncio.to_thread(self._client.list)
+
+    async def doc_list(
+        self, index_name: str, kb_id: Optional[int] = None, doc_id: Optional[int] = None
+    ) -> list[str]:
+        if kb_id is not None:
+            raise ValueError("embedded vector database does not support kb_id")
+        docs = await self.doc_get(index_name, doc_id, includes=[])
+        return [doc["id"] for doc in docs]
+
+    async def doc_delete(
+        self,
+        index_name: str,
+        kbs_id: Optional[Union[int, LenAbleVar[int]]] = None,
+        docs_id: Optional[Union[int, LenAbleVar[int]]] = None,
+    ):
+        if kbs_id is not None:
+            raise ValueError("embedded vector database does not support kbs_id")
+        docs = _as_set(docs_id)
+
+        def delete() -> int:
+            index = self._client.get(index_name)
+            if index is None:
+                return 0
+            with index.lock:
+                return sum(
+                    partition.delete(
+                        lambda doc: docs is None or doc.get("doc_id") in docs
+                    )
+                    for partition in index.partitions.values()
+                )
+
+        count = await asyncio.to_thread(delete)
+        self.logger.info(f"index:{index_name} delete {count} docs")
+
+    async def doc_count(
+        self,
+        index_name: str,
+        doc_id: Optional[Union[int, LenAbleVar[int]]],
+        **kwargs,
+    ) -> int:
+        return len(await self.doc_get(index_name, doc_id, includes=[], **kwargs))
+
+    async def doc_get(
+        self,
+        index_name: str,
+        doc_id: Optional[Union[int, LenAbleVar[int]]] = None,
+        includes: Optional[list[str]] = None,
+        excludes: Optional[list[str]] = None,
+        page: int = 1,
+        limit: int = 0,
+        **kwargs,
+    ) -> list[dict[str, Any]]:
+        conditions = {k: _as_set(v) for k, v in dict(doc_id=doc_id, **kwargs).items()}
+        fields = _fields(includes, excludes)
+
+        def get() -> list[dict[str, Any]]:
+            index = self._client.get(index_name)
+            if index is None:
+                return list()
+            outputs = list()
+            with index.lock:
+                for partition in index.partitions.values():
+                    for row in partition.rows():
+                        doc = partition.docs[row]
+                        if all(
+                            values is None or doc.get(k) in values
+                            for k, values in conditions.items()
+                        ):
+                            outputs.append(_to_dict(partition, row, fields))
+            return outputs
+
+        outputs = await asyncio.to_thread(get)
+        if limit > 0 and page > 0:
+            outputs = outputs[limit * (page - 1) : limit * page]
+        return outputs
+
+    async def doc_insert(self, index_name: str, doc: DocumentDict) -> str:
+        return (await self.doc_batch_insert(index_name, [doc]))[0]
+
+    async def doc_batch_insert(
+        self,
+        index_name: str,
+        docs: list[DocumentDict],
+        ids: Optional[list[str]] = None,
+    ) -> list[str]:
+        if not docs:
+            return list()
+        vectors = np.asarray([doc["vector"] for doc in docs], dtype=np.float32)
+        timestamp = get_unix_timestamp()
+        groups: defaultdict[PartitionKey, list[int]] = defaultdict(list)
+        for i, doc in enumerate(docs):
+            groups[(doc.get("role_id"), doc.get("world_id"))].append(i)
+        replace = None if ids is None else set(ids)
+        if ids is None:
+            ids = [uuid.uuid4().hex for _ in docs]
+
+        def insert():
+            index = self._client.get(index_name)
+            if index is None:
+                # 与 ES 一致，写入时自动创建索引
+                self._client.create(index_name, vectors.shape[1])
+                index = self._client.get(index_name)
+            if vectors.shape[1] != index.dims:
+                raise ValueError(
+                    f"index {index_name} dims is {index.dims}, got {vectors.shape[1]}"
+                )
+            with index.lock:
+                if replace is not None:
+                    # 覆盖同ID的文档
+                    for partition in index.partitions.values():
+                        partition.delete_ids(replace)
+                for key, rows in groups.items():
+                    metas = list()
+                    for i in rows:
+                        meta = {k: docs[i].get(k) for k in DOCUMENT_FIELDS}
+                        meta["id"] = ids[i]
+                        meta["create_at"] = meta["create_at"] or timestamp
+                        meta["update_at"] = meta["update_at"] or timestamp
+                        metas.append(meta)
+                    index.partition(key).append(metas, vectors[rows])
+
+        await asyncio.to_thread(insert)
+        self.logger.info(f"index:{index_name} create {len(ids)} docs success")
+        return ids
+
+    async def search(
+        self,
+        index_name: Union[str, LenAbleVar[str]],
+        roles_id: Optional[Union[int, LenAbleVar[int]]] = None,
+        worlds_id: Optional[Union[int, LenAbleVar[int]]] = None,
+        query_string: Optional[str] = None,
+        query_string_fields: LenAbleVar[str] = DEFAULT_QUERY_FIELDS,
+        query_vector: Optional[LenAbleVar[float]] = None,
+        top_k: int = 1024,
+        vector_similarity: float = 0.1,
+        query_vector_weight: float = 0.95,
+        includes: Optional[list[str]] = None,
+        excludes: Optional[list[str]] = None,
+    ) -> list[DocumentDict]:
+        """混合检索
+
+        得分为 ``query_vector_weight * 余弦相似度 + (1 - query_vector_weight) *
+        归一化 BM25``，只提供其中一种查询时直接使用该路得分。
+        BM25 只基于 content_ltks，``query_string_fields`` 仅为接口兼容。
+        """
+        names = [index_name] if isinstance(index_name, str) else list(index_name)
+        terms = query_terms(query_string) if query_string else []
+        query = None
+        if query_vector is not None:
+            query = np.asarray(query_vector, dtype=np.float32)
+            query /= np.linalg.norm(query) or 1.0
+        if query is not None and terms:
+            weight = query_vector_weight
+        else:
+            weight = 1.0 if query is not None else 0.0
+        fields = _fields(includes, excludes)
+
+        def search() -> list[dict[str, Any]]:
+            # (分区, 行号, 向量得分, BM25 得分)
+            candidates: list[tuple[_Partition, np.ndarray, np.ndarray, np.ndarray]]
+            candidates = list()
+            for name in names:
+                index = self._client.get(name)
+                if index is None:
+                    continue
+                with index.lock:
+                    for partition in index.select(roles_id or None, worlds_id or None):
+                        rows = partition.rows()
+                        if not len(rows):
+                            continue
+                        bm25 = partition.bm25_scores(terms)[rows]
+                        if query is not None:
+                            vector = partition.vector_scores(query)[rows]
+                            keep = (vector >= vector_similarity) | (bm25 > 0)
+                        else:
+                            vector = np.zeros(len(rows), dtype=np.float32)
+                            keep = bm25 > 0 if terms else np.ones(len(rows), bool)
+                        candidates.append(
+                            (partition, rows[keep], vector[keep], bm25[keep])
+                        )
+            if not candidates:
+                return list()
+
+            max_bm25 = max((c[3].max() for c in candidates if len(c[3])), default=0)
+            scores = np.concatenate(
+                [
+                    weight * vector + (1 - weight) * bm25 / (max_bm25 or 1.0)
+                    for _, _, vector, bm25 in candidates
+                ]
+            )
+            owners = [
+                (partition, row)
+                for partition, rows, _, _ in candidates
+                for row in rows.tolist()
+            ]
+            k = min(top_k, len(scores))
+            if k == 0:
+                return list()
+            top = np.argpartition(-scores, k - 1)[:k]
+            top = top[np.argsort(-scores[top], kind="stable")]
+            outputs = list()
+            for i in top.tolist():
+                partition, row = owners[i]
+                doc = _to_dict(partition, row, fields)
+                doc["score"] = float(scores[i])
+                outputs.append(doc)
+            return outputs
+
+        return await asyncio.to_thread(search)
+
+
+def _capacity(size: int, capacity: int = 0) -> int:
+    """容纳 size 行所需的容量，从 INITIAL_CAPACITY 起按 2 倍增长"""
+    capacity = max(INITIAL_CAPACITY, capacity)
+    while capacity < size:
+        capacity *= 2
+    return capacity
+
+
+def _atomic_write(file: str, data: bytes):
+    """写入临时文件并落盘后替换，再同步目录使替换本身落盘"""
+    with open(file + ".tmp", "wb") as f:
+        f.write(data)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(file + ".tmp", file)
+    fd = os.open(os.path.dirname(file), os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+def _partition_name(key: PartitionKey) -> str:
+    role_id, world_id = key
+    role = "" if role_id is None else role_id
+    world = "" if world_id is None else world_id
+    return f"r{role}_w{world}"
+
+
+def _parse_partition_name(name: str) -> Optional[PartitionKey]:
+    if not name.startswith("r") or "_w" not in name:
+        return None
+    role, world = name[1:].split("_w", maxsplit=1)
+    try:
+        return (int(role) if role else None, int(world) if world else None)
+    except ValueError:
+        return None
+
+
+def _as_set(value) -> Optional[set]:
+    if value is None:
+        return None
+    if isinstance(value, (list, tuple, set)):
+        return set(value)
+    return {value}
+
+
+def _fields(includes: Optional[list[str]], excludes: Optional[list[str]]) -> list[str]:
+    fields = list(DOCUMENT_FIELDS) + ["vector"]
+    if includes is not None:
+        fields = [it for it in fields if it in includes]
+    if excludes is not None:
+        fields = [it for it in fields if it not in excludes]
+    return fields
+
+
+def _to_dict(partition: _Partition, row: int, fields: list[str]) -> dict[str, Any]:
+    meta = partition.docs[row]
+    doc = dict(id=meta["id"])
+    for field in fields:
+        doc[field] = partition.vector(row) if field == "vector" else meta.get(field)
+    return doc
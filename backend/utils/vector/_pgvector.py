@@ -0,0 +1,429 @@
+import os
+from typing import Any, Optional, Union
+
+from sqlalchemy import (
+    Delete,
+    Float,
+    cast,
+    distinct,
+    func,
+    literal,
+    or_,
+    select,
+    text,
+    union_all,
+)
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+
+from ...models.character import DocumentChunk
+from ...schemas.components import DocumentDict
+from ...schemas.profile import ProfileProvider
+from ..common import get_unix_timestamp
+from ._base import DEFAULT_QUERY_FIELDS, LenAbleVar, VectorDatabase, query_terms
+
+# HNSW 检索时的候选队列长度下限，实际取值不小于 top_k 的两倍
+PGVECTOR_EF_SEARCH = int(os.getenv("PGVECTOR_EF_SEARCH", "100"))
+# 不支持迭代扫描（pgvector < 0.8）时，范围内分块数不超过该值则改用精确检索
+PGVECTOR_EXACT_SCAN_LIMIT = int(os.getenv("PGVECTOR_EXACT_SCAN_LIMIT", "20000"))
+# hnsw.iterative_scan 需要的最低 pgvector 版本
+PGVECTOR_ITERATIVE_SCAN_VERSION = (0, 8)
+PGVECTOR_BATCH_SIZE = 256
+# ts_rank_cd 归一化方式 32：rank / (rank + 1)，得分落在 [0, 1)
+RANK_NORMALIZATION = 32
+
+# 全文检索字段对应的 tsvector 列
+TSVECTOR_COLUMNS = {
+    "content_ltks": DocumentChunk.content_ltks_tsvector,
+    "content_sm_ltks": DocumentChunk.content_sm_ltks_tsvector,
+}
+# 可以返回的文档字段
+DOCUMENT_FIELDS = (
+    "role_id",
+    "world_id",
+    "doc_id",
+    "content",
+    "content_ltks",
+    "content_sm_ltks",
+    "create_at",
+    "update_at",
+    "delete_at",
+)
+
+
+def to_tsquery(query_string: str) -> Optional[str]:
+    """将 ``FullTextQueryer.question`` 生成的 query_string 转为 tsquery
+
+    tsvector 只保存分词结果，权重与短语距离无法表达，这里取出全部词项以 OR 连接，
+    相关度交给 ts_rank_cd 计算。
+    """
+    return " | ".join(query_terms(query_string)) or None
+
+
+class PGVector(VectorDatabase[async_sessionmaker[AsyncSession]]):
+    """PGVector vector database
+
+    分块存储在 ``document_chunk`` 表，索引名称对应 ``index`` 列。
+    向量使用 HNSW 索引，分词结果使用 tsvector + GIN 索引，
+    与业务数据共用同一个异步引擎与连接池。
+    """
+
+    # 元数据
+    type = ProfileProvider.PGVector
+    # 是否支持 HNSW 迭代扫描，首次向量检索时探测
+    _iterative_scan: Optional[bool] = None
+
+    def _get_client(self):
+        from ...dependencies import database
+
+        assert database.session_factory is not None, "database is not initialized"
+        return database.session_factory
+
+    async def ping(self) -> bool:
+        async with self._client() as session:
+            await session.execute(text("SELECT 1"))
+        return True
+
+    async def index_create(self, index_name: str, vector_dims: int) -> bool:
+        dims = DocumentChunk.embedding.type.dim
+        if vector_dims != dims:
+            raise ValueError(f"pgvector embedding dims is {dims}, got {vector_dims}")
+        if await self.index_exists(index_name):
+            self.logger.warning(f"op create, index {index_name} already exists")
+            return False
+        # 表与索引由数据库迁移创建，索引名称仅用于区分数据
+        self.logger.info(f"op create, index {index_name} created")
+        return True
+
+    async def index_delete(self, index_name: str) -> bool:
+        if not await self.index_exists(index_name):
+            self.logger.warning(f"op delete, index {index_name} not exists")
+            return False
+        async with self._client() as session, session.begin():
+            await session.execute(
+                Delete(DocumentChunk).where(DocumentChunk.index == index_name)
+            )
+        self.logger.info(f"op delete, index {index_name} deleted")
+        return True
+
+    async def index_exists(self, index_name: str) -> bool:
+        async with self._client() as session:
+            row = await session.scalar(
+                select(DocumentChunk.id)
+                .where(DocumentChunk.index == index_name)
+                .limit(1)
+            )
+        return row is not None
+
+    async def index_list(self) -> list[str]:
+        async with self._client() as session:
+            return list(await session.scalars(select(distinct(DocumentChunk.index))))
+
+    async def doc_list(
+        self, index_name: str, kb_id: Optional[int] = None, doc_id: Optional[int] = None
+    ) -> list[str]:
+        if kb_id is not None:
+            raise ValueError("pgvector does not support kb_id")
+        stmt = select(DocumentChunk.id).where(DocumentChunk.index == index_name)
+        if doc_id is not None:
+            stmt = stmt.where(DocumentChunk.doc_id == doc_id)
+        async with self._client() as session:
+            return [str(it) for it in await session.scalars(stmt)]
+
+    async def doc_delete(
+        self,
+        index_name: str,
+        kbs_id: Optional[Union[int, LenAbleVar[int]]] = None,
+        docs_id: Optional[Union[int, LenAbleVar[int]]] = None,
+    ):
+        if kbs_id is not None:
+            raise ValueError("pgvector does not support kbs_id")
+        stmt = Delete(DocumentChunk).where(DocumentChunk.index == index_name)
+        if docs_id is not None:
+            stmt = stmt.where(_match(DocumentChunk.doc_id, docs_id))
+        async with self._client() as session, session.begin():
+            await session.execute(stmt)
+
+    async def doc_count(
+        self,
+        index_name: str,
+        doc_id: Optional[Union[int, LenAbleVar[int]]],
+        **kwargs,
+    ) -> int:
+        stmt = select(func.count(DocumentChunk.id)).where(
+            DocumentChunk.index == index_name, *self._filters(doc_id=doc_id, **kwargs)
+        )
+        async with self._client() as session:
+            return await session.scalar(stmt)
+
+    async def doc_get(
+        self,
+        index_name: str,
+        doc_id: Optional[Union[int, LenAbleVar[int]]] = None,
+        includes: Optional[list[str]] = None,
+        excludes: Optional[list[str]] = None,
+        page: int = 1,
+        limit: int = 0,
+        **kwargs,
+    ) -> list[dict[str, Any]]:
+        fields = self._fields(includes, excludes)
+        stmt = (
+            select(DocumentChunk.id, *(getattr(DocumentChunk, it) for it in fields))
+            .where(
+                DocumentChunk.index == index_name,
+                *self._filters(doc_id=doc_id, **kwargs),
+            )
+            .order_by(DocumentChunk.id)
+        )
+        if limit > 0 and page > 0:
+            stmt = stmt.offset(limit * (page - 1)).limit(limit)
+        async with self._client() as session:
+            rows = (await session.execute(stmt)).all()
+        return [self._to_dict(row, fields) for row in rows]
+
+    async def doc_insert(self, index_name: str, doc: DocumentDict) -> str:
+        return (await self.doc_batch_insert(index_name, [doc]))[0]
+
+    async def doc_batch_insert(
+        self,
+        index_name: str,
+        docs: list[DocumentDict],
+        ids: Optional[list[str]] = None,
+    ) -> list[str]:
+        if not docs:
+            return list()
+        timestamp = get_unix_timestamp()
+        rows = [
+            dict(
+                index=index_name,
+                chunk_key=None if ids is None else ids[i],
+                role_id=doc.get("role_id"),
+                world_id=doc.get("world_id"),
+                doc_id=doc.get("doc_id"),
+                content=doc["content"],
+                content_ltks=doc.get("content_ltks", ""),
+                content_sm_ltks=doc.get("content_sm_ltks", ""),
+                embedding=doc["vector"],
+                create_at=doc.get("create_at", timestamp),
+                update_at=doc.get("update_at", timestamp),
+                delete_at=doc.get("delete_at"),
+            )
+            for i, doc in enumerate(docs)
+        ]
+        stmt = pg_insert(DocumentChunk)
+        if ids is not None:
+            # 同一分块重复写入时覆盖
+            stmt = stmt.on_conflict_do_update(
+                index_elements=[DocumentChunk.chunk_key],
+                set_={k: stmt.excluded[k] for k in rows[0] if k != "chunk_key"},
+            )
+        stmt = stmt.returning(DocumentChunk.id)
+        outputs = list()
+        async with self._client() as session, session.begin():
+            for i in range(0, len(rows), PGVECTOR_BATCH_SIZE):
+                rsp = await session.scalars(stmt, rows[i : i + PGVECTOR_BATCH_SIZE])
+                outputs.extend(str(it) for it in rsp)
+        self.logger.info(f"index:{index_name} create {len(outputs)} docs success")
+        return outputs
+
+    async def search(
+        self,
+        index_name: Union[str, LenAbleVar[str]],
+        roles_id: Optional[Union[int, LenAbleVar[int]]] = None,
+        worlds_id: Optional[Union[int, LenAbleVar[int]]] = None,
+        query_string: Optional[str] = None,
+        query_string_fields: LenAbleVar[str] = DEFAULT_QUERY_FIELDS,
+        query_vector: Optional[LenAbleVar[float]] = None,
+        top_k: int = 1024,
+        vector_similarity: float = 0.1,
+        query_vector_weight: float = 0.95,
+        includes: Optional[list[str]] = None,
+        excludes: Optional[list[str]] = None,
+    ) -> list[DocumentDict]:
+        """混合检索
+
+        向量召回（HNSW）与全文召回（GIN）各取 top_k 个候选，合并后按
+        ``query_vector_weight * 向量相似度 + (1 - query_vector_weight) * 全文得分``
+        排序。只提供其中一种查询时，直接使用该路得分。
+
+        HNSW 先取 ef_search 个近邻再应用角色/世界过滤，范围较小时召回远少于 top_k。
+        pgvector >= 0.8 开启迭代扫描，过滤后不足时继续扫描索引；低版本在范围内
+        分块数不超过 ``PGVECTOR_EXACT_SCAN_LIMIT`` 时改为精确检索。
+        """
+        M = DocumentChunk
+        filters = [_match(M.index, index_name)]
+        filters.extend(
+            self._filters(role_id=roles_id or None, world_id=worlds_id or None)
+        )
+        fields = self._fields(includes, excludes)
+        columns = [M.id, *(getattr(M, it) for it in fields)]
+
+        tsquery = to_tsquery(query_string) if query_string else None
+        text_columns = [
+            (TSVECTOR_COLUMNS[name], boost)
+            for name, boost in map(_parse_field, query_string_fields)
+            if name in TSVECTOR_COLUMNS
+        ]
+        if not text_columns:
+            tsquery = None
+
+        iterative_scan = False
+        candidates = []
+        if query_vector is not None:
+            iterative_scan = await self._check_iterative_scan()
+            distance = M.embedding.cosine_distance(query_vector)
+            similarity = cast(1 - distance, Float)
+            # 按相似度排序无法命中 HNSW 索引，即精确检索
+            exact_scan = not iterative_scan and await self._is_small_scope(filters)
+            candidates.append(
+                select(
+                    M.id.label("id"),
+                    similarity.label("vector_score"),
+                    cast(literal(0.0), Float).label("text_score"),
+                )
+                .where(*filters)
+                .order_by(similarity.desc() if exact_scan else distance)
+                .limit(top_k)
+                .subquery()
+            )
+        if tsquery is not None:
+            query = func.to_tsquery("simple", tsquery)
+            total_boost = sum(boost for _, boost in text_columns)
+            rank = sum(
+                boost * func.ts_rank_cd(column, query, RANK_NORMALIZATION)
+                for column, boost in text_columns
+            ) / total_boost
+            candidates.append(
+                select(
+                    M.id.label("id"),
+                    cast(literal(0.0), Float).label("vector_score"),
+                    cast(rank, Float).label("text_score"),
+                )
+                .where(*filters, or_(*(it.op("@@")(query) for it, _ in text_columns)))
+                .order_by(rank.desc())
+                .limit(top_k)
+                .subquery()
+            )
+
+        if not candidates:
+            stmt = select(*columns, literal(None).label("score")).where(*filters)
+            stmt = stmt.order_by(M.id).limit(top_k)
+        else:
+            if len(candidates) == 1:
+                merged = candidates[0]
+                weight = 1.0 if query_vector is not None else 0.0
+            else:
+                merged = union_all(*(select(it) for it in candidates)).subquery()
+                weight = query_vector_weight
+            scored = (
+                select(
+                    merged.c.id,
+                    func.max(merged.c.vector_score).label("vector_score"),
+                    func.max(merged.c.text_score).label("text_score"),
+                )
+                .group_by(merged.c.id)
+                .subquery()
+            )
+            score = (
+                weight * scored.c.vector_score + (1 - weight) * scored.c.text_score
+            ).label("score")
+            stmt = select(*columns, score).join(scored, M.id == scored.c.id)
+            if query_vector is not None:
+                # 与 ES kNN 的 similarity 一致，过滤相似度过低的向量召回
+                stmt = stmt.where(
+                    or_(
+                        scored.c.vector_score >= vector_similarity,
+                        scored.c.text_score > 0,
+                    )
+                )
+            stmt = stmt.order_by(score.desc()).limit(top_k)
+
+        async with self._client() as session, session.begin():
+            if query_vector is not None:
+                ef_search = max(PGVECTOR_EF_SEARCH, top_k * 2)
+                await session.execute(text(f"SET LOCAL hnsw.ef_search = {ef_search}"))
+            if iterative_scan:
+                # relaxed_order 可能略微打乱距离顺序，外层会按得分重新排序
+                await session.execute(
+                    text("SET LOCAL hnsw.iterative_scan = relaxed_order")
+                )
+            rows = (await session.execute(stmt)).all()
+        outputs = list()
+        for row in rows:
+            doc = self._to_dict(row, fields)
+            doc["score"] = row.score
+            outputs.append(doc)
+        return outputs
+
+    async def _check_iterative_scan(self) -> bool:
+        if self._iterative_scan is None:
+            async with self._client() as session:
+                version = await session.scalar(
+                    text("SELECT extversion FROM pg_extension WHERE extname = 'vector'")
+                )
+            self._iterative_scan = (
+                version is not None
+                and _parse_version(version) >= PGVECTOR_ITERATIVE_SCAN_VERSION
+            )
+            if not self._iterative_scan:
+                self.logger.warning(
+                    f"pgvector {version} does not support hnsw.iterative_scan, "
+                    "scoped search falls back to exact scan"
+                )
+        return self._iterative_scan
+
+    async def _is_small_scope(self, filters: list) -> bool:
+        """只有索引名称过滤时不是小范围检索"""
+        if len(filters) < 2:
+            return False
+        async with self._client() as session:
+            count = await session.scalar(
+                select(func.count(DocumentChunk.id)).where(*filters)
+            )
+        return count <= PGVECTOR_EXACT_SCAN_LIMIT
+
+    @staticmethod
+    def _filters(**kwargs) -> list:
+        return [
+            _match(getattr(DocumentChunk, k), v)
+            for k, v in kwargs.items()
+            if v is not None
+        ]
+
+    @staticmethod
+    def _fields(
+        includes: Optional[list[str]], excludes: Optional[list[str]]
+    ) -> list[str]:
+        fields = list(DOCUMENT_FIELDS) + ["vector"]
+        if includes is not None:
+            fields = [it for it in fields if it in includes]
+        if excludes is not None:
+            fields = [it for it in fields if it not in excludes]
+        return ["embedding" if it == "vector" else it for it in fields]
+
+    @staticmethod
+    def _to_dict(row, fields: list[str]) -> dict[str, Any]:
+        doc = dict(id=str(row.id))
+        for field in fields:
+            value = getattr(row, field)
+            if field == "embedding":
+                doc["vector"] = value.tolist() if value is not None else None
+            else:
+                doc[field] = value
+        return doc
+
+
+def _match(column, value):
+    if isinstance(value, (list, tuple, set)):
+        return column.in_(value)
+    return column == value
+
+
+def _parse_version(version: str) -> tuple[int, ...]:
+    return tuple(int(it) for it in version.split(".")[:2] if it.isdigit())
+
+
+def _parse_field(field: str) -> tuple[str, float]:
+    """解析 ``字段^权重`` 形式的查询字段"""
+    name, _, boost = field.partition("^")
+    return name, float(boost) if boost else 1.0
@@ -0,0 +1,183 @@
+"""向量量化召回率基准
+
+以索引中随机抽取的文档向量作为查询，对比 kNN 检索与浮点向量精确检索（script_score）
+的 recall@k。指定量化方式时先将索引复制到临时索引再测试，结束后删除。
+
+    python -m backend.utils.vector.benchmark --index lorelm -k 10 \\
+        --quantization int8 int4 bbq --oversample 0 2 4
+"""
+
+import argparse
+import asyncio
+import time
+from typing import Any
+
+from . import _get_profile
+from ._elastic import ElasticSearch
+
+
+async def sample_vectors(
+    es: ElasticSearch, index_name: str, size: int, seed: int
+) -> list[list[float]]:
+    """随机抽取文档向量"""
+    rsp = await es._client.search(
+        index=index_name,
+        size=size,
+        query={
+            "function_score": {"random_score": {"seed": seed, "field": "_seq_no"}}
+        },
+        source=["vector"],
+    )
+    return [hit["_source"]["vector"] for hit in rsp["hits"]["hits"]]
+
+
+async def exact_search(
+    es: ElasticSearch, index_name: str, query_vector: list[float], k: int
+) -> list[str]:
+    """浮点向量暴力检索"""
+    rsp = await es._client.search(
+        index=index_name,
+        size=k,
+        query={
+            "script_score": {
+                "query": {"match_all": {}},
+                "script": {
+                    "source": "cosineSimilarity(params.query_vector, 'vector') + 1.0",
+                    "params": {"query_vector": query_vector},
+                },
+            }
+        },
+        source=False,
+    )
+    return [hit["_id"] for hit in rsp["hits"]["hits"]]
+
+
+async def knn_search(
+    es: ElasticSearch,
+    index_name: str,
+    query_vector: list[float],
+    k: int,
+    oversample: float,
+) -> list[str]:
+    rsp = await es._client.search(
+        index=index_name,
+        knn=es.knn_clause(query_vector, k, oversample),
+        size=k,
+        source=False,
+    )
+    return [hit["_id"] for hit in rsp["hits"]["hits"]]
+
+
+async def recall_at_k(
+    es: ElasticSearch,
+    index_name: str,
+    queries: list[list[float]],
+    truths: list[list[str]],
+    k: int,
+    oversample: float,
+) -> dict[str, float]:
+    """计算平均 recall@k 与单次检索耗时（毫秒）"""
+    hits, total, elapsed = 0, 0, 0.0
+    for query_vector, truth in zip(queries, truths):
+        start = time.perf_counter()
+        result = await knn_search(es, index_name, query_vector, k, oversample)
+        elapsed += time.perf_counter() - start
+        hits += len(set(result) & set(truth))
+        total += len(truth)
+    return dict(
+        recall=hits / max(total, 1), latency=elapsed * 1e3 / max(len(queries), 1)
+    )
+
+
+async def copy_index(es: ElasticSearch, source: str, quantization: str) -> str:
+    """按量化方式创建临时索引并复制数据"""
+    mapping = await es._client.indices.get_mapping(index=source)
+    dims = mapping[source]["mappings"]["properties"]["vector"]["dims"]
+    target = f"{source}_bench_{quantization}"
+    await es.index_delete(target)
+    await es.index_create(target, dims, quantization)
+    await es._client.reindex(
+        source={"index": source},
+        dest={"index": target},
+        wait_for_completion=True,
+        request_timeout=3600,
+    )
+    await es._client.indices.forcemerge(index=target, max_num_segments=1)
+    await es._client.indices.refresh(index=target)
+    return target
+
+
+async def benchmark(
+    index_name: str,
+    k: int,
+    queries: int,
+    quantizations: list[str],
+    oversamples: list[float],
+    seed: int,
+) -> list[dict[str, Any]]:
+    es = ElasticSearch(_get_profile())
+    reports = list()
+    try:
+        vectors = await sample_vectors(es, index_name, queries, seed)
+        truths = [await exact_search(es, index_name, it, k) for it in vectors]
+        for quantization in quantizations:
+            target = index_name
+            if quantization != "current":
+                target = await copy_index(es, index_name, quantization)
+            try:
+                for oversample in oversamples:
+                    result = await recall_at_k(
+                        es, target, vectors, truths, k, oversample
+                    )
+                    reports.append(
+                        dict(quantization=quantization, oversample=oversample, **result)
+                    )
+            finally:
+                if target != index_name:
+                    await es.index_delete(target)
+    finally:
+        await es.close()
+    return reports
+
+
+def main():
+    parser = argparse.ArgumentParser(description="向量量化 recall@k 基准")
+    parser.add_argument("--index", default="lorelm", help="索引名称")
+    parser.add_argument("-k", type=int, default=10, help="返回数量")
+    parser.add_argument("--queries", type=int, default=100, help="查询数量")
+    parser.add_argument(
+        "--quantization",
+        nargs="+",
+        default=["current"],
+        choices=["current", "none", "int8", "int4", "bbq"],
+        help="量化方式，current 表示直接测试原索引",
+    )
+    parser.add_argument(
+        "--oversample", nargs="+", type=float, default=[0], help="过采样倍数"
+    )
+    parser.add_argument("--seed", type=int, default=42, help="随机种子")
+    args = parser.parse_args()
+
+    reports = asyncio.run(
+        benchmark(
+            args.index,
+            args.k,
+            args.queries,
+            args.quantization,
+            args.oversample,
+            args.seed,
+        )
+    )
+    print(
+        f"{'quantization':<14}{'oversample':>12}"
+        f"{'recall@' + str(args.k):>12}{'ms':>10}"
+    )
+    for it in reports:
+        print(
+            f"{it['quantization']:<14}{it['oversample']:>12.1f}"
+            f"{it['recall']:>12.4f}{it['latency']:>10.1f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,152 @@
+import re
+from logging import getLogger
+
+import pytest
+
+from backend.components.chunk.naive import ChunkingNaive, _slice, _split_at
+
+
+class FakePredicter:
+    """以空白分隔的片段为 token，返回各 token 的起始字符位置"""
+
+    def offsets_batch(self, texts):
+        return [[m.start() for m in re.finditer(r"\S+", text)] for text in texts]
+
+
+class FakeTokenizer:
+    def tokenize(self, text):
+        return text.split()
+
+    def fine_grained_tokenize(self, texts):
+        return list(texts)
+
+
+def make_chunker(chunk_size: int = 10, overlap_size: int = 0) -> ChunkingNaive:
+    # 跳过 __init__，不加载分词词典与 TokenPredicter
+    chunker = ChunkingNaive.__new__(ChunkingNaive)
+    chunker._config = dict(
+        chunk_size=chunk_size, overlap_size=overlap_size, embed_tag="fake"
+    )
+    chunker.embed_predict = FakePredicter()
+    chunker.tokenizer = FakeTokenizer()
+    chunker.logger = getLogger("lorelm.components.chunk")
+    return chunker
+
+
+def pieces(*lines: str):
+    return list(zip(lines, FakePredicter().offsets_batch(lines)))
+
+
+def words(prefix: str, count: int) -> str:
+    return " ".join(f"{prefix}{i}" for i in range(count))
+
+
+def test_slice_keeps_tokens_starting_in_range():
+    text = "a bb ccc dddd"
+    starts = [0, 2, 5, 9]
+    assert _slice(text, starts, 2, 9) == ("bb ccc ", [0, 3])
+    assert _slice(text, starts, 3, 9) == ("b ccc ", [2])
+
+
+def test_split_at_token_start():
+    text = "a bb ccc dddd"
+    starts = [0, 2, 5, 9]
+    left, right = _split_at(text, starts, 2)
+    assert left == ("a bb ", [0, 2])
+    assert right == ("ccc dddd", [0, 4])
+
+
+def test_long_line_split_at_middle_token():
+    chunker = make_chunker(chunk_size=2)
+    # 7 个 token 超过 3 倍 chunk_size，按第 3 个 token 切开而不是按字符数
+    line = "a bbbbbbbbbbbbbbbbbbbb c d e f g"
+    docs = chunker(line)
+    assert [doc["content"] for doc in docs] == ["a bbbbbbbbbbbbbbbbbbbb c ", "d e f g"]
+
+
+def test_merge_chunking_without_overlap():
+    chunker = make_chunker(chunk_size=4)
+    chunks = chunker._merge_chunking(pieces("a b c", "d e", "f g h", "i"))
+    assert [text for text, _ in chunks] == ["a b cd e", "f g hi"]
+
+
+def test_merge_chunking_overlap_length():
+    chunker = make_chunker(chunk_size=4, overlap_size=2)
+    chunks = chunker._merge_chunking(pieces("a b c ", "d e ", "f g h ", "i"))
+    texts = [text for text, _ in chunks]
+    assert texts == ["a b c d e ", "d e f g h ", "g h i"]
+    for (prev, prev_starts), (_, starts) in zip(chunks, chunks[1:]):
+        overlap = _split_at(prev, prev_starts, len(prev_starts) - 2)[1]
+        assert len(overlap[1]) == 2
+        assert starts[:2] == overlap[1]
+
+
+def test_merge_chunking_offsets_match_text():
+    chunker = make_chunker(chunk_size=3, overlap_size=1)
+    chunks = chunker._merge_chunking(pieces("one two ", "three four ", "five"))
+    for text, starts in chunks:
+        assert starts == FakePredicter().offsets_batch([text])[0]
+
+
+def test_large_table_split_by_row_tokens():
+    chunker = make_chunker()
+    rows = [f"<td>{words(f'r{i}_', 10)}</td></tr>" for i in range(900)]
+    table = "\n<table><tbody><tr>" + "<tr>".join(rows) + "</tbody></table>"
+    starts = FakePredicter().offsets_batch([table])[0]
+    assert len(starts) > 8096
+
+    docs = chunker.table_tokenize(table, starts, False)
+    assert len(docs) > 1
+    seen = list()
+    for doc in docs:
+        content = doc["content"]
+        assert content.startswith("<table><tbody>")
+        assert content.endswith("</tbody></table>")
+        # 每块在累计 token 超过 4096 后的那一行结束
+        assert len(content.split()) <= 4096 + 12
+        seen.extend(re.findall(r"r(\d+)_0 ", content))
+    assert seen == [str(i) for i in range(900)]
+
+
+def test_html_table_kept_whole():
+    chunker = make_chunker(chunk_size=4)
+    table = "<table><tr><td>x y</td></tr></table>"
+    docs = chunker(f"a b c\n{table}\nd e f")
+    assert docs[-1]["content"] == table
+    assert all("<table" not in doc["content"] for doc in docs[:-1])
+
+
+def test_header_joined_with_next_line():
+    chunker = make_chunker(chunk_size=20)
+    docs = chunker("# Title\nbody text\nmore")
+    assert docs[0]["content"].startswith("# Title\nbody text")
+
+
+@pytest.mark.parametrize("overlap_size", [0, 3])
+@pytest.mark.parametrize("block_paragraphs", [2, 5])
+def test_chunk_partial_matches_whole_file(overlap_size, block_paragraphs):
+    chunker = make_chunker(chunk_size=10, overlap_size=overlap_size)
+    paragraphs = list()
+    for i in range(60):
+        if i % 7 == 0:
+            paragraphs.append(f"# Header {i}")
+        paragraphs.append(words(f"w{i}_", (i * 5) % 8 + 2))
+    content = "\n\n".join(paragraphs)
+    expected = [doc["content"] for doc in chunker(content)]
+
+    outputs = list()
+    overlap, tail = "", ""
+    for i in range(0, len(paragraphs), block_paragraphs):
+        block = "\n\n".join(paragraphs[i : i + block_paragraphs]) + "\n\n"
+        docs, overlap, tail = chunker.chunk_partial(
+            "\n".join(it for it in (overlap, tail, block) if it)
+        )
+        outputs.extend(doc["content"] for doc in docs)
+    if tail:
+        docs = chunker("\n".join(it for it in (overlap, tail) if it))
+        outputs.extend(doc["content"] for doc in docs)
+
+    def normalize(texts):
+        return [re.sub(r"\s+", " ", it).strip() for it in texts]
+
+    assert normalize(outputs) == normalize(expected)
@@ -0,0 +1,61 @@
+import asyncio
+
+from backend.components.chunk.stream import _cut, batched, iter_text_blocks
+
+
+async def aiter_list(items):
+    for item in items:
+        yield item
+
+
+def collect(aiterable):
+    async def run():
+        return [it async for it in aiterable]
+
+    return asyncio.run(run())
+
+
+def test_multibyte_character_split_across_reads():
+    text = "你好，世界。\n\n第二段落内容。\n\n" * 20
+    data = text.encode("utf-8")
+    # 每次读 1 字节，汉字的 3 个字节分散在多次读取中
+    reads = [data[i : i + 1] for i in range(len(data))]
+    blocks = collect(iter_text_blocks(aiter_list(reads), block_size=16))
+    assert len(blocks) > 1
+    assert "".join(blocks) == text
+    assert all("�" not in block for block in blocks)
+
+
+def test_blocks_end_at_blank_line():
+    text = "aaaa\n\nbbbb\n\ncccc\n\ndddd"
+    blocks = collect(iter_text_blocks(aiter_list([text.encode()]), block_size=8))
+    assert "".join(blocks) == text
+    assert all(block.endswith("\n\n") for block in blocks[:-1])
+
+
+def test_cut_before_unclosed_html_table():
+    head = "intro paragraph\n\n"
+    table = "<table>\n<tr><td>a</td></tr>\n\n<tr><td>b</td></tr>\n</table>\n\n"
+    buffer = head + table + "after"
+    # 目标位置落在表格内的空行之后，退回到表格所在行之前
+    block_size = buffer.index("<tr><td>b")
+    assert _cut(buffer, block_size) == len(head)
+
+
+def test_cut_after_closed_html_table():
+    table = "<table>\n<tr><td>a</td></tr>\n</table>\n\n"
+    buffer = table + "next paragraph\n\nmore"
+    assert _cut(buffer, len(table) + 4) == len(table)
+
+
+def test_cut_waits_for_more_data():
+    buffer = "x" * 20
+    assert _cut(buffer, 10) == 0
+    # 超过 4 倍 block_size 仍没有换行时直接切分
+    assert _cut("x" * 50, 10) == 40
+
+
+def test_batched_offsets():
+    parts = [[1, 2, 3], [4], [], [5, 6, 7, 8]]
+    batches = collect(batched(aiter_list(parts), 3))
+    assert batches == [(0, [1, 2, 3]), (3, [4, 5, 6]), (6, [7, 8])]